@@ -143,13 +143,84 @@ class StudentExamSubmissionSerializer(serializers.Serializer):
         return value
 
 
+def result_questions(results):
+    """
+    Per-question answers for each StuExam_DB in results, as {result.id: [...]}.
+
+    Answers come from the student's ExamSession and the exam's pinned
+    question versions; results recorded before sessions stored answers
+    fall back to their Stu_Question copies. Sessions and copies are loaded
+    with one query each for the whole list.
+    """
+    from django.db.models import prefetch_related_objects
+    from questions.anticheating_models import ExamSession
+    from questions.versioning import exam_questions
+
+    results = [r for r in results if r.student_id is not None]
+    sessions = {}
+    if results:
+        for session in ExamSession.objects.select_related('exam').filter(
+            student_id__in={r.student_id for r in results},
+            exam__name__in={r.examname for r in results},
+        ).order_by('id'):
+            key = (session.student_id, session.exam.name, session.exam.question_paper_id)
+            sessions.setdefault(key, session)
+
+    historical = [r for r in results if (r.student_id, r.examname, r.qpaper_id) not in sessions]
+    prefetch_related_objects(historical, 'questions')
+
+    pinned = {}
+    answers = {}
+    for result in results:
+        session = sessions.get((result.student_id, result.examname, result.qpaper_id))
+        if session is None:
+            answers[result.id] = [
+                {
+                    'qno': question.qno,
+                    'question_text': question.question,
+                    'choice': question.choice,
+                    'answer': question.answer,
+                    'max_marks': question.max_marks,
+                }
+                for question in result.questions.all()
+            ]
+            continue
+
+        if session.exam_id not in pinned:
+            pinned[session.exam_id] = exam_questions(session.exam)
+        chosen = session.answers or {}
+        answers[result.id] = [
+            {
+                'qno': qno,
+                'question_text': question['question'],
+                'choice': chosen.get(str(qno), 'E'),
+                'answer': question['answer'],
+                'max_marks': question['max_marks'],
+            }
+            for qno, question in pinned[session.exam_id].items()
+        ]
+    return answers
+
+
+class ExamResultListSerializer(serializers.ListSerializer):
+    """Loads the answers of every result in the list up front (see result_questions)."""
+
+    def to_representation(self, data):
+        from django.db.models import prefetch_related_objects
+
+        results = list(data.all() if hasattr(data, 'all') else data)
+        prefetch_related_objects(results, 'student', 'qpaper__questions')
+        self.child.context['result_questions'] = result_questions(results)
+        return super().to_representation(results)
+
+
 class ExamResultSerializer(serializers.ModelSerializer):
     """Serializer for exam results."""
     
     exam_name = serializers.CharField(source='examname', read_only=True)
     student_name = serializers.CharField(source='student.username', read_only=True)
     percentage = serializers.SerializerMethodField()
-    questions = StudentAnswerSerializer(many=True, read_only=True)
+    questions = serializers.SerializerMethodField()
     total_marks = serializers.SerializerMethodField()
     
     class Meta:
@@ -159,10 +230,11 @@ class ExamResultSerializer(serializers.ModelSerializer):
             'percentage', 'completed', 'questions'
         ]
         read_only_fields = ['id', 'score', 'completed']
+        list_serializer_class = ExamResultListSerializer
     
     def get_percentage(self, obj):
         """Calculate percentage score."""
-        if obj.qpaper and obj.qpaper.questions.count() > 0:
+        if obj.qpaper:
             total = sum(q.max_marks for q in obj.qpaper.questions.all())
             return round((obj.score / total * 100), 2) if total > 0 else 0
         return 0
@@ -171,6 +243,13 @@ class ExamResultSerializer(serializers.ModelSerializer):
         """Get total marks from question paper."""
         return obj.qpaper.total_marks if obj.qpaper else 0
 
+    def get_questions(self, obj):
+        """Per-question answers, loaded for the whole list by ExamResultListSerializer."""
+        prefetched = self.context.get('result_questions')
+        if prefetched is None:
+            prefetched = result_questions([obj])
+        return prefetched.get(obj.id, [])
+
 
 class StudentProgressSerializer(serializers.Serializer):
     """Serializer for student progress statistics."""
@@ -19,6 +19,7 @@ urlpatterns = [
     # Exam endpoints
     path('v1/exams/', views.exam_list_create, name='exam-list-create'),
     path('v1/exams/<int:exam_id>/', views.exam_detail, name='exam-detail'),
+    path('v1/exams/<int:exam_id>/paper/', views.exam_paper, name='exam-paper'),
     path('v1/exams/<int:exam_id>/submit/', views.exam_submit, name='exam-submit'),
     path('v1/exams/<int:exam_id>/results/', views.exam_results, name='exam-results'),
     path('v1/exams/<int:exam_id>/analytics/', views.exam_analytics, name='exam-analytics'),
@@ -35,6 +36,7 @@ urlpatterns = [
     path('v1/exams/<int:exam_id>/fullscreen-exit/', views.record_fullscreen_exit, name='fullscreen-exit'),
     path('v1/exams/<int:exam_id>/focus-status/', views.get_focus_status, name='focus-status'),
     path('v1/exams/<int:exam_id>/validate-timestamp/', views.validate_submission_timestamp, name='validate-timestamp'),
+    path('v1/exams/<int:exam_id>/clock/', views.exam_clock, name='exam-clock'),
 
     # Exam Assignment endpoints
     path('v1/exams/<int:exam_id>/assignments/', views.manage_exam_assignments, name='manage-assignments'),
@@ -13,16 +13,15 @@ from django.contrib.auth.models import User
 from django.contrib import auth
 from django.db.models import Q, Avg, Max, Min, Count
 from django.core.cache import cache
-from django.core.mail import send_mail
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django.utils import timezone
 import logging
 
 
 from questions.models import Exam_Model
 from questions.question_models import Question_DB
-from student.models import StudentInfo, StuExam_DB, StuResults_DB, Stu_Question
+from student.models import StudentInfo, StuExam_DB, StuResults_DB
 from faculty.models import FacultyInfo
 from .serializers import (
     UserSerializer, StudentInfoSerializer, FacultyInfoSerializer,
@@ -37,6 +36,7 @@ from .serializers_security import (
 from core.two_factor_auth import OTPGenerator, TwoFactorAuth
 from core.two_factor_auth import TwoFactorAuth
 from core.models import LoginAudit, AuditLog
+from core import audit_sink
 
 
 logger = logging.getLogger('app')
@@ -109,7 +109,8 @@ def exam_list_create(request):
         
         serializer = ExamSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(professor=request.user)
+            exam = serializer.save(professor=request.user)
+            exam.pin_question_versions()
             logger.info(f'Exam created: {serializer.data["name"]} by {request.user}')
             
             # Invalidate cache
@@ -154,7 +155,7 @@ def exam_detail(request, exam_id):
     elif request.method == 'PUT':
         serializer = ExamSerializer(exam, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save().pin_question_versions()
             logger.info(f'Exam updated: {exam.name}')
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -169,6 +170,70 @@ def exam_detail(request, exam_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated, IsStudent])
+def exam_paper(request, exam_id):
+    """
+    Get the student's paper as pre-rendered fragments in session order.
+
+    Response:
+    {
+        "exam_id": 1,
+        "remaining_seconds": 1740,
+        "questions": [
+            {"number": 1, "qno": 12, "head": "<div>...", "options": [{"choice": "C", "html": "<label>..."}]}
+        ]
+    }
+    """
+
+    try:
+        exam = Exam_Model.objects.get(id=exam_id)
+    except Exam_Model.DoesNotExist:
+        return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    from questions.exam_assignment_models import ExamAssignment
+    if not ExamAssignment.is_exam_assigned_to_student(exam, request.user):
+        return Response({'error': 'You are not assigned to this exam'}, status=status.HTTP_403_FORBIDDEN)
+
+    # Same checks as the exam page: the student's cached deadline, then retakes
+    from questions.exam_clock import check_window, new_session_fields, remaining_seconds
+    state, _ = check_window(request.user.id, exam.id)
+    if state != 'open':
+        return Response({'error': 'Exam is not in progress'}, status=status.HTTP_403_FORBIDDEN)
+    if StuExam_DB.objects.filter(examname=exam.name, student=request.user, completed=1).exists():
+        return Response({'error': 'You have already submitted this exam'}, status=status.HTTP_400_BAD_REQUEST)
+
+    from questions.anticheating_models import ExamSession
+    from questions.paper_cache import session_fragments
+
+    exam_session, _ = ExamSession.objects.get_or_create(
+        student=request.user,
+        exam=exam,
+        defaults={
+            **new_session_fields(request.user.id, exam.id),
+            'ip_address': get_client_ip(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT', ''),
+        }
+    )
+    if exam_session.is_submitted:
+        return Response({'error': 'Exam already submitted'}, status=status.HTTP_400_BAD_REQUEST)
+
+    questions = [
+        {
+            'number': number,
+            'qno': item['qno'],
+            'head': item['head'],
+            'options': [{'choice': letter, 'html': html} for letter, html in item['options']],
+        }
+        for number, item in enumerate(session_fragments(exam, exam_session), start=1)
+    ]
+    return Response({
+        'exam_id': exam.id,
+        'remaining_seconds': remaining_seconds(exam_session),
+        'questions': questions,
+    })
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsStudent])
 def exam_submit(request, exam_id):
@@ -204,15 +269,16 @@ def exam_submit(request, exam_id):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Validate exam timing
-    now = datetime.now()
-    if now < exam.start_time:
+    # Validate exam timing against the student's cached deadline
+    from questions.exam_clock import check_window, new_session_fields
+    state, _ = check_window(request.user.id, exam.id)
+    if state == 'not_started':
         return Response(
             {'error': 'Exam has not started yet'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    if now > exam.end_time:
+    if state == 'expired':
         return Response(
             {'error': 'Exam time has expired'},
             status=status.HTTP_400_BAD_REQUEST
@@ -233,13 +299,27 @@ def exam_submit(request, exam_id):
             qpaper=exam.question_paper
         )
         
-        # Calculate score
-        score = 0
-        for question in exam.question_paper.questions.all():
-            provided_answer = answers.get(question.question, 'E')
-            
-            if provided_answer.upper() == question.answer.upper():
-                score += question.max_marks
+        # Grade against the question versions pinned at publish time.
+        # Answers may be keyed by qno or, for older clients, by question text.
+        from questions.anticheating_models import ExamSession
+        from questions.versioning import exam_questions, grade_answers
+        pinned = exam_questions(exam)
+        answers_by_qno = {}
+        for qno, question in pinned.items():
+            provided_answer = answers.get(str(qno)) or answers.get(question['question'])
+            if provided_answer:
+                answers_by_qno[str(qno)] = provided_answer.upper()
+        score = grade_answers(pinned, answers_by_qno)
+
+        ExamSession.objects.update_or_create(
+            student=student,
+            exam=exam,
+            defaults={'answers': answers_by_qno},
+            create_defaults={
+                'answers': answers_by_qno,
+                **new_session_fields(student.id, exam.id),
+            }
+        )
         
         # Save submission
         stu_exam.score = score
@@ -392,17 +472,25 @@ def exam_analytics(request, exam_id):
         'question_statistics': []
     }
     
-    # Question-wise analysis
-    for question in exam.question_paper.questions.all():
-        correct_count = Stu_Question.objects.filter(
-            question=question.question,
-            choice__iexact=question.answer
-        ).count()
+    # Question-wise analysis from the answers stored on each exam session,
+    # graded against the versions the exam was published with
+    from questions.anticheating_models import ExamSession
+    from questions.versioning import exam_questions
+    session_answers = list(
+        ExamSession.objects.filter(exam=exam).exclude(answers={}).values_list('answers', flat=True)
+    )
+    attempted = len(scores)
+    for qno, question in exam_questions(exam).items():
+        correct_answer = (question['answer'] or '').upper()
+        correct_count = sum(
+            1 for answers in session_answers
+            if (answers.get(str(qno)) or '').upper() == correct_answer
+        )
         
         data['question_statistics'].append({
-            'question': question.question[:50],
+            'question': (question['question'] or '')[:50],
             'correct_answers': correct_count,
-            'accuracy_percentage': round(correct_count / submissions.count() * 100, 2)
+            'accuracy_percentage': round(correct_count / attempted * 100, 2)
         })
     
     # Cache for 30 minutes
@@ -483,21 +571,21 @@ def api_login(request):
     
     CRITICAL: User MUST verify OTP before accessing dashboard.
     """
-    serializer = LoginSerializer(data=request.data)
+    serializer = LoginSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         user = serializer.validated_data['user']
         ip_address = get_client_ip(request)
         user_agent = request.META.get('HTTP_USER_AGENT', '')
         
         # Create audit log for successful credential verification
-        audit = LoginAudit.objects.create(
+        audit_sink.record(LoginAudit(
             user=user,
             ip_address=ip_address,
             user_agent=user_agent,
             device_fingerprint=request.data.get('device_fingerprint', ''),
             success=True,
             suspicious=False,
-        )
+        ))
         
         # Create OTP session (Email OTP ONLY)
         session_result = TwoFactorAuth.create_otp_session(
@@ -542,14 +630,14 @@ def api_login(request):
     
     # Log failed attempt
     ip_address = get_client_ip(request)
-    AuditLog.objects.create(
+    audit_sink.record(AuditLog(
         user=None,
         action='LOGIN_FAILED',
         ip_address=ip_address,
         user_agent=request.META.get('HTTP_USER_AGENT', ''),
         success=False,
         details={'error': 'Invalid credentials'},
-    )
+    ))
     
     return Response(serializer.errors, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -595,14 +683,14 @@ def otp_request(request):
         result = TwoFactorAuth.resend_otp(session_id, user_email)
         
         # Audit log
-        AuditLog.objects.create(
+        audit_sink.record(AuditLog(
             user=session.user,
             action='OTP_RESEND',
             ip_address=get_client_ip(request),
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             success=result['success'],
             details={'session_id': session_id, 'resend_count': session.resend_count + 1}
-        )
+        ))
         
         if result['success']:
             return Response({
@@ -692,7 +780,7 @@ def otp_verify(request):
         
         if not result['valid']:
             # Log failed attempt
-            AuditLog.objects.create(
+            audit_sink.record(AuditLog(
                 user=None,
                 action='OTP_VERIFY_FAILED',
                 ip_address=ip_address,
@@ -703,7 +791,7 @@ def otp_verify(request):
                     'reason': result.get('reason', 'UNKNOWN'),
                     'attempts_remaining': result.get('attempts_remaining'),
                 }
-            )
+            ))
             
             return Response({
                 'error': result['message'],
@@ -716,14 +804,14 @@ def otp_verify(request):
         session = result['session']
         
         # Log successful verification
-        AuditLog.objects.create(
+        audit_sink.record(AuditLog(
             user=user,
             action='OTP_VERIFIED',
             ip_address=ip_address,
             user_agent=request.META.get('HTTP_USER_AGENT', ''),
             success=True,
             details={'session_id': session_id}
-        )
+        ))
         
         # Establish Django session (allows browser navigation without JWT headers)
         auth.login(request, user)
@@ -767,6 +855,29 @@ def login_audits(request):
 
 # ==================== ANTI-CHEATING ENDPOINTS ====================
 
+def auto_submit_exam(student, exam):
+    """Submit a student's exam session on suspicion, recording it as completed."""
+    from questions.anticheating_models import ExamSession
+
+    session = ExamSession.objects.filter(student=student, exam=exam).first()
+    if not session or session.is_submitted:
+        return False
+
+    session.mark_submitted()
+    stu, _ = StuExam_DB.objects.get_or_create(
+        student=student,
+        examname=exam.name,
+        qpaper=exam.question_paper,
+        defaults={'completed': 1, 'score': 0}
+    )
+    stu.completed = 1
+    stu.score = stu.score or 0
+    stu.save()
+    results = StuResults_DB.objects.get_or_create(student=student)[0]
+    results.exams.add(stu)
+    return True
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated, IsStudent])
 def record_focus_loss(request, exam_id):
@@ -781,121 +892,84 @@ def record_focus_loss(request, exam_id):
     """
 
     try:
-        from questions.anticheating_models import ExamFocusLog, FocusLossEvent
+        from questions.proctoring_ingest import enqueue_focus_event, event_types, exam_window, focus_warning
 
-        exam = Exam_Model.objects.get(id=exam_id)
+        event_type = request.data.get('event_type', 'TAB_SWITCH')
+        if event_type not in event_types():
+            return Response(
+                {'error': f'event_type must be one of {", ".join(sorted(event_types()))}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Cached exam window, the event itself is written by the ingestion worker
+        window = exam_window(exam_id)
+        if window is None:
+            return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Check if exam is still active
         now = timezone.now()
-        if now > exam.end_time:
+        if now > window['end_time']:
             return Response(
                 {'error': 'Exam has ended', 'action': 'submit_immediately'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get or create focus log
-        focus_log, created = ExamFocusLog.objects.get_or_create(
-            student=request.user,
-            exam=exam
-        )
-
-        # Record the event
-        event_type = request.data.get('event_type', 'TAB_SWITCH')
-        browser_timestamp = request.data.get('browser_timestamp')
-
-        FocusLossEvent.objects.create(
-            student=request.user,
-            exam=exam,
-            event_type=event_type,
-            browser_timestamp=browser_timestamp,
+        focus_loss_count, max_allowed = enqueue_focus_event(
+            request.user.id,
+            exam_id,
+            event_type,
+            browser_timestamp=request.data.get('browser_timestamp'),
             ip_address=get_client_ip(request),
-            user_agent=request.META.get('HTTP_USER_AGENT', '')
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+            username=request.user.username
         )
 
-        # Update focus loss count
-        focus_log.record_focus_loss()
-
-        # Update related exam session
-        from questions.anticheating_models import ExamSession
-        exam_session = ExamSession.objects.filter(student=request.user, exam=exam).first()
-        if exam_session:
-            exam_session.record_tab_switch()
-
-        # Send immediate alert email when count increases
-        try:
-            send_mail(
-                subject=f"[Security Alert] {exam.name}: Tab switches detected ({focus_log.focus_loss_count})",
-                message=(
-                    f"Student: {request.user.get_full_name() or request.user.username}\n"
-                    f"Exam: {exam.name}\n"
-                    f"Tab switches: {focus_log.focus_loss_count}\n"
-                    f"Timestamp: {datetime.utcnow().isoformat()}Z\n"
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[exam.professor.email],
-                fail_silently=True
-            )
-        except Exception as email_err:
-            logger.error(f"Cheating alert email failed: {email_err}")
+        from questions.suspicion import assess
+        verdict = assess(request.user.id, exam_id, 'focus_loss', focus_loss_count)
 
         response_data = {
             'success': True,
-            'focus_loss_count': focus_log.focus_loss_count,
-            'max_allowed': focus_log.max_focus_losses,
-            'exceeded': focus_log.exceeded_max_losses()
+            'focus_loss_count': focus_loss_count,
+            'max_allowed': max_allowed,
+            'risk_score': verdict.score,
+            'exceeded': max_allowed is not None and focus_loss_count > max_allowed
         }
 
-        # Show warnings after each switch
-        if focus_log.focus_loss_count > 0:
-            response_data['warning'] = f'Warning: You have switched tabs {focus_log.focus_loss_count} time(s). Maximum allowed: {focus_log.max_focus_losses}. (Faculty will be notified at >=5)'
-
-        # At the threshold (5): fire alert & auto-submit
-        if focus_log.focus_loss_count >= focus_log.max_focus_losses:
-            response_data['action'] = 'submit_immediately'
-            response_data['summary'] = 'Threshold reached: exam auto-submitting.'
-
-            if focus_log.focus_loss_count == focus_log.max_focus_losses:
-                try:
-                    send_mail(
-                        subject=f"[Cheating Alert] {exam.name}: {request.user.username} switched tabs {focus_log.focus_loss_count} times",
-                        message=(
-                            f"Student: {request.user.get_full_name() or request.user.username}\n"
-                            f"Exam: {exam.name}\n"
-                            f"Tab switches: {focus_log.focus_loss_count}\n"
-                            f"Timestamp: {datetime.utcnow().isoformat()}Z\n"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[exam.professor.email],
-                        fail_silently=True
-                    )
-                except Exception as email_err:
-                    logger.error(f"Cheating alert email failed: {email_err}")
-
-            # Auto-submit on suspicion
-            session = ExamSession.objects.filter(student=request.user, exam=exam).first()
-            if session and not session.is_submitted:
-                session.mark_submitted()
-                stu, _ = StuExam_DB.objects.get_or_create(
-                    student=request.user,
-                    examname=exam.name,
-                    qpaper=exam.question_paper,
-                    defaults={'completed':1,'score':0}
+        if 'warn' in verdict.actions:
+            response_data['warning'] = focus_warning(focus_loss_count, max_allowed)
+
+        if verdict.actions & {'alert', 'submit'}:
+            exam = Exam_Model.objects.select_related('professor', 'question_paper').get(id=exam_id)
+
+            # Alert once, when the policy's alert limit or score is crossed
+            if 'alert' in verdict.crossed:
+                from notifications.alert_digest import AlertDigestService
+                AlertDigestService.send_critical_alert(
+                    request.user,
+                    'focus_loss_alert',
+                    subject=f"[Cheating Alert] {exam.name}: {request.user.username} switched tabs {focus_loss_count} times",
+                    message=(
+                        f"Student: {request.user.get_full_name() or request.user.username}\n"
+                        f"Exam: {exam.name}\n"
+                        f"Tab switches: {focus_loss_count}\n"
+                        f"Risk score: {verdict.score}\n"
+                        f"Timestamp: {timezone.now().isoformat()}\n"
+                    ),
+                    exam=exam
                 )
-                stu.completed = 1
-                stu.score = stu.score or 0
-                stu.save()
-                results = StuResults_DB.objects.get_or_create(student=request.user)[0]
-                results.exams.add(stu)
+
+            if 'submit' in verdict.actions:
+                response_data['action'] = 'submit_immediately'
+                response_data['summary'] = 'Threshold reached: exam auto-submitting.'
+                auto_submit_exam(request.user, exam)
 
         logger.warning(
-            f'Focus loss recorded: {request.user.username} in exam {exam.name} '
-            f'(count: {focus_log.focus_loss_count}, type: {event_type})'
+            f'Focus loss recorded: {request.user.username} in exam {window["name"]} '
+            f'(count: {focus_loss_count}, type: {event_type})'
         )
 
         return Response(response_data, status=status.HTTP_200_OK)
 
-    except Exam_Model.DoesNotExist:
-        return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         logger.error(f'Error recording focus loss: {str(e)}')
         return Response({'error': 'Failed to record focus loss'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -926,35 +1000,50 @@ def record_fullscreen_exit(request, exam_id):
 
         session.record_fullscreen_exit()
 
-        send_mail(
-            subject=f"[Security Alert] {exam.name}: Fullscreen exit #{session.fullscreen_exit_count}",
-            message=(
-                f"Student: {request.user.get_full_name() or request.user.username}\n"
-                f"Exam: {exam.name}\n"
-                f"Fullscreen exits: {session.fullscreen_exit_count}\n"
-                f"Timestamp: {datetime.utcnow().isoformat()}Z\n"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[exam.professor.email],
-            fail_silently=True
+        from questions.suspicion import assess
+        verdict = assess(request.user.id, exam.id, 'fullscreen_exit', session.fullscreen_exit_count)
+        exceeded = bool(verdict.actions & {'alert', 'submit'})
+
+        # Every exit is an alert row; professors get them in the periodic digest
+        ExamSecurityAlert.objects.create(
+            student=request.user,
+            exam=exam,
+            alert_type='FULLSCREEN_EXIT',
+            level='CRITICAL' if exceeded else 'WARNING',
+            message='Repeated fullscreen exits detected.' if exceeded
+            else f'Fullscreen exit #{session.fullscreen_exit_count}.'
         )
 
         response = {
             'success': True,
             'fullscreen_exit_count': session.fullscreen_exit_count,
-            'exceeded': session.fullscreen_exit_count >= 3
+            'risk_score': verdict.score,
+            'exceeded': exceeded
         }
 
-        if session.fullscreen_exit_count >= 3:
+        if exceeded:
             response['action'] = 'review_or_autosubmit'
-            ExamSecurityAlert.objects.create(
-                student=request.user,
-                exam=exam,
-                alert_type='FULLSCREEN_EXIT',
-                level='WARNING',
-                message='Repeated fullscreen exits detected.'
+
+        if 'alert' in verdict.crossed:
+            from notifications.alert_digest import AlertDigestService
+            AlertDigestService.send_critical_alert(
+                request.user,
+                'fullscreen_exit_alert',
+                subject=f"[Security Alert] {exam.name}: {request.user.username} left fullscreen {session.fullscreen_exit_count} times",
+                message=(
+                    f"Student: {request.user.get_full_name() or request.user.username}\n"
+                    f"Exam: {exam.name}\n"
+                    f"Fullscreen exits: {session.fullscreen_exit_count}\n"
+                    f"Risk score: {verdict.score}\n"
+                    f"Timestamp: {timezone.now().isoformat()}\n"
+                ),
+                exam=exam
             )
 
+        if 'submit' in verdict.actions:
+            response['action'] = 'submit_immediately'
+            auto_submit_exam(request.user, exam)
+
         return Response(response, status=status.HTTP_200_OK)
 
     except Exam_Model.DoesNotExist:
@@ -968,32 +1057,25 @@ def record_fullscreen_exit(request, exam_id):
 @permission_classes([permissions.IsAuthenticated, IsStudent])
 def get_focus_status(request, exam_id):
     """
-    Get current focus loss status for student during exam
+    Get current focus loss status for student during exam.
+
+    Supports If-None-Match: a 304 is returned while the state is unchanged.
+    Browsers get the same state pushed from /exams/student/appear/<id>/events/.
     """
 
     try:
-        from questions.anticheating_models import ExamFocusLog
+        from questions.proctoring_ingest import exam_window, focus_etag, focus_payload
 
-        exam = Exam_Model.objects.get(id=exam_id)
-
-        focus_log = ExamFocusLog.objects.filter(
-            student=request.user,
-            exam=exam
-        ).first()
+        # Unchanged state is answered from the cached version number alone
+        etag = focus_etag(request.user.id, exam_id)
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
 
-        if not focus_log:
-            return Response({
-                'focus_loss_count': 0,
-                'max_allowed': 3,
-                'exceeded': False
-            })
+        if exam_window(exam_id) is None:
+            raise Exam_Model.DoesNotExist
 
-        return Response({
-            'focus_loss_count': focus_log.focus_loss_count,
-            'max_allowed': focus_log.max_focus_losses,
-            'exceeded': focus_log.exceeded_max_losses(),
-            'reason': focus_log.reason if focus_log.is_suspicious else None
-        })
+        # Counters include events still buffered by the ingestion worker
+        return Response(focus_payload(request.user.id, exam_id), headers={'ETag': etag})
 
     except Exam_Model.DoesNotExist:
         return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -1015,9 +1097,8 @@ def validate_submission_timestamp(request, exam_id):
     """
 
     try:
-        from questions.anticheating_models import ServerTimestampValidator
+        from questions.exam_clock import validate_submission
 
-        exam = Exam_Model.objects.get(id=exam_id)
         submission_time = request.data.get('submission_time_client')
 
         if not submission_time:
@@ -1026,26 +1107,49 @@ def validate_submission_timestamp(request, exam_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        is_valid, message = ServerTimestampValidator.validate_submission_time(
-            request.user,
-            exam,
-            submission_time
-        )
+        # Answered from the cached deadline, no exam lookup
+        is_valid, message = validate_submission(request.user.id, exam_id, submission_time)
+        if message == 'Exam not found':
+            return Response({'error': message}, status=status.HTTP_404_NOT_FOUND)
 
         return Response({
             'valid': is_valid,
             'message': message
         }, status=status.HTTP_200_OK if is_valid else status.HTTP_400_BAD_REQUEST)
 
-    except Exam_Model.DoesNotExist:
-        return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         logger.error(f'Error validating timestamp: {str(e)}')
         return Response({'error': 'Validation error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def exam_clock(request, exam_id):
+    """
+    Heartbeat for the exam timer: server time and the student's remaining
+    seconds, read from the cached deadline.
+
+    Response:
+    {
+        "server_time_ms": 1792400000000,
+        "state": "not_started" | "open" | "expired" | "unknown",
+        "remaining_seconds": 1740,
+        "starts_in_seconds": 0
+    }
+    """
+    from questions.exam_clock import heartbeat
+
+    data = heartbeat(request.user.id, exam_id)
+    if data['state'] == 'unknown':
+        return Response({'error': 'Exam not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(data, headers={'Cache-Control': 'no-store'})
+
+
 def get_client_ip(request):
     """Get client IP address from request"""
+    security = getattr(request, 'security', None)
+    if security is not None:
+        return security.ip
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
     if x_forwarded_for:
         ip = x_forwarded_for.split(',')[0]
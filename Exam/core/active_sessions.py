@@ -0,0 +1,115 @@
+"""
+Active Sessions
+Cached session ownership for SingleSessionMiddleware.
+
+Which session key owns a user is cached as (session_key, version) for
+OWNER_CACHE_TIMEOUT seconds, so a steady-state request costs one cache
+read. The ActiveUserSession row is written only when ownership changes:
+on login (user_logged_in, see core.signals) or when a request arrives
+from a session the record does not know about. The displaced session is
+deleted through the configured session engine, which also evicts it from
+the session cache. The version is a claim timestamp; a claim never
+replaces a newer cached owner.
+"""
+
+import logging
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('security')
+
+OWNER_CACHE_TIMEOUT = 60 * 5
+
+
+def _key(user_id):
+    return f'active_session:{user_id}'
+
+
+def owner(user_id):
+    """(session_key, version) of the user's active session, or None."""
+    cached = cache.get(_key(user_id))
+    if cached is not None:
+        return cached
+
+    from core.models import ActiveUserSession
+
+    session_key = ActiveUserSession.objects.filter(user_id=user_id).values_list(
+        'session_key', flat=True
+    ).first()
+    if session_key is None:
+        return None
+    cached = (session_key, 0)
+    cache.add(_key(user_id), cached, OWNER_CACHE_TIMEOUT)
+    return cached
+
+
+def evict_session(session_key):
+    """
+    Delete a session through the session engine (database and cache), using
+    the engine's invalidate() when it keeps sessions in more tiers
+    (core.session_backend).
+    """
+    engine = import_module(settings.SESSION_ENGINE)
+    invalidate = getattr(engine, 'invalidate', None)
+    if invalidate is not None:
+        invalidate(session_key)
+    else:
+        engine.SessionStore(session_key=session_key).delete()
+
+
+def claim(user_id, session_key):
+    """
+    Make session_key the user's only active session, evicting the previous
+    one. Returns the previous session key, if any.
+    """
+    from core.models import ActiveUserSession
+
+    current = owner(user_id)
+    if current is not None and current[0] == session_key:
+        return None
+
+    version = time.time_ns()
+    previous = current[0] if current else None
+    if previous:
+        evict_session(previous)
+    # The previous row holds the unique session key until it is replaced
+    ActiveUserSession.objects.update_or_create(user_id=user_id, defaults={'session_key': session_key})
+
+    latest = cache.get(_key(user_id))
+    if latest is None or latest[1] <= version:
+        cache.set(_key(user_id), (session_key, version), OWNER_CACHE_TIMEOUT)
+    if previous:
+        logger.info(f'Session for user {user_id} replaced by a new login')
+    return previous
+
+
+def enforce(request):
+    """Claim the user's ownership for this request's session unless it already owns it."""
+    if not request.user.is_authenticated:
+        return
+    session_key = request.session.session_key
+    if not session_key:
+        return
+    active = owner(request.user.pk)
+    if active is None or active[0] != session_key:
+        # This session takes over and the old one is evicted
+        claim(request.user.pk, session_key)
+
+
+def is_enabled():
+    """Whether single-session enforcement is installed, standalone or as a pipeline stage."""
+    middleware = settings.MIDDLEWARE
+    if 'core.middleware.SingleSessionMiddleware' in middleware:
+        return True
+    return (
+        'core.security_pipeline.SecurityPipelineMiddleware' in middleware
+        and 'single_session' in (getattr(settings, 'SECURITY_PIPELINE_STAGES', None) or [])
+    )
+
+
+def forget(user_id):
+    """Drop the cached owner, e.g. after logout."""
+    cache.delete(_key(user_id))
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import IPWhitelist, LoginAudit, AuditLog
+from .models import IPWhitelist, LoginAudit, AuditLog, DeviceSighting
 
 @admin.register(IPWhitelist)
 class IPWhitelistAdmin(admin.ModelAdmin):
@@ -23,4 +23,9 @@ class AuditLogAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
     readonly_fields = ('timestamp',)
 
-
+@admin.register(DeviceSighting)
+class DeviceSightingAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ip_address', 'fingerprint', 'first_seen', 'last_seen')
+    search_fields = ('user__username', 'ip_address', 'fingerprint')
+    date_hierarchy = 'last_seen'
+    readonly_fields = ('first_seen', 'last_seen')
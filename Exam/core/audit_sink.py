@@ -0,0 +1,251 @@
+"""
+Audit Sink
+Asynchronous, buffered writing of audit log lines and audit rows.
+
+Two bounded in-memory queues keep audit work off the request path:
+
+    log records   AuditQueueHandler (the 'security' logger's handler, see
+                  settings.LOGGING) enqueues records; a listener thread
+                  formats them and writes each drained batch to the
+                  rotating file with a single flush
+    audit rows    record() enqueues unsaved AuditLog / LoginAudit
+                  instances; a worker thread bulk_creates them per model
+
+When a queue is full the caller writes synchronously instead of dropping
+the entry, so a burst slows requests down rather than losing audit data.
+A row that cannot be written (see core.background_writer.write_isolating)
+is logged and dropped without holding up the rows queued with it.
+stats() reports queue depths, high-water marks, batches, overflows and
+dropped rows. Both queues are flushed at shutdown and by flush().
+
+Settings:
+    AUDIT_SINK_QUEUE_SIZE  capacity of each queue
+    AUDIT_SINK_BATCH_SIZE  entries written per batch
+    AUDIT_SINK_WORKER      run the background writers (tests turn it off and call flush())
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from collections import defaultdict
+
+from core.background_writer import BackgroundWorker, write_isolating
+
+logger = logging.getLogger('app')
+
+FLUSH_SECONDS = 1.0
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(int)
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
+
+
+def _count(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def _high_water(name, depth):
+    with _stats_lock:
+        if depth > _stats[name]:
+            _stats[name] = depth
+
+
+def stats():
+    """Counters for both queues, plus their current depths."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot['rows_depth'] = _rows.qsize()
+    snapshot['log_depth'] = sum(handler.queue.qsize() for handler in _handlers)
+    return snapshot
+
+
+class JsonMessage:
+    """A log message serialised to JSON only when the record is written."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return json.dumps(self.data, default=str)
+
+
+def _drain(source, limit):
+    items = []
+    while len(items) < limit:
+        try:
+            items.append(source.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+# ---------------------------------------------------------------- log records
+
+_handlers = []
+
+
+class AuditQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler in front of a RotatingFileHandler. Records are formatted
+    and written by a listener thread, one flush per batch.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None, queue_size=None):
+        super().__init__(queue.Queue(maxsize=queue_size or _setting('AUDIT_SINK_QUEUE_SIZE', 10000)))
+        self.target = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True
+        )
+        self._worker = BackgroundWorker('audit-log-writer', self.flush_queue, FLUSH_SECONDS, 'AUDIT_SINK_WORKER')
+        _handlers.append(self)
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('log_overflow')
+            self.write_batch([record])
+            return
+        depth = self.queue.qsize()
+        _high_water('log_high_water', depth)
+        self._worker.ensure()
+        if depth >= _setting('AUDIT_SINK_BATCH_SIZE', 500):
+            self._worker.wake()
+
+    def write_batch(self, records):
+        """Format and write records to the file, flushing once."""
+        target = self.target
+        target.acquire()
+        try:
+            for record in records:
+                try:
+                    if target.shouldRollover(record):
+                        target.doRollover()
+                    if target.stream is None:
+                        target.stream = target._open()
+                    target.stream.write(self.format(record) + target.terminator)
+                except Exception:
+                    self.handleError(record)
+            if target.stream is not None:
+                target.stream.flush()
+        finally:
+            target.release()
+        _count('log_written', len(records))
+        _count('log_batches')
+
+    def flush_queue(self):
+        written = 0
+        while True:
+            records = _drain(self.queue, _setting('AUDIT_SINK_BATCH_SIZE', 500))
+            if not records:
+                return written
+            self.write_batch(records)
+            written += len(records)
+
+    def close(self):
+        self.flush_queue()
+        self.target.close()
+        super().close()
+
+
+# ---------------------------------------------------------------- audit rows
+
+_rows = queue.Queue(maxsize=_setting('AUDIT_SINK_QUEUE_SIZE', 10000))
+_rows_flush_lock = threading.Lock()
+
+# Stored for rows whose address is missing or malformed (ip_address is NOT NULL)
+UNKNOWN_IP = '0.0.0.0'
+
+
+def record(instance):
+    """
+    Queue an unsaved AuditLog or LoginAudit for a batched insert.
+    Written synchronously when the queue is full.
+    """
+    from core.security_pipeline import valid_ip
+
+    instance.ip_address = valid_ip(instance.ip_address) or UNKNOWN_IP
+    try:
+        _rows.put_nowait(instance)
+    except queue.Full:
+        _count('rows_overflow')
+        _write_rows([instance])
+        return
+    depth = _rows.qsize()
+    _high_water('rows_high_water', depth)
+    _worker.ensure()
+    if depth >= _setting('AUDIT_SINK_BATCH_SIZE', 500):
+        _worker.wake()
+
+
+def _insert_rows(instances):
+    from django.contrib.auth.models import User
+
+    # Users deleted since the entry was queued; their audit rows cascade anyway
+    user_ids = {i.user_id for i in instances if i.user_id is not None}
+    existing = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    by_model = defaultdict(list)
+    for instance in instances:
+        if instance.user_id is None or instance.user_id in existing:
+            by_model[type(instance)].append(instance)
+
+    for model, batch in by_model.items():
+        model.objects.bulk_create(batch)
+    return sum(len(batch) for batch in by_model.values())
+
+
+def _requeue_rows(instances):
+    # Kept for the next flush while there is room
+    for instance in instances:
+        try:
+            _rows.put_nowait(instance)
+        except queue.Full:
+            _count('rows_dropped')
+
+
+def _describe_row(instance):
+    return f'{type(instance).__name__} (user {instance.user_id}, ip {instance.ip_address!r})'
+
+
+def _write_rows(instances):
+    written = write_isolating(
+        instances, _insert_rows, _requeue_rows,
+        describe=_describe_row, on_drop=lambda instance: _count('rows_dropped'),
+    )
+    _count('rows_written', written)
+    _count('rows_batches')
+    return written
+
+
+def flush_rows():
+    """Write every queued audit row. Returns the number written."""
+    written = 0
+    batch_size = _setting('AUDIT_SINK_BATCH_SIZE', 500)
+    with _rows_flush_lock:
+        while True:
+            instances = _drain(_rows, batch_size)
+            if not instances:
+                return written
+            written += _write_rows(instances)
+
+
+def flush():
+    """Write everything queued, rows and log records. Returns the rows written."""
+    for handler in _handlers:
+        handler.flush_queue()
+    return flush_rows()
+
+
+_worker = BackgroundWorker('audit-row-writer', flush_rows, FLUSH_SECONDS, 'AUDIT_SINK_WORKER', at_exit=flush)
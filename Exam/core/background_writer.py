@@ -0,0 +1,120 @@
+"""
+Background Writer
+Shared plumbing for the buffered writers that move work off the request path.
+
+BackgroundWorker runs a function on daemon threads, every interval
+seconds or as soon as wake() is called, closes stale database
+connections after each run and runs the function once more at exit.
+The number of threads comes from a setting (True/False mean one/none),
+read when the worker is started and on every run, so tests can turn a
+worker off and call the flush function themselves.
+
+write_isolating() writes a batch in one transaction. When the batch
+fails on bad data it falls back to one item at a time and drops the
+items that still fail, so one poisoned row cannot hold up everything
+queued behind it. Other errors (the database being unavailable) hand
+the unwritten items back to be retried by the next flush.
+
+Used by core.audit_sink, core.device_tracking,
+questions.proctoring_ingest and questions.submission_queue.
+"""
+
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+
+# Errors caused by the item being written rather than by the database
+DATA_ERRORS = (IntegrityError, DataError, ValueError, TypeError)
+
+
+class BackgroundWorker:
+    """Daemon threads calling run() periodically, woken early by wake()."""
+
+    def __init__(self, name, run, interval, setting, default=True, at_exit=None, logger='app'):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.setting = setting
+        self.default = default
+        self.at_exit = at_exit or run
+        self.logger = logging.getLogger(logger)
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def wanted(self):
+        """Threads the setting asks for."""
+        return int(getattr(settings, self.setting, self.default))
+
+    def ensure(self):
+        """Start the threads if they are enabled and not running yet."""
+        count = self.wanted()
+        if len(self._threads) >= count:
+            return
+        with self._lock:
+            if not self._threads:
+                atexit.register(self._run_at_exit)
+            while len(self._threads) < count:
+                name = self.name if not self._threads else f'{self.name}-{len(self._threads)}'
+                thread = threading.Thread(target=self._loop, name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _loop(self):
+        while True:
+            self._wakeup.wait(self.interval() if callable(self.interval) else self.interval)
+            self._wakeup.clear()
+            if not self.wanted():
+                continue
+            try:
+                self.run()
+            except Exception as e:
+                self.logger.error(f"Error in {self.name}: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def _run_at_exit(self):
+        try:
+            self.at_exit()
+        except Exception as e:
+            self.logger.error(f"Error in {self.name} at exit: {str(e)}")
+
+
+def write_isolating(items, write, requeue, describe=repr, on_drop=None, logger='app'):
+    """
+    Write items with write(items), which returns how many it wrote (it
+    may skip items that no longer apply), and return the total written.
+
+    A batch failing with one of DATA_ERRORS is retried an item at a time;
+    items that fail on their own are logged, passed to on_drop() and
+    dropped. Any other error
+    passes the items not yet written to requeue() and is re-raised.
+    """
+    try:
+        with transaction.atomic():
+            return write(items)
+    except DATA_ERRORS:
+        pass
+    except Exception:
+        requeue(items)
+        raise
+
+    written = 0
+    for n, item in enumerate(items):
+        try:
+            with transaction.atomic():
+                written += write([item])
+        except DATA_ERRORS as e:
+            logging.getLogger(logger).error(f"Dropped {describe(item)}: {str(e)}")
+            if on_drop is not None:
+                on_drop(item)
+        except Exception:
+            requeue(items[n:])
+            raise
+    return written
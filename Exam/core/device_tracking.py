@@ -0,0 +1,179 @@
+"""
+Device Tracking
+Recent IP addresses and device fingerprints per user, kept out of the session.
+
+Each signed-in user's last few IPs and fingerprints live in the cache as
+two bounded tuples. A request from a known IP and device costs one cache
+read and no writes. A new one updates the cache entry and queues a
+DeviceSighting upsert, which a background worker writes in batches. The
+session is never loaded or saved for tracking, and anonymous or static
+requests are skipped before any session access.
+
+Fingerprints are SHA-256 digests of stable request headers, memoised per
+header combination, so a session's fingerprint is hashed once.
+
+Settings:
+    DEVICE_TRACKING_WORKER  run the background writer (tests call flush())
+"""
+
+import hashlib
+import logging
+import threading
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.background_writer import BackgroundWorker, write_isolating
+
+logger = logging.getLogger('security')
+
+MAX_RECENT = 5
+TRACKING_CACHE_TIMEOUT = 60 * 60 * 24
+FLUSH_SECONDS = 5.0
+BATCH_SIZE = 500
+
+_buffer = deque(maxlen=50000)
+_flush_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _digest(user_agent, accept_language, accept_encoding):
+    return hashlib.sha256('|'.join((user_agent, accept_language, accept_encoding)).encode()).hexdigest()
+
+
+def fingerprint(request):
+    """SHA-256 device fingerprint of the request headers."""
+    meta = request.META
+    return _digest(
+        meta.get('HTTP_USER_AGENT', ''),
+        meta.get('HTTP_ACCEPT_LANGUAGE', ''),
+        meta.get('HTTP_ACCEPT_ENCODING', ''),
+    )
+
+
+def is_trackable(request):
+    """
+    Whether the request may belong to a signed-in user. Static, media and
+    cookieless requests are ruled out without touching the session.
+    """
+    path = request.path
+    if path.startswith(settings.STATIC_URL) or path.startswith(settings.MEDIA_URL):
+        return False
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES and 'HTTP_AUTHORIZATION' not in request.META:
+        return False
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated
+
+
+def _key(user_id):
+    return f'device_tracking:{user_id}'
+
+
+def recent(user_id):
+    """(ips, fingerprints) last seen for the user, most recent last."""
+    cached = cache.get(_key(user_id))
+    if cached is not None:
+        return cached
+
+    from core.models import DeviceSighting
+
+    rows = list(
+        DeviceSighting.objects.filter(user_id=user_id)
+        .order_by('-last_seen').values_list('ip_address', 'fingerprint')[:MAX_RECENT * 2]
+    )
+    ips, fingerprints = [], []
+    for ip, fp in reversed(rows):
+        _remember(ips, ip)
+        _remember(fingerprints, fp)
+    cached = (tuple(ips), tuple(fingerprints))
+    cache.add(_key(user_id), cached, TRACKING_CACHE_TIMEOUT)
+    return cached
+
+
+def _remember(values, value):
+    if value in values:
+        values.remove(value)
+    values.append(value)
+    del values[:-MAX_RECENT]
+
+
+def track(user_id, ip, fp):
+    """
+    Record that the user was seen from ip with device fp.
+    Returns True if either was new for the user.
+    """
+    ips, fingerprints = recent(user_id)
+    if ip in ips and fp in fingerprints:
+        return False
+
+    ips, fingerprints = list(ips), list(fingerprints)
+    _remember(ips, ip)
+    _remember(fingerprints, fp)
+    cache.set(_key(user_id), (tuple(ips), tuple(fingerprints)), TRACKING_CACHE_TIMEOUT)
+
+    _buffer.append((user_id, ip, fp, timezone.now()))
+    _worker.ensure()
+    if len(_buffer) >= BATCH_SIZE:
+        _worker.wake()
+    return True
+
+
+def track_request(request, ip):
+    """Track a request's user, setting request.device_fingerprint. No-op for anonymous requests."""
+    if not is_trackable(request):
+        return
+    request.device_fingerprint = fingerprint(request)
+    if ip:
+        track(request.user.pk, ip, request.device_fingerprint)
+
+
+def _drain():
+    sightings = {}
+    while True:
+        try:
+            user_id, ip, fp, seen = _buffer.popleft()
+        except IndexError:
+            return sightings
+        first, _ = sightings.get((user_id, ip, fp), (seen, seen))
+        sightings[user_id, ip, fp] = (first, seen)
+
+
+def _upsert(sightings):
+    from django.contrib.auth.models import User
+    from core.models import DeviceSighting
+
+    # Users deleted since they were seen
+    users = set(User.objects.filter(pk__in={key[0] for key, _ in sightings}).values_list('pk', flat=True))
+    return len(DeviceSighting.objects.bulk_create(
+        [
+            DeviceSighting(user_id=user_id, ip_address=ip, fingerprint=fp, first_seen=first, last_seen=last)
+            for (user_id, ip, fp), (first, last) in sightings if user_id in users
+        ],
+        update_conflicts=True,
+        unique_fields=['user', 'ip_address', 'fingerprint'],
+        update_fields=['last_seen'],
+        batch_size=500,
+    ))
+
+
+def _requeue(sightings):
+    # Kept for the next flush rather than dropped
+    _buffer.extend((key[0], key[1], key[2], last) for key, (_, last) in sightings)
+
+
+def flush():
+    """Upsert every queued sighting. Returns the number written."""
+    with _flush_lock:
+        sightings = list(_drain().items())
+        if not sightings:
+            return 0
+        return write_isolating(
+            sightings, _upsert, _requeue,
+            describe=lambda sighting: f'device sighting {sighting[0]}', logger='security',
+        )
+
+
+_worker = BackgroundWorker('device-tracking', flush, FLUSH_SECONDS, 'DEVICE_TRACKING_WORKER', logger='security')
@@ -0,0 +1,101 @@
+"""
+IP Whitelist
+Compiled whitelist of addresses and networks for IPWhitelistMiddleware.
+
+settings.IP_WHITELIST entries (addresses or CIDR networks) and the active
+IPWhitelist rows are compiled into sorted, merged integer intervals per
+address family. A lookup is one bisect, O(log n), however many entries
+there are.
+
+The compiled whitelist is kept in-process together with the version it
+was built from. The version lives in the shared cache and IPWhitelist
+save/delete signals bump it (core.signals), so every process rebuilds
+after a change and a lookup costs one cache read, never a query.
+"""
+
+import ipaddress
+import logging
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('security')
+
+VERSION_KEY = 'ip_whitelist:version'
+
+_compiled = None  # (version, Whitelist)
+
+
+class Whitelist:
+    """Merged (start, end) address intervals per IP version."""
+
+    def __init__(self, networks):
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        intervals = sorted(
+            (net.version, int(net.network_address), int(net.broadcast_address)) for net in networks
+        )
+        for version, start, end in intervals:
+            starts, ends = self.starts[version], self.ends[version]
+            if ends and start <= ends[-1] + 1:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+    def __len__(self):
+        return len(self.starts[4]) + len(self.starts[6])
+
+    def __contains__(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        value = int(address)
+        index = bisect_right(self.starts[address.version], value) - 1
+        return index >= 0 and value <= self.ends[address.version][index]
+
+
+def parse_networks(entries):
+    """ip_network objects for the valid entries; invalid ones are logged and skipped."""
+    networks = []
+    for entry in entries:
+        try:
+            networks.append(ipaddress.ip_network(str(entry).strip(), strict=False))
+        except ValueError:
+            logger.warning(f'Ignoring invalid IP whitelist entry: {entry!r}')
+    return networks
+
+
+def load_whitelist():
+    """Build the whitelist from settings and the active IPWhitelist rows."""
+    from core.models import IPWhitelist
+
+    entries = list(getattr(settings, 'IP_WHITELIST', []))
+    entries += IPWhitelist.objects.filter(is_active=True).values_list('ip_address', flat=True)
+    return Whitelist(parse_networks(entries))
+
+
+def invalidate():
+    """Make every process rebuild its whitelist on the next lookup."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def get_whitelist():
+    """The compiled whitelist, rebuilt only when the version changed."""
+    global _compiled
+    # A fresh version also covers the key being evicted
+    version = cache.get_or_set(VERSION_KEY, time.time_ns, None)
+    compiled = _compiled
+    if compiled is None or compiled[0] != version:
+        compiled = (version, load_whitelist())
+        _compiled = compiled
+    return compiled[1]
+
+
+def is_whitelisted(ip):
+    return ip in get_whitelist()
@@ -0,0 +1,131 @@
+"""
+Login Throttle
+Failed-login counters per IP address and per username, with lockouts.
+
+Failures are counted in time-bucketed cache keys (one key per BUCKET
+seconds), so recording a failure is one atomic increment and reading the
+failures of the last WINDOW seconds is one get_many over a fixed number
+of keys, without touching LoginAudit. Failures are recorded from the
+user_login_failed signal (core.signals); a successful login clears the
+username's counters.
+
+Lockouts follow settings.LOGIN_THROTTLE['LOCKOUTS']: once a scope
+(username or ip) reaches `failures` within the window it is locked for
+`seconds`. SuspiciousLoginMiddleware refuses login attempts while either
+the address or the username is locked.
+
+The username lockout is the primary control and the only one on by
+default. Locking an address would lock out everyone behind a shared
+NAT (a campus network), so an ip lockout is opt-in and should use a
+threshold far above what a building of students mistyping passwords
+reaches. Failures are counted per address either way, for is_suspicious().
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger('security')
+
+SUSPICIOUS_FAILURES = 3
+
+
+def config():
+    rate_limits = getattr(settings, 'RATE_LIMIT_CONFIG', {})
+    defaults = {
+        'WINDOW': 15 * 60,
+        'BUCKET': 60,
+        'LOCKOUTS': [
+            {'scope': 'username', 'failures': rate_limits.get('LOGIN_ATTEMPTS', 5),
+             'seconds': rate_limits.get('LOGIN_WINDOW', 300)},
+        ],
+    }
+    defaults.update(getattr(settings, 'LOGIN_THROTTLE', {}))
+    return defaults
+
+
+def _identity(scope, value):
+    if scope == 'username':
+        # Usernames are case-insensitive here and may hold any characters
+        value = hashlib.sha256(value.strip().lower().encode()).hexdigest()[:32]
+    return f'{scope}:{value}'
+
+
+def _bucket_keys(identity, now, window, bucket):
+    current = int(now // bucket)
+    return [f'login_fail:{identity}:{index}' for index in range(current - window // bucket + 1, current + 1)]
+
+
+def _scopes(ip, username):
+    scopes = []
+    if ip:
+        scopes.append(('ip', ip))
+    if username:
+        scopes.append(('username', username))
+    return scopes
+
+
+def failures(ip=None, username=None, now=None):
+    """{scope: failures within the window} for the given address and username."""
+    settings_ = config()
+    now = now or time.time()
+    keys = {
+        scope: _bucket_keys(_identity(scope, value), now, settings_['WINDOW'], settings_['BUCKET'])
+        for scope, value in _scopes(ip, username)
+    }
+    values = cache.get_many([key for scope_keys in keys.values() for key in scope_keys])
+    return {scope: sum(values.get(key, 0) for key in scope_keys) for scope, scope_keys in keys.items()}
+
+
+def record_failure(ip=None, username=None, now=None):
+    """
+    Count a failed login and apply the lockout policies.
+    Returns {scope: failures within the window}.
+    """
+    settings_ = config()
+    now = now or time.time()
+    bucket = settings_['BUCKET']
+    for scope, value in _scopes(ip, username):
+        key = f'login_fail:{_identity(scope, value)}:{int(now // bucket)}'
+        # add() only creates a missing bucket, so the TTL is set once
+        cache.add(key, 0, settings_['WINDOW'] + bucket)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, settings_['WINDOW'] + bucket)
+
+    counts = failures(ip, username, now)
+    for policy in settings_['LOCKOUTS']:
+        scope = policy['scope']
+        if counts.get(scope, 0) >= policy['failures']:
+            value = ip if scope == 'ip' else username
+            lock_key = f'login_lock:{_identity(scope, value)}'
+            if cache.add(lock_key, now + policy['seconds'], policy['seconds']):
+                logger.warning(f'Login locked for {scope} {value}: {counts[scope]} failures')
+    return counts
+
+
+def locked_for(ip=None, username=None, now=None):
+    """Seconds until the address or username may try again, 0 if not locked."""
+    now = now or time.time()
+    locks = cache.get_many([f'login_lock:{_identity(scope, value)}' for scope, value in _scopes(ip, username)])
+    until = max(locks.values(), default=0)
+    return max(0, int(until - now + 0.999))
+
+
+def clear(username):
+    """Forget a username's failures and lock, e.g. after a successful login."""
+    settings_ = config()
+    identity = _identity('username', username)
+    cache.delete_many(
+        _bucket_keys(identity, time.time(), settings_['WINDOW'], settings_['BUCKET'])
+        + [f'login_lock:{identity}']
+    )
+
+
+def is_suspicious(ip):
+    """Whether the address has had several recent failures."""
+    return failures(ip=ip).get('ip', 0) > SUSPICIOUS_FAILURES
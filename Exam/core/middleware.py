@@ -3,13 +3,11 @@ Middleware for security, audit logging, and rate limiting.
 """
 
 import logging
-import json
-import hashlib
 from django.http import JsonResponse
 from django.utils.deprecation import MiddlewareMixin
 from django.core.cache import cache
 from django.contrib.auth.models import AnonymousUser
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.utils import timezone
 
 security_logger = logging.getLogger('security')
@@ -53,22 +51,32 @@ class AuditLoggingMiddleware(MiddlewareMixin):
             return response
         
         duration = (datetime.now() - request._audit_start_time).total_seconds()
+        self.log_entry(
+            request, response,
+            getattr(request, '_ip_address', 'Unknown'),
+            getattr(request, '_user_agent', 'Unknown'),
+            duration,
+        )
         
+        return response
+    
+    @staticmethod
+    def log_entry(request, response, ip_address, user_agent, duration):
+        """Write one audit entry to the security log."""
         audit_entry = {
             'timestamp': datetime.now().isoformat(),
             'user': str(request.user),
             'action': request.method,
             'path': request.path,
-            'ip_address': getattr(request, '_ip_address', 'Unknown'),
-            'user_agent': getattr(request, '_user_agent', 'Unknown'),
+            'ip_address': ip_address,
+            'user_agent': user_agent,
             'status_code': response.status_code,
             'duration_ms': int(duration * 1000),
         }
         
-        # Log to audit file
-        security_logger.info(json.dumps(audit_entry))
-        
-        return response
+        # Log to audit file; serialised by the audit sink's writer thread
+        from core.audit_sink import JsonMessage
+        security_logger.info(JsonMessage(audit_entry))
     
     @staticmethod
     def get_client_ip(request):
@@ -78,15 +86,16 @@ class AuditLoggingMiddleware(MiddlewareMixin):
             return x_forwarded_for.split(',')[0].strip()
         return request.META.get('REMOTE_ADDR', 'Unknown')
     
+    SAFE_PATHS = [
+        '/admin/login',
+        '/student/login',
+        '/faculty/login',
+    ]
+    
     @staticmethod
     def is_safe_endpoint(path):
         """Check if endpoint is safe from audit logging."""
-        safe_paths = [
-            '/admin/login',
-            '/student/login',
-            '/faculty/login',
-        ]
-        return any(path.startswith(p) for p in safe_paths)
+        return any(path.startswith(p) for p in AuditLoggingMiddleware.SAFE_PATHS)
 
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
@@ -94,53 +103,57 @@ class SecurityHeadersMiddleware(MiddlewareMixin):
     Add security headers to all responses.
     """
     
-    def process_response(self, request, response):
-        """Add security headers."""
-        
+    HEADERS = {
         # Prevent clickjacking
-        response['X-Frame-Options'] = 'DENY'
-        
+        'X-Frame-Options': 'DENY',
         # Prevent MIME type sniffing
-        response['X-Content-Type-Options'] = 'nosniff'
-        
+        'X-Content-Type-Options': 'nosniff',
         # Enable XSS protection
-        response['X-XSS-Protection'] = '1; mode=block'
-        
+        'X-XSS-Protection': '1; mode=block',
         # Referrer policy
-        response['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        
+        'Referrer-Policy': 'strict-origin-when-cross-origin',
         # Feature policy / Permissions policy
-        response['Permissions-Policy'] = (
+        'Permissions-Policy': (
             'accelerometer=(), camera=(), geolocation=(), '
             'gyroscope=(), magnetometer=(), microphone=(), '
             'payment=(), usb=()'
-        )
-        
+        ),
+    }
+    
+    def process_response(self, request, response):
+        """Add security headers."""
+        for header, value in self.HEADERS.items():
+            response[header] = value
         return response
 
 
 class RateLimitMiddleware(MiddlewareMixin):
     """
-    Simple rate limiting based on IP address.
+    Sliding-window rate limiting per user and per IP address.
+    Policies are configured in settings.RATE_LIMIT_CONFIG (see core.ratelimit).
     """
     
-    RATE_LIMITS = {
-        # 'login': (5, 300),  # DISABLED - was 5 attempts per 5 minutes
-        'api': (100, 3600),  # 100 requests per hour
-    }
-    
     def process_request(self, request):
         """Check rate limits."""
+        from core.ratelimit import check
         
-        ip = self.get_client_ip(request)
-        
-        # Rate limit API endpoints only (login rate limiting DISABLED)
-        # Disabled login rate limiting as per request
-        
-        if request.path.startswith('/api/'):
-            return self.check_rate_limit(ip, 'api', request)
-        
-        return None
+        decision = check(request, self.get_client_ip(request))
+        if decision.allowed:
+            return None
+        return self.limited_response(decision)
+    
+    @staticmethod
+    def limited_response(decision):
+        """429 response for a denied core.ratelimit decision."""
+        response = JsonResponse(
+            {
+                'error': 'Rate limit exceeded. Try again later.',
+                'retry_after': decision.retry_after,
+            },
+            status=429
+        )
+        response['Retry-After'] = str(decision.retry_after)
+        return response
     
     @staticmethod
     def get_client_ip(request):
@@ -149,54 +162,19 @@ class RateLimitMiddleware(MiddlewareMixin):
         if x_forwarded_for:
             return x_forwarded_for.split(',')[0].strip()
         return request.META.get('REMOTE_ADDR')
-    
-    @staticmethod
-    def check_rate_limit(identifier, limit_type, request):
-        """Check if identifier has exceeded rate limit."""
-        
-        limit, window = RateLimitMiddleware.RATE_LIMITS.get(
-            limit_type, (100, 3600)
-        )
-        
-        cache_key = f'rate_limit:{limit_type}:{identifier}'
-        current_count = cache.get(cache_key, 0)
-        
-        if current_count >= limit:
-            security_logger.warning(
-                f'Rate limit exceeded: {identifier} on {limit_type}'
-            )
-            return JsonResponse(
-                {'error': 'Rate limit exceeded. Try again later.'},
-                status=429
-            )
-        
-        # Increment counter
-        cache.set(cache_key, current_count + 1, window)
-        
-        return None
 
 
 class IPTrackingMiddleware(MiddlewareMixin):
     """
     Track IP addresses for security purposes.
+    Recent IPs and devices are kept per user in core.device_tracking,
+    not in the session.
     """
     
     def process_request(self, request):
-        """Track user IP address."""
-        
-        if request.user.is_authenticated:
-            ip = self.get_client_ip(request)
-            
-            # Store IP in session
-            if 'user_ips' not in request.session:
-                request.session['user_ips'] = []
-            
-            user_ips = request.session['user_ips']
-            if ip not in user_ips:
-                user_ips.append(ip)
-                request.session['user_ips'] = user_ips[-5:]  # Keep last 5 IPs
-                request.session.modified = True
-        
+        """Track user IP address and device."""
+        from core.device_tracking import track_request
+        track_request(request, self.get_client_ip(request))
         return None
     
     @staticmethod
@@ -214,84 +192,61 @@ class DeviceFingerprinting(MiddlewareMixin):
     """
     
     def process_request(self, request):
-        """Generate or verify device fingerprint."""
+        """Generate the device fingerprint for signed-in users."""
+        from core.device_tracking import is_trackable
         
-        if request.user.is_authenticated:
-            fingerprint = self.generate_fingerprint(request)
-            request.device_fingerprint = fingerprint
-            
-            # Store in session for later comparison
-            if 'device_fingerprint' not in request.session:
-                request.session['device_fingerprint'] = fingerprint
+        if is_trackable(request):
+            request.device_fingerprint = self.generate_fingerprint(request)
         
         return None
     
     @staticmethod
     def generate_fingerprint(request):
-        """Generate a device fingerprint."""
-        
-        components = [
-            request.META.get('HTTP_USER_AGENT', ''),
-            request.META.get('HTTP_ACCEPT_LANGUAGE', ''),
-            request.META.get('HTTP_ACCEPT_ENCODING', ''),
-        ]
-        
-        fingerprint_str = '|'.join(components)
-        fingerprint = hashlib.sha256(fingerprint_str.encode()).hexdigest()
-        return fingerprint
+        """Generate a device fingerprint (hashed once per header combination)."""
+        from core.device_tracking import fingerprint
+        return fingerprint(request)
 
 
 class SingleSessionMiddleware(MiddlewareMixin):
-    """Force only one active session per user at any time."""
+    """
+    Force only one active session per user at any time.
+    Ownership is read from the cache (core.active_sessions); the database
+    is only written when another session takes over.
+    """
 
     def process_request(self, request):
-        if request.user.is_authenticated:
-            from django.contrib.sessions.models import Session
-            from core.models import ActiveUserSession
-
-            current_key = request.session.session_key
-            try:
-                active_session = ActiveUserSession.objects.get(user=request.user)
-                if active_session.session_key != current_key:
-                    # Invalidate old session
-                    Session.objects.filter(session_key=active_session.session_key).delete()
-                    # Force logout the old session by replacing it
-                    active_session.session_key = current_key
-                    active_session.last_activity = timezone.now()
-                    active_session.save()
-            except ActiveUserSession.DoesNotExist:
-                if current_key:
-                    ActiveUserSession.objects.create(
-                        user=request.user,
-                        session_key=current_key
-                    )
-
+        from core.active_sessions import enforce
+        enforce(request)
         return None
 
 
 class IPWhitelistMiddleware(MiddlewareMixin):
-    """IP Whitelisting middleware."""
+    """
+    IP Whitelisting middleware.
+    Addresses and CIDR networks are matched against the compiled whitelist
+    (core.ip_whitelist), so the check makes no database query.
+    """
     
     def process_request(self, request):
-        from core.models import IPWhitelist
+        from core.ip_whitelist import is_whitelisted
         
         ip = self.get_client_ip(request)
         
         # Check admin/login/API auth paths
         protected_paths = ['/admin/', '/api/v1/auth/', '/api/v2/auth/']
         if any(request.path.startswith(p) for p in protected_paths):
-            whitelisted_ips = list(IPWhitelist.objects.filter(is_active=True).values_list('ip_address', flat=True))
-            if ip not in whitelisted_ips:
+            if not is_whitelisted(ip):
                 security_logger.warning(f'IP not whitelisted: {ip} on {request.path}')
+                from core import audit_sink
                 from core.models import AuditLog
-                AuditLog.objects.create(
+                audit_sink.record(AuditLog(
                     user=request.user if request.user.is_authenticated else None,
                     action='IP_BLOCKED',
                     ip_address=ip,
                     user_agent=request.META.get('HTTP_USER_AGENT', ''),
                     success=False,
                     details={'path': request.path}
-                )
+                ))
                 return JsonResponse({'error': 'Access denied: IP not whitelisted'}, status=403)
         
         request._client_ip = ip
@@ -312,54 +267,96 @@ class SuspiciousLoginMiddleware(MiddlewareMixin):
     
     def process_request(self, request):
         if any(request.path.startswith(p) for p in self.LOGIN_PATHS) and request.method == 'POST':
-            ip = getattr(request, '_client_ip', self.get_client_ip(request))
-            ua = request.META.get('HTTP_USER_AGENT', 'Unknown')
-            fingerprint = getattr(request, 'device_fingerprint', 'unknown')
-            
-            is_suspicious = self.is_suspicious_login(request, ip, fingerprint)
-            
-            # Always log login attempt
-            from core.models import LoginAudit
-            audit = LoginAudit.objects.create(
-                user=request.user if request.user.is_authenticated else None,
-                ip_address=ip,
-                user_agent=ua,
-                device_fingerprint=fingerprint,
-                success=False,  # Updated post-auth
-                suspicious=is_suspicious,
-                reason='New IP/device/location' if is_suspicious else 'Normal login'
+            return self.record_attempt(
+                request,
+                getattr(request, '_client_ip', self.get_client_ip(request)),
+                request.META.get('HTTP_USER_AGENT', 'Unknown'),
+                getattr(request, 'device_fingerprint', 'unknown'),
             )
-            
-            if is_suspicious and request.user.is_authenticated:
-                # Trigger 2FA for suspicious logins
-                from core.two_factor_auth import TwoFactorAuth
-                TwoFactorAuth.require_2fa_verification(request.user)
-                audit.reason += '; 2FA required'
-                audit.save()
-                security_logger.warning(f'Suspicious login detected for {request.user}: {ip} - 2FA triggered')
-            
-            request._login_audit_id = audit.id
-            request._login_audit_suspicious = is_suspicious
         
         return None
     
+    def record_attempt(self, request, ip, ua, fingerprint):
+        """
+        Audit a login attempt and require 2FA when it looks suspicious.
+        Returns a response refusing the attempt while the address or
+        username is locked out (core.login_throttle), else None.
+        """
+        from core import login_throttle
+        retry_after = login_throttle.locked_for(ip=ip, username=self.attempted_username(request))
+        if retry_after:
+            security_logger.warning(f'Login attempt refused during lockout: {ip}')
+            return self.locked_response(request, retry_after)
+        
+        is_suspicious = self.is_suspicious_login(request, ip, fingerprint)
+        reason = 'New IP/device/location' if is_suspicious else 'Normal login'
+        
+        if is_suspicious and request.user.is_authenticated:
+            # Trigger 2FA for suspicious logins
+            from core.two_factor_auth import TwoFactorAuth
+            TwoFactorAuth.require_2fa_verification(request.user)
+            reason += '; 2FA required'
+            security_logger.warning(f'Suspicious login detected for {request.user}: {ip} - 2FA triggered')
+        
+        # Always log login attempt (written in the background by core.audit_sink)
+        from core import audit_sink
+        from core.models import LoginAudit
+        audit_sink.record(LoginAudit(
+            user=request.user if request.user.is_authenticated else None,
+            ip_address=ip,
+            user_agent=ua,
+            device_fingerprint=fingerprint,
+            success=False,
+            suspicious=is_suspicious,
+            reason=reason
+        ))
+        
+        request._login_audit_suspicious = is_suspicious
+        return None
+    
+    @staticmethod
+    def attempted_username(request):
+        """The username posted to a login form or login API, if any."""
+        if request.content_type == 'application/json':
+            import json
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+            username = data.get('username') if isinstance(data, dict) else None
+            return username if isinstance(username, str) else None
+        return request.POST.get('username')
+    
+    @staticmethod
+    def locked_response(request, retry_after):
+        """429 for API logins, the login page with an error otherwise."""
+        minutes = max(1, (retry_after + 59) // 60)
+        if request.path.startswith('/api/'):
+            response = JsonResponse({
+                'error': 'Too many failed login attempts',
+                'retry_after': retry_after
+            }, status=429)
+            response['Retry-After'] = str(retry_after)
+            return response
+        
+        from django.contrib import messages
+        from django.shortcuts import redirect
+        messages.error(request, f'Too many failed login attempts. Try again in {minutes} minute(s).', fail_silently=True)
+        return redirect(request.path)
+    
     def is_suspicious_login(self, request, ip, fingerprint):
-        user_ips = request.session.get('user_ips', [])
-        session_fp = request.session.get('device_fingerprint')
+        user_ips, fingerprints = (), ()
+        if request.user.is_authenticated:
+            from core.device_tracking import recent
+            user_ips, fingerprints = recent(request.user.pk)
         
         # New IP or device
         is_new_ip = ip not in user_ips
-        is_new_device = fingerprint != session_fp
-        
-        # Multiple failed attempts from same IP (check recent audits)
-        from core.models import LoginAudit
-        recent_fails = LoginAudit.objects.filter(
-            ip_address=ip, success=False
-        ).filter(timestamp__lt=datetime.now(),
-            timestamp__gte=datetime.now() - timedelta(minutes=15)
-        ).count()
+        is_new_device = fingerprint not in fingerprints
         
-        return is_new_ip or is_new_device or recent_fails > 3
+        # Multiple failed attempts from same IP (windowed counter in the cache)
+        from core import login_throttle
+        return is_new_ip or is_new_device or login_throttle.is_suspicious(ip)
     
     @staticmethod
     def get_client_ip(request):
@@ -435,16 +432,7 @@ class TwoFactorAuthenticationMiddleware(MiddlewareMixin):
         
         # User must be authenticated
         if not request.user.is_authenticated:
-            # For API requests, return 401
-            if request.path.startswith('/api/'):
-                return JsonResponse({
-                    'error': 'Authentication required',
-                    'detail': 'Please login and verify OTP'
-                }, status=401)
-            
-            # For HTML requests, redirect to login
-            from django.shortcuts import redirect
-            return redirect('login')
+            return self.unauthenticated_response(request)
         
         # Check if user has verified 2FA
         # We check this via:
@@ -464,4 +452,15 @@ class TwoFactorAuthenticationMiddleware(MiddlewareMixin):
             pass
         
         return None
-
+    
+    @staticmethod
+    def unauthenticated_response(request):
+        """401 for API requests, a redirect to login for pages."""
+        if request.path.startswith('/api/'):
+            return JsonResponse({
+                'error': 'Authentication required',
+                'detail': 'Please login and verify OTP'
+            }, status=401)
+        
+        from django.shortcuts import redirect
+        return redirect('login')
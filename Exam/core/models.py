@@ -31,6 +31,26 @@ class ActiveUserSession(models.Model):
     def __str__(self):
         return f"Active session for {self.user.username}: {self.session_key}"
 
+class DeviceSighting(models.Model):
+    """An IP address and device fingerprint seen for a user (core.device_tracking)."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='device_sightings')
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64)
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-last_seen']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ip_address', 'fingerprint'], name='unique_device_sighting'),
+        ]
+        indexes = [models.Index(fields=['user', '-last_seen'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.ip_address} ({self.fingerprint[:12]})"
+
+
 class LoginAudit(models.Model):
     """Audit log for login attempts."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
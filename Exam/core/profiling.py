@@ -0,0 +1,340 @@
+"""
+Request Profiling
+Per-route latency, query, cache and template histograms.
+
+ProfilingMiddleware (enabled by settings.PROFILING['ENABLED']) measures
+each request and records, under the route's view name:
+
+    wall_ms         from the start of the security pipeline (or of
+                    AuditLoggingMiddleware) to the response
+    security_ms     time spent in the security pipeline's request stages
+    db_queries      queries run, counted by a connection.execute_wrapper
+    db_ms           time spent in those queries
+    cache_hits      default cache reads that found a value
+    cache_misses    default cache reads that did not
+    template_ms     time spent rendering templates
+
+Values go into in-process log-linear histograms (HDR-style: a fixed
+number of sub-buckets per power of two, so every recorded value is kept
+to within 1/16 of its size in constant memory). snapshot() returns the
+counts and percentiles per route and prometheus_text() renders them as
+Prometheus summaries; both are served to staff by examProject.views.
+
+Requests slower than SLOW_MS are logged to the 'app' logger with their
+queries, for a SAMPLE_RATE fraction of them.
+"""
+
+import contextvars
+import functools
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger('app')
+
+METRICS = ('wall_ms', 'security_ms', 'db_queries', 'db_ms', 'cache_hits', 'cache_misses', 'template_ms')
+TIME_METRICS = frozenset(['wall_ms', 'security_ms', 'db_ms', 'template_ms'])
+QUANTILES = (0.5, 0.9, 0.99)
+UNRESOLVED = '<unresolved>'
+
+
+def config():
+    defaults = {
+        'ENABLED': False,
+        'SLOW_MS': 500,
+        'SAMPLE_RATE': 1.0,
+        'MAX_QUERIES': 100,
+        'METRICS_TOKEN': '',
+    }
+    defaults.update(getattr(settings, 'PROFILING', {}))
+    return defaults
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative integers. Values below 32 have a
+    bucket each; above that every power of two is split into 16 buckets.
+    """
+
+    SUB_BUCKET_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def index(cls, value):
+        shift = max(0, value.bit_length() - cls.SUB_BUCKET_BITS - 1)
+        return shift * cls.SUB_BUCKETS + (value >> shift)
+
+    @classmethod
+    def upper_bound(cls, index):
+        shift = max(0, index // cls.SUB_BUCKETS - 1)
+        return ((index - shift * cls.SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, quantile):
+        """Upper bound of the bucket holding the quantile, capped at the maximum."""
+        if not self.count:
+            return 0
+        rank = max(1, int(quantile * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.upper_bound(index), self.max)
+        return self.max
+
+
+# Times are recorded in microseconds and reported in milliseconds
+_histograms = defaultdict(lambda: {metric: Histogram() for metric in METRICS})
+_lock = threading.Lock()
+
+
+def record(route, values):
+    """Add one request's values to the route's histograms."""
+    with _lock:
+        histograms = _histograms[route]
+        for metric, value in values.items():
+            histograms[metric].record(value * 1000 if metric in TIME_METRICS else value)
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def snapshot():
+    """{route: {metric: {count, mean, max, p50, p90, p99}}}; times in milliseconds."""
+    result = {}
+    with _lock:
+        for route, histograms in sorted(_histograms.items()):
+            result[route] = {}
+            for metric, histogram in histograms.items():
+                scale = 1000 if metric in TIME_METRICS else 1
+                summary = {
+                    'count': histogram.count,
+                    'mean': round(histogram.total / histogram.count / scale, 3) if histogram.count else 0,
+                    'max': round(histogram.max / scale, 3),
+                }
+                for quantile in QUANTILES:
+                    summary[f'p{int(quantile * 100)}'] = round(histogram.percentile(quantile) / scale, 3)
+                result[route][metric] = summary
+    return result
+
+
+def prometheus_text():
+    """The histograms as Prometheus summaries (text exposition format)."""
+    lines = []
+    data = snapshot()
+    for metric in METRICS:
+        name = f'exam_request_{metric[:-3]}_seconds' if metric in TIME_METRICS else f'exam_request_{metric}'
+        scale = 1000 if metric in TIME_METRICS else 1
+        lines.append(f'# TYPE {name} summary')
+        for route, metrics in data.items():
+            summary = metrics[metric]
+            label = route.replace('\\', '\\\\').replace('"', '\\"')
+            for quantile in QUANTILES:
+                value = summary[f'p{int(quantile * 100)}'] / scale
+                lines.append(f'{name}{{route="{label}",quantile="{quantile}"}} {value:g}')
+            lines.append(f'{name}_sum{{route="{label}"}} {summary["mean"] * summary["count"] / scale:g}')
+            lines.append(f'{name}_count{{route="{label}"}} {summary["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------- collection
+
+class RequestProfile:
+    """Counters for the request being handled on this thread or task."""
+
+    __slots__ = (
+        'queries', 'query_count', 'db_ms', 'cache_hits', 'cache_misses', 'template_ms', 'max_queries', 'depth',
+    )
+
+    def __init__(self, max_queries):
+        self.queries = []
+        self.query_count = 0
+        self.db_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_ms = 0.0
+        self.max_queries = max_queries
+        # Nesting of instrumented calls, per kind ('cache', 'template')
+        self.depth = defaultdict(int)
+
+
+_current = contextvars.ContextVar('request_profile', default=None)
+_MISSING = object()
+_installed = False
+_install_lock = threading.Lock()
+
+
+def _profile_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        profile.query_count += 1
+        profile.db_ms += duration
+        if len(profile.queries) < profile.max_queries:
+            profile.queries.append((round(duration, 3), sql))
+
+
+def _outermost(kind, method, on_exit):
+    """Wrap method so only the outermost call of a nested chain of one kind is counted."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.depth[kind]:
+            return method(*args, **kwargs)
+        profile.depth[kind] += 1
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        finally:
+            profile.depth[kind] -= 1
+        on_exit(profile, args, kwargs, result, (time.perf_counter() - start) * 1000)
+        return result
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def _count_get(profile, args, kwargs, result, duration):
+    if result is _MISSING:
+        profile.cache_misses += 1
+    else:
+        profile.cache_hits += 1
+
+
+def _count_get_many(profile, args, kwargs, result, duration):
+    keys = list(args[1] if len(args) > 1 else kwargs.get('keys', ()))
+    profile.cache_hits += len(result)
+    profile.cache_misses += len(keys) - len(result)
+
+
+def _time_template(profile, args, kwargs, result, duration):
+    profile.template_ms += duration
+
+
+def _instrument_cache(backend_class):
+    get = _outermost('cache', backend_class.get, _count_get)
+
+    @functools.wraps(backend_class.get)
+    def counted_get(self, key, default=None, version=None):
+        # Misses are told apart with a private sentinel
+        value = get(self, key, _MISSING, version)
+        return default if value is _MISSING else value
+
+    counted_get._profiled = True
+    backend_class.get = counted_get
+    backend_class.get_many = _outermost('cache', backend_class.get_many, _count_get_many)
+
+
+def install():
+    """Instrument the default cache backend and Django template rendering, once per process."""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        from django.core.cache import caches
+        from django.template.backends.django import Template
+
+        backend_class = type(caches['default'])
+        if not getattr(backend_class.get, '_profiled', False):
+            _instrument_cache(backend_class)
+        if not getattr(Template.render, '_profiled', False):
+            Template.render = _outermost('template', Template.render, _time_template)
+        _installed = True
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match.route) if match else UNRESOLVED
+
+
+class ProfilingMiddleware:
+    """
+    Profile each request into the per-route histograms. Placed after
+    SecurityPipelineMiddleware so the pipeline's start time and stage
+    timings are available.
+    """
+
+    def __init__(self, get_response):
+        options = config()
+        if not options['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.slow_ms = options['SLOW_MS']
+        self.sample_rate = options['SAMPLE_RATE']
+        self.max_queries = options['MAX_QUERIES']
+        install()
+
+    @staticmethod
+    def started(request):
+        """perf_counter() at the start of the request, from the security middleware's timing fields."""
+        context = getattr(request, 'security', None)
+        if context is not None:
+            return context.started
+        audit_start = getattr(request, '_audit_start_time', None)
+        if audit_start is not None:
+            from datetime import datetime
+            return time.perf_counter() - (datetime.now() - audit_start).total_seconds()
+        return time.perf_counter()
+
+    def __call__(self, request):
+        from django.db import connection
+
+        started = self.started(request)
+        profile = RequestProfile(self.max_queries)
+        token = _current.set(profile)
+        try:
+            with connection.execute_wrapper(_profile_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        wall_ms = (time.perf_counter() - started) * 1000
+        context = getattr(request, 'security', None)
+        route = route_name(request)
+        record(route, {
+            'wall_ms': wall_ms,
+            'security_ms': sum(context.timings.values()) if context is not None else 0,
+            'db_queries': profile.query_count,
+            'db_ms': profile.db_ms,
+            'cache_hits': profile.cache_hits,
+            'cache_misses': profile.cache_misses,
+            'template_ms': profile.template_ms,
+        })
+
+        if wall_ms > self.slow_ms and random.random() < self.sample_rate:
+            logger.warning(
+                f'Slow request {request.method} {request.path} ({route}): {wall_ms:.1f}ms, '
+                f'{profile.query_count} queries in {profile.db_ms:.1f}ms, '
+                f'templates {profile.template_ms:.1f}ms, '
+                f'cache {profile.cache_hits} hits / {profile.cache_misses} misses'
+                + ''.join(f'\n  {duration:.1f}ms {sql}' for duration, sql in profile.queries)
+            )
+        return response
@@ -0,0 +1,183 @@
+"""
+Query Budget
+Guards against N+1 queries in tests and during development.
+
+QueryBudget is a context manager and decorator that fails with
+QueryBudgetExceeded (an AssertionError) when the wrapped code runs more
+queries than allowed. The error lists the queries and the SQL shapes
+that repeated, which is where an N+1 usually shows:
+
+    with QueryBudget(4):
+        client.get('/exams/student/viewexams/')
+
+    @QueryBudget(2)
+    def load_dashboard(user): ...
+
+assert_max_queries() is the same check as a test helper, and
+QueryBudgetMixin adds it to a TestCase as assertMaxQueries().
+
+RepeatedQueryMiddleware (settings.QUERY_BUDGET['REPEAT_WARNINGS'], on in
+DEBUG) logs a warning to the 'app' logger, with a sample of the calling
+stack, whenever one request runs the same SQL shape more than
+REPEAT_THRESHOLD times.
+"""
+
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import ContextDecorator, ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger('app')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def config():
+    defaults = {
+        'REPEAT_WARNINGS': settings.DEBUG,
+        'REPEAT_THRESHOLD': 10,
+        'STACK_DEPTH': 8,
+    }
+    defaults.update(getattr(settings, 'QUERY_BUDGET', {}))
+    return defaults
+
+
+def sql_shape(sql):
+    """The query with literals and IN lists collapsed, so repeats of one query compare equal."""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return _SPACE.sub(' ', shape).strip()
+
+
+def _stack_sample(depth):
+    """The innermost project frames of the current stack, outside Django and this module."""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+        and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-depth:]))
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that records each query and its shape."""
+
+    def __init__(self, repeat_threshold=None, stack_depth=0):
+        self.queries = []
+        self.shapes = Counter()
+        self.repeat_threshold = repeat_threshold
+        self.stack_depth = stack_depth
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = sql_shape(sql)
+        self.queries.append(sql)
+        self.shapes[shape] += 1
+        if self.repeat_threshold is not None and self.shapes[shape] == self.repeat_threshold + 1:
+            self.stacks[shape] = _stack_sample(self.stack_depth)
+        return execute(sql, params, many, context)
+
+    def repeated(self, more_than=1):
+        """[(shape, count)] of the shapes run more than more_than times, most repeated first."""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > more_than]
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryBudget(ContextDecorator):
+    """Fail when the wrapped code runs more than max_queries queries."""
+
+    def __init__(self, max_queries, using=DEFAULT_DB_ALIAS, label=None):
+        self.max_queries = max_queries
+        self.using = using
+        self.label = label
+        self.recorder = None
+        self._stack = None
+
+    def __enter__(self):
+        self.recorder = QueryRecorder()
+        self._stack = ExitStack()
+        self._stack.enter_context(connections[self.using].execute_wrapper(self.recorder))
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._stack.close()
+        if exc_type is None and self.count > self.max_queries:
+            raise QueryBudgetExceeded(self.report())
+        return False
+
+    @property
+    def count(self):
+        return len(self.recorder.queries)
+
+    @property
+    def queries(self):
+        return self.recorder.queries
+
+    def report(self):
+        lines = [f"{self.label or 'Code'} ran {self.count} queries, budget is {self.max_queries}"]
+        repeated = self.recorder.repeated()
+        if repeated:
+            lines.append('Repeated:')
+            lines.extend(f'  {count}x {shape}' for shape, count in repeated[:5])
+        lines.append('Queries:')
+        lines.extend(f'  {n}. {sql}' for n, sql in enumerate(self.queries, 1))
+        return '\n'.join(lines)
+
+
+def assert_max_queries(max_queries, func=None, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Fail if func(*args, **kwargs) runs more than max_queries queries and
+    return its result; without func, return a QueryBudget context manager.
+    """
+    budget = QueryBudget(max_queries, using=using)
+    if func is None:
+        return budget
+    with budget:
+        return func(*args, **kwargs)
+
+
+class QueryBudgetMixin:
+    """TestCase mixin providing assertMaxQueries(), the upper-bound companion of assertNumQueries()."""
+
+    def assertMaxQueries(self, max_queries, func=None, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+        return assert_max_queries(max_queries, func, *args, using=using, **kwargs)
+
+
+class RepeatedQueryMiddleware:
+    """Warn about requests that run the same SQL shape over and over (development only)."""
+
+    def __init__(self, get_response):
+        options = config()
+        if not options['REPEAT_WARNINGS']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.threshold = options['REPEAT_THRESHOLD']
+        self.stack_depth = options['STACK_DEPTH']
+
+    def __call__(self, request):
+        recorder = QueryRecorder(repeat_threshold=self.threshold, stack_depth=self.stack_depth)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        for shape, count in recorder.repeated(self.threshold):
+            logger.warning(
+                f'Repeated query on {request.method} {request.path}: {count}x {shape}\n'
+                f'{recorder.stacks.get(shape, "")}'
+            )
+        return response
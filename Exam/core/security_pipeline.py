@@ -0,0 +1,256 @@
+"""
+Security Pipeline
+One middleware running the security checks as ordered stages.
+
+SecurityPipelineMiddleware replaces the chain of SecurityHeaders,
+RateLimit, IPTracking, DeviceFingerprinting, SuspiciousLogin,
+TwoFactorAuthentication and AuditLogging middleware. Request metadata is
+parsed once into `request.security` (a SecurityContext): client IP, user
+agent, device fingerprint and the path classes every stage needs. The
+path prefix lists of the original middleware are compiled into one
+anchored regex each.
+
+Stages run in SECURITY_PIPELINE_STAGES order: request stages until one
+returns a response, then every response stage. Each stage is timed; the
+timings are kept on the context and, with SECURITY_PIPELINE_TIMING, sent
+as a Server-Timing header.
+"""
+
+import ipaddress
+import logging
+import re
+import time
+
+from django.conf import settings
+
+from core.middleware import (
+    AuditLoggingMiddleware,
+    RateLimitMiddleware,
+    DeviceFingerprinting,
+    SecurityHeadersMiddleware,
+    SuspiciousLoginMiddleware,
+    TwoFactorAuthenticationMiddleware,
+)
+
+logger = logging.getLogger('security')
+
+DEFAULT_STAGES = [
+    'rate_limit',
+    'client_tracking',
+    'suspicious_login',
+    'two_factor',
+    'security_headers',
+    'audit_log',
+]
+AUDIT_METHODS = frozenset(['POST', 'PUT', 'DELETE', 'PATCH'])
+SLOW_PIPELINE_MS = 50
+
+
+def compile_prefixes(prefixes):
+    """One anchored regex matching any of the path prefixes."""
+    if not prefixes:
+        return re.compile(r'(?!)')
+    ordered = sorted(set(prefixes), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(prefix) for prefix in ordered))
+
+
+AUDIT_PATHS = compile_prefixes(AuditLoggingMiddleware.AUDIT_PATHS)
+AUDIT_SAFE_PATHS = compile_prefixes(AuditLoggingMiddleware.SAFE_PATHS)
+LOGIN_PATHS = compile_prefixes(SuspiciousLoginMiddleware.LOGIN_PATHS)
+PROTECTED_PATHS = compile_prefixes(TwoFactorAuthenticationMiddleware.PROTECTED_PATHS)
+EXEMPT_PATHS = compile_prefixes(TwoFactorAuthenticationMiddleware.EXEMPT_PATHS)
+WHITELIST_PATHS = compile_prefixes(['/admin/', '/api/v1/auth/', '/api/v2/auth/'])
+
+
+def valid_ip(value):
+    """value as a normalised IP address string, or None if it is not one."""
+    try:
+        return str(ipaddress.ip_address(str(value).strip()))
+    except ValueError:
+        return None
+
+
+def client_ip(request):
+    """
+    The client address: the first X-Forwarded-For hop if it is a valid
+    address, else REMOTE_ADDR.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        forwarded = valid_ip(x_forwarded_for.split(',')[0])
+        if forwarded:
+            return forwarded
+    return request.META.get('REMOTE_ADDR')
+
+
+class SecurityContext:
+    """Request metadata shared by the pipeline stages, parsed once."""
+
+    __slots__ = ('ip', 'user_agent', 'path', '_fingerprint', 'request', 'started', 'timings')
+
+    def __init__(self, request):
+        self.request = request
+        self.ip = client_ip(request)
+        self.user_agent = request.META.get('HTTP_USER_AGENT', 'Unknown')
+        self.path = request.path
+        self._fingerprint = None
+        self.started = time.perf_counter()
+        self.timings = {}
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = DeviceFingerprinting.generate_fingerprint(self.request)
+        return self._fingerprint
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+# Request stages: (request, context) -> response or None
+
+def ip_whitelist_stage(request, context):
+    if not WHITELIST_PATHS.match(context.path):
+        return None
+    from core.ip_whitelist import is_whitelisted
+    if is_whitelisted(context.ip):
+        return None
+
+    from django.http import JsonResponse
+    from core import audit_sink
+    from core.models import AuditLog
+    logger.warning(f'IP not whitelisted: {context.ip} on {context.path}')
+    audit_sink.record(AuditLog(
+        user=request.user if request.user.is_authenticated else None,
+        action='IP_BLOCKED',
+        ip_address=context.ip,
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        success=False,
+        details={'path': context.path}
+    ))
+    return JsonResponse({'error': 'Access denied: IP not whitelisted'}, status=403)
+
+
+def rate_limit_stage(request, context):
+    from core.ratelimit import check
+    decision = check(request, context.ip)
+    if decision.allowed:
+        return None
+    return RateLimitMiddleware.limited_response(decision)
+
+
+def client_tracking_stage(request, context):
+    """Recent IPs and devices per user (core.device_tracking), without the session."""
+    from core.device_tracking import track_request
+    track_request(request, context.ip)
+    return None
+
+
+def single_session_stage(request, context):
+    from core.active_sessions import enforce
+    enforce(request)
+    return None
+
+
+_login_auditor = SuspiciousLoginMiddleware(lambda request: None)
+
+
+def suspicious_login_stage(request, context):
+    if request.method != 'POST' or not LOGIN_PATHS.match(context.path):
+        return None
+    return _login_auditor.record_attempt(
+        request, context.ip, context.user_agent, getattr(request, 'device_fingerprint', 'unknown')
+    )
+
+
+def two_factor_stage(request, context):
+    if not PROTECTED_PATHS.match(context.path) or EXEMPT_PATHS.match(context.path):
+        return None
+    if not request.user.is_authenticated:
+        return TwoFactorAuthenticationMiddleware.unauthenticated_response(request)
+    return None
+
+
+# Response stages: (request, response, context) -> None
+
+def security_headers_stage(request, response, context):
+    for header, value in SecurityHeadersMiddleware.HEADERS.items():
+        response[header] = value
+
+
+def audit_log_stage(request, response, context):
+    if request.method not in AUDIT_METHODS:
+        return
+    if not AUDIT_PATHS.match(context.path) or AUDIT_SAFE_PATHS.match(context.path):
+        return
+    AuditLoggingMiddleware.log_entry(
+        request, response, context.ip or 'Unknown', context.user_agent, context.elapsed_ms / 1000
+    )
+
+
+REQUEST_STAGES = {
+    'ip_whitelist': ip_whitelist_stage,
+    'rate_limit': rate_limit_stage,
+    'client_tracking': client_tracking_stage,
+    'single_session': single_session_stage,
+    'suspicious_login': suspicious_login_stage,
+    'two_factor': two_factor_stage,
+}
+RESPONSE_STAGES = {
+    'security_headers': security_headers_stage,
+    'audit_log': audit_log_stage,
+}
+
+
+def configured_stages():
+    """(request stages, response stages) as (name, function) lists, in configured order."""
+    names = getattr(settings, 'SECURITY_PIPELINE_STAGES', None) or DEFAULT_STAGES
+    unknown = [name for name in names if name not in REQUEST_STAGES and name not in RESPONSE_STAGES]
+    if unknown:
+        raise ValueError(f"Unknown security pipeline stage(s): {', '.join(unknown)}")
+    return (
+        [(name, REQUEST_STAGES[name]) for name in names if name in REQUEST_STAGES],
+        [(name, RESPONSE_STAGES[name]) for name in names if name in RESPONSE_STAGES],
+    )
+
+
+class SecurityPipelineMiddleware:
+    """Run the configured security stages around each request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.request_stages, self.response_stages = configured_stages()
+        self.send_timing = getattr(settings, 'SECURITY_PIPELINE_TIMING', settings.DEBUG)
+
+    def __call__(self, request):
+        context = SecurityContext(request)
+        request.security = context
+        timings = context.timings
+
+        response = None
+        for name, stage in self.request_stages:
+            start = time.perf_counter()
+            response = stage(request, context)
+            timings[name] = (time.perf_counter() - start) * 1000
+            if response is not None:
+                break
+
+        own_ms = sum(timings.values())
+        if response is None:
+            response = self.get_response(request)
+
+        for name, stage in self.response_stages:
+            start = time.perf_counter()
+            stage(request, response, context)
+            timings[name] = (time.perf_counter() - start) * 1000
+        own_ms += sum(timings[name] for name, _ in self.response_stages)
+
+        if own_ms > SLOW_PIPELINE_MS:
+            logger.warning(f'Slow security pipeline on {context.path}: {own_ms:.1f}ms {timings}')
+        if self.send_timing:
+            response['Server-Timing'] = ', '.join(
+                [f'sec-{name};dur={ms:.2f}' for name, ms in timings.items()]
+                + [f'security;dur={own_ms:.2f}']
+            )
+        return response
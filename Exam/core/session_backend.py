@@ -0,0 +1,133 @@
+"""
+Session Backend
+Two-tier session engine: a per-process LRU in front of cached_db sessions.
+
+    local   the last SESSION_LOCAL_CACHE_SIZE signed-in sessions of this
+            process, each served for at most SESSION_LOCAL_CACHE_TTL
+            seconds before it is read from the cache again
+    cache   the configured cache (Redis in production, LocMem in DEBUG)
+    db      django_session, for durability
+
+Only sessions of signed-in users are kept locally; anonymous sessions
+are read from the cache as before. A save is skipped when the session
+data is unchanged since it was loaded, so requests that only touch the
+session write nothing (unless SESSION_SAVE_EVERY_REQUEST asks for it).
+
+invalidate() removes a session from every tier and is what
+core.active_sessions uses to evict a replaced session. Other processes
+drop their local copy when its TTL runs out, so the TTL bounds how long
+an evicted session can still be read there.
+
+Enable with SESSION_ENGINE = 'core.session_backend'.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class LocalTier:
+    """Thread-safe LRU of session data with a per-entry time to live."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _limits():
+        return (
+            getattr(settings, 'SESSION_LOCAL_CACHE_SIZE', 1000),
+            getattr(settings, 'SESSION_LOCAL_CACHE_TTL', 5),
+        )
+
+    def get(self, session_key):
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[session_key]
+                return None
+            self._entries.move_to_end(session_key)
+        return copy.deepcopy(data)
+
+    def put(self, session_key, data):
+        size, ttl = self._limits()
+        if not size or not ttl:
+            return
+        data = copy.deepcopy(data)
+        with self._lock:
+            self._entries[session_key] = (data, time.monotonic() + ttl)
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_key):
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_tier = LocalTier()
+
+
+class SessionStore(CachedDBStore):
+    """cached_db sessions with a local hot tier and change-only writes."""
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded = None
+
+    def load(self):
+        data = local_tier.get(self.session_key) if self.session_key else None
+        if data is None:
+            data = super().load()
+            if SESSION_KEY in data:
+                local_tier.put(self.session_key, data)
+        self._loaded = copy.deepcopy(data)
+        return data
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self._loaded is not None
+            and self._session == self._loaded
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+        ):
+            # Marked modified, but nothing changed
+            return
+        super().save(must_create)
+        self._loaded = copy.deepcopy(self._session)
+        if SESSION_KEY in self._session:
+            local_tier.put(self.session_key, self._session)
+        else:
+            local_tier.discard(self.session_key)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        if key:
+            local_tier.discard(key)
+        super().delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        local_tier.clear()
+        super().clear_expired()
+
+
+def invalidate(session_key):
+    """End a session everywhere: this process's tier, the cache and the database."""
+    if session_key:
+        SessionStore(session_key=session_key).delete()
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_migrate
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.dispatch import receiver
 from django.core.management import call_command
 
+from core.models import IPWhitelist
+
 
 @receiver(post_migrate)
 def create_default_groups(sender, **kwargs):
@@ -33,3 +36,52 @@ def create_default_groups(sender, **kwargs):
         call_command('create_groups', verbosity=0)
     except Exception as e:
         print(f"Error creating groups: {str(e)}")
+
+
+@receiver([post_save, post_delete], sender=IPWhitelist)
+def invalidate_ip_whitelist(sender, **kwargs):
+    """Rebuild the compiled IP whitelist (core.ip_whitelist) in every process."""
+    from core.ip_whitelist import invalidate
+    invalidate()
+
+
+@receiver(user_logged_in)
+def claim_active_session(sender, request, user, **kwargs):
+    """Make the new login the user's only session (core.active_sessions)."""
+    from core import active_sessions
+    if not active_sessions.is_enabled():
+        return
+    session_key = getattr(getattr(request, 'session', None), 'session_key', None)
+    if session_key:
+        active_sessions.claim(user.pk, session_key)
+
+
+@receiver(user_logged_out)
+def forget_active_session(sender, request, user, **kwargs):
+    if user is not None:
+        from core import active_sessions
+        active_sessions.forget(user.pk)
+
+
+def _request_ip(request):
+    context = getattr(request, 'security', None)
+    if context is not None:
+        return context.ip
+    from core.security_pipeline import client_ip
+    return client_ip(request)
+
+
+@receiver(user_login_failed)
+def count_failed_login(sender, credentials, request=None, **kwargs):
+    """Count the failure per address and username (core.login_throttle)."""
+    from core import login_throttle
+    login_throttle.record_failure(
+        ip=_request_ip(request) if request is not None else None,
+        username=credentials.get('username'),
+    )
+
+
+@receiver(user_logged_in)
+def clear_failed_logins(sender, request, user, **kwargs):
+    from core import login_throttle
+    login_throttle.clear(user.get_username())
@@ -0,0 +1,75 @@
+"""
+Test suite for request profiling and its histograms.
+"""
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from core import profiling
+
+
+class HistogramTests(TestCase):
+    """Test the log-linear histogram."""
+
+    def test_percentiles_within_bucket_precision(self):
+        """Test that percentiles are accurate to a sixteenth of the value."""
+        histogram = profiling.Histogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        for quantile, expected in ((0.5, 5000), (0.9, 9000), (0.99, 9900)):
+            self.assertLessEqual(abs(histogram.percentile(quantile) - expected), expected / 16)
+        self.assertEqual(histogram.percentile(1.0), 10000)
+        self.assertLess(len(histogram.counts), 200)
+
+    def test_small_values_are_exact(self):
+        """Test that every value below 32 has its own bucket."""
+        for value in range(32):
+            index = profiling.Histogram.index(value)
+            self.assertEqual(profiling.Histogram.upper_bound(index), value)
+
+
+@override_settings(PROFILING={'ENABLED': True, 'SLOW_MS': 10000, 'METRICS_TOKEN': 'scrape'})
+class ProfilingMiddlewareTests(TestCase):
+    """Test per-route collection and the metrics endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+        self.addCleanup(profiling.reset)
+
+    def test_routes_record_queries_templates_and_cache(self):
+        """Test that each route's queries, template time and cache reads are recorded."""
+        self.client.get('/')
+        self.client.force_login(User.objects.create_user(username='stud', password='TestPass123@'))
+        self.client.get('/api/v1/exams/')
+
+        routes = profiling.snapshot()
+        self.assertEqual(routes['homepage']['wall_ms']['count'], 1)
+        self.assertGreater(routes['homepage']['template_ms']['max'], 0)
+        api = routes['api:exam-list-create']
+        self.assertGreater(api['db_queries']['max'], 0)
+        self.assertGreater(api['cache_hits']['max'] + api['cache_misses']['max'], 0)
+        self.assertGreaterEqual(api['wall_ms']['max'], api['db_ms']['max'])
+
+    def test_metrics_endpoints_are_restricted(self):
+        """Test that only staff or the scrape token can read the metrics."""
+        self.client.get('/')
+        self.assertEqual(self.client.get('/admin/profiling/').status_code, 403)
+
+        response = self.client.get('/admin/profiling/metrics/', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('exam_request_wall_seconds_count{route="homepage"} 1', response.content.decode())
+
+        self.client.force_login(User.objects.create_user(username='admin', password='TestPass123@', is_staff=True))
+        response = self.client.get('/admin/profiling/')
+        self.assertEqual(response.json()['routes']['homepage']['wall_ms']['count'], 1)
+
+    @override_settings(PROFILING={'ENABLED': True, 'SLOW_MS': 0})
+    def test_slow_requests_are_logged_with_queries(self):
+        """Test that slow requests are dumped to the app logger."""
+        self.client.force_login(User.objects.create_user(username='stud', password='TestPass123@'))
+        with self.assertLogs('app', 'WARNING') as logs:
+            self.client.get('/api/v1/exams/')
+        self.assertIn('Slow request GET /api/v1/exams/', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
@@ -0,0 +1,405 @@
+"""
+Test suite for the security middleware and its supporting modules.
+"""
+
+import time
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from core import (
+    active_sessions, audit_sink, device_tracking, ip_whitelist, login_throttle, ratelimit, security_pipeline,
+    session_backend,
+)
+from core.middleware import SingleSessionMiddleware
+from core.models import ActiveUserSession, AuditLog, DeviceSighting, IPWhitelist, LoginAudit
+from core.session_backend import SessionStore
+
+
+class RateLimitTests(TestCase):
+    """Test sliding-window rate limits per user and per IP."""
+
+    def setUp(self):
+        cache.clear()
+        ratelimit.reset_policies()
+        self.addCleanup(ratelimit.reset_policies)
+
+    def test_sliding_window_counts_previous_bucket(self):
+        """Test that the previous bucket fades out instead of resetting at once."""
+        for _ in range(10):
+            self.assertEqual(ratelimit.hit('t', 10, 60, now=1200.0), (True, 0))
+        allowed, retry_after = ratelimit.hit('t', 10, 60, now=1201.0)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 59)
+
+        # Half way through the next window half of the old bucket still counts
+        for _ in range(5):
+            self.assertTrue(ratelimit.hit('t', 10, 60, now=1290.0)[0])
+        self.assertFalse(ratelimit.hit('t', 10, 60, now=1290.0)[0])
+        self.assertTrue(ratelimit.hit('t', 10, 60, now=1350.0)[0])
+
+    def test_denied_hits_are_not_counted(self):
+        """Test that retries while limited do not extend the block."""
+        for _ in range(3):
+            ratelimit.hit('d', 3, 60, now=600.0)
+        for _ in range(20):
+            self.assertFalse(ratelimit.hit('d', 3, 60, now=601.0)[0])
+        self.assertEqual(cache.get('ratelimit:d:10'), 3)
+
+    @override_settings(RATE_LIMIT_CONFIG={'POLICIES': [
+        {'name': 'api', 'path': r'^/api/', 'user': (2, 60), 'ip': (4, 60)},
+    ]})
+    def test_users_behind_one_address_get_their_own_quota(self):
+        """Test per-user limits, the shared IP limit and the Retry-After header."""
+        for name in ('a', 'b'):
+            self.client.force_login(User.objects.create_user(username=name, password='TestPass123@'))
+            statuses = [self.client.get('/api/v1/exams/').status_code for _ in range(2)]
+            self.assertNotIn(429, statuses)
+            if name == 'a':
+                response = self.client.get('/api/v1/exams/')
+                self.assertEqual(response.status_code, 429)
+                self.assertEqual(response['Retry-After'], str(response.json()['retry_after']))
+
+        # Both users share 127.0.0.1, whose limit of 4 is now used up
+        late = User.objects.create_user(username='c', password='TestPass123@')
+        self.client.force_login(late)
+        self.assertEqual(self.client.get('/api/v1/exams/').status_code, 429)
+        self.assertNotEqual(self.client.get('/').status_code, 429)
+
+        # Refused by the address, the requests left the user's own quota alone
+        index = int(time.time() // 60)
+        self.assertEqual(sum(cache.get(f'ratelimit:api:user:{late.id}:{i}', 0) for i in (index - 1, index)), 0)
+
+
+class IPWhitelistTests(TestCase):
+    """Test the compiled IP whitelist and its invalidation."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_networks_are_merged_and_matched(self):
+        """Test CIDR matching, merged ranges and IPv4-mapped addresses."""
+        whitelist = ip_whitelist.Whitelist(ip_whitelist.parse_networks([
+            '10.0.0.0/8', '10.1.0.0/16', '192.168.1.0/25', '192.168.1.128/25', '::1', 'bogus',
+        ]))
+        self.assertEqual(len(whitelist), 3)
+        self.assertIn('10.200.3.4', whitelist)
+        self.assertIn('192.168.1.255', whitelist)
+        self.assertIn('::ffff:10.0.0.1', whitelist)
+        self.assertIn('::1', whitelist)
+        self.assertNotIn('11.0.0.0', whitelist)
+        self.assertNotIn('192.168.2.0', whitelist)
+        self.assertNotIn('Unknown', whitelist)
+
+    @override_settings(IP_WHITELIST=['10.0.0.0/8'])
+    def test_lookups_skip_the_database_until_rows_change(self):
+        """Test that the whitelist is cached and rebuilt after a save or delete."""
+        self.assertFalse(ip_whitelist.is_whitelisted('203.0.113.7'))
+        with self.assertNumQueries(0):
+            self.assertTrue(ip_whitelist.is_whitelisted('10.9.8.7'))
+
+        entry = IPWhitelist.objects.create(ip_address='203.0.113.7', description='Office')
+        self.assertTrue(ip_whitelist.is_whitelisted('203.0.113.7'))
+        entry.delete()
+        self.assertFalse(ip_whitelist.is_whitelisted('203.0.113.7'))
+
+
+class SingleSessionTests(TestCase):
+    """Test cached session ownership."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='stud', password='TestPass123@')
+        self.middleware = SingleSessionMiddleware(lambda request: None)
+
+    def request_for(self, session):
+        return mock.Mock(user=self.user, session=session)
+
+    def test_steady_state_makes_no_queries(self):
+        """Test that the owning session is confirmed from the cache alone."""
+        session = SessionStore()
+        session.create()
+        self.middleware.process_request(self.request_for(session))
+        self.assertEqual(ActiveUserSession.objects.get(user=self.user).session_key, session.session_key)
+
+        with self.assertNumQueries(0):
+            self.middleware.process_request(self.request_for(session))
+
+    def test_new_session_evicts_the_old_one(self):
+        """Test that a takeover deletes the old session and writes ownership once."""
+        old, new = SessionStore(), SessionStore()
+        old['_auth_user_id'] = str(self.user.pk)
+        old.create()
+        new.create()
+        active_sessions.claim(self.user.pk, old.session_key)
+
+        self.middleware.process_request(self.request_for(new))
+        self.assertFalse(SessionStore().exists(old.session_key))
+        # Gone from this process's hot tier as well
+        self.assertEqual(SessionStore(old.session_key).load(), {})
+        self.assertEqual(active_sessions.owner(self.user.pk)[0], new.session_key)
+        self.assertEqual(ActiveUserSession.objects.get(user=self.user).session_key, new.session_key)
+
+
+class SecurityPipelineTests(TestCase):
+    """Test the single-pass security middleware."""
+
+    def setUp(self):
+        cache.clear()
+        device_tracking.flush()
+        ratelimit.reset_policies()
+        self.addCleanup(ratelimit.reset_policies)
+
+    def test_prefix_matching(self):
+        """Test that compiled prefixes match like the original startswith scans."""
+        protected = security_pipeline.PROTECTED_PATHS
+        exempt = security_pipeline.EXEMPT_PATHS
+        self.assertTrue(protected.match('/student/dashboard'))
+        self.assertTrue(exempt.match('/student/login'))
+        self.assertFalse(protected.match('/about/student/'))
+        self.assertFalse(security_pipeline.compile_prefixes([]).match('/'))
+
+    @override_settings(SECURITY_PIPELINE_TIMING=True)
+    def test_context_headers_and_timings(self):
+        """Test that a request is parsed once, tracked and answered with headers and timings."""
+        user = User.objects.create_user(username='stud', password='TestPass123@')
+        self.client.force_login(user)
+        response = self.client.get('/api/v1/exams/', HTTP_X_FORWARDED_FOR='198.51.100.4, 10.0.0.1')
+
+        context = response.wsgi_request.security
+        self.assertEqual(context.ip, '198.51.100.4')
+        self.assertEqual(set(context.timings), {
+            'rate_limit', 'client_tracking', 'suspicious_login', 'two_factor', 'security_headers', 'audit_log',
+        })
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertIn('sec-rate_limit;dur=', response['Server-Timing'])
+        self.assertEqual(device_tracking.recent(user.pk)[0], ('198.51.100.4',))
+        self.assertEqual(response.wsgi_request.device_fingerprint, context.fingerprint)
+        self.assertNotIn('user_ips', self.client.session)
+        device_tracking.flush()
+
+    def test_unauthenticated_protected_path(self):
+        """Test that the two-factor stage stops anonymous API requests."""
+        response = self.client.get('/api/v1/student/progress/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['X-Content-Type-Options'], 'nosniff')
+
+
+class DeviceTrackingTests(TestCase):
+    """Test cache-backed IP and device tracking."""
+
+    def setUp(self):
+        cache.clear()
+        device_tracking.flush()
+        self.user = User.objects.create_user(username='stud', password='TestPass123@')
+
+    def test_known_devices_cost_one_cache_read(self):
+        """Test that repeat sightings skip the database and new ones are batched."""
+        self.assertTrue(device_tracking.track(self.user.pk, '198.51.100.1', 'a' * 64))
+        with self.assertNumQueries(0):
+            self.assertFalse(device_tracking.track(self.user.pk, '198.51.100.1', 'a' * 64))
+        for n in range(2, 8):
+            device_tracking.track(self.user.pk, f'198.51.100.{n}', 'a' * 64)
+
+        ips, fingerprints = device_tracking.recent(self.user.pk)
+        self.assertEqual(ips, tuple(f'198.51.100.{n}' for n in range(3, 8)))
+        self.assertEqual(fingerprints, ('a' * 64,))
+
+        self.assertEqual(device_tracking.flush(), 7)
+        device_tracking.track(self.user.pk, '198.51.100.1', 'b' * 64)
+        device_tracking.flush()
+        self.assertEqual(DeviceSighting.objects.filter(user=self.user).count(), 8)
+
+        # Rebuilt from the table after eviction
+        cache.clear()
+        self.assertIn('b' * 64, device_tracking.recent(self.user.pk)[1])
+
+    def test_anonymous_and_static_requests_are_skipped(self):
+        """Test that tracking never loads the session for anonymous or static requests."""
+        request = mock.Mock(path='/static/app.css', COOKIES={}, META={})
+        self.assertFalse(device_tracking.is_trackable(request))
+        request = mock.Mock(path='/student/', COOKIES={}, META={})
+        self.assertFalse(device_tracking.is_trackable(request))
+        request.user.is_authenticated.assert_not_called()
+
+
+@override_settings(AUDIT_SINK_WORKER=False)
+class AuditSinkTests(TestCase):
+    """Test the buffered audit sink."""
+
+    def setUp(self):
+        audit_sink.flush()
+
+    def test_rows_are_batched_per_model(self):
+        """Test that queued audit rows are written together by flush()."""
+        user = User.objects.create_user(username='stud', password='TestPass123@')
+        before = audit_sink.stats().get('rows_batches', 0)
+        for n in range(3):
+            audit_sink.record(AuditLog(user=user, action='OTP_RESEND', ip_address='127.0.0.1', user_agent='t'))
+        audit_sink.record(LoginAudit(
+            user=user, ip_address='127.0.0.1', user_agent='t', device_fingerprint='', success=True,
+        ))
+        self.assertFalse(AuditLog.objects.filter(user=user).exists())
+
+        # One user lookup and one insert per model, inside the batch's savepoint
+        with self.assertNumQueries(5):
+            self.assertEqual(audit_sink.flush(), 4)
+        self.assertEqual(AuditLog.objects.filter(user=user).count(), 3)
+        self.assertEqual(LoginAudit.objects.filter(user=user).count(), 1)
+        self.assertEqual(audit_sink.stats()['rows_batches'], before + 1)
+
+    def test_full_queue_writes_synchronously(self):
+        """Test that a full queue applies backpressure instead of dropping entries."""
+        overflow = audit_sink.stats().get('rows_overflow', 0)
+        with mock.patch.object(audit_sink._rows, 'put_nowait', side_effect=audit_sink.queue.Full):
+            audit_sink.record(AuditLog(action='IP_BLOCKED', ip_address='127.0.0.1', user_agent='t'))
+        self.assertTrue(AuditLog.objects.filter(action='IP_BLOCKED').exists())
+        self.assertEqual(audit_sink.stats()['rows_overflow'], overflow + 1)
+
+    def test_bad_row_does_not_block_the_batch(self):
+        """Test that a row the database rejects is dropped and the rest are written."""
+        dropped = audit_sink.stats().get('rows_dropped', 0)
+        audit_sink.record(LoginAudit(ip_address='127.0.0.1', user_agent=None, device_fingerprint='', success=False))
+        audit_sink.record(LoginAudit(ip_address='127.0.0.1', user_agent='t', device_fingerprint='', success=False))
+        with self.assertLogs('app', 'ERROR'):
+            self.assertEqual(audit_sink.flush(), 1)
+        self.assertEqual(LoginAudit.objects.get().user_agent, 't')
+        self.assertEqual(audit_sink.stats()['rows_dropped'], dropped + 1)
+        self.assertEqual(audit_sink.stats()['rows_depth'], 0)
+
+    def test_malformed_addresses_are_normalised(self):
+        """Test that a malformed forwarded address falls back to REMOTE_ADDR."""
+        self.client.post('/student/login/', {'username': 'x', 'password': 'y'}, HTTP_X_FORWARDED_FOR=',1.2.3.4')
+        audit_sink.record(AuditLog(action='IP_BLOCKED', ip_address='Unknown', user_agent='t'))
+        audit_sink.flush()
+        self.assertEqual(LoginAudit.objects.get().ip_address, '127.0.0.1')
+        self.assertEqual(AuditLog.objects.get(action='IP_BLOCKED').ip_address, audit_sink.UNKNOWN_IP)
+
+    def test_log_records_are_written_in_batches(self):
+        """Test that the queue handler formats and writes records off the caller's thread."""
+        import logging
+        import os
+        import tempfile
+
+        path = os.path.join(tempfile.mkdtemp(), 'audit.log')
+        handler = audit_sink.AuditQueueHandler(path)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for n in range(3):
+            handler.handle(logging.makeLogRecord({'msg': audit_sink.JsonMessage({'n': n})}))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(handler.flush_queue(), 3)
+        handler.close()
+        audit_sink._handlers.remove(handler)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines(), ['{"n": 0}', '{"n": 1}', '{"n": 2}'])
+
+
+@override_settings(AUDIT_SINK_WORKER=False)
+class LoginThrottleTests(TestCase):
+    """Test the windowed failed-login counters and lockouts."""
+
+    def setUp(self):
+        cache.clear()
+        audit_sink.flush()
+
+    def test_failures_expire_with_their_buckets(self):
+        """Test that failures are counted per address and username within the window only."""
+        for n in range(3):
+            login_throttle.record_failure(ip='198.51.100.9', username='Stud', now=6000.0 + n * 60)
+        self.assertEqual(
+            login_throttle.failures(ip='198.51.100.9', username='stud', now=6120.0),
+            {'ip': 3, 'username': 3},
+        )
+        # The first bucket leaves the 15 minute window
+        self.assertEqual(login_throttle.failures(ip='198.51.100.9', now=6000.0 + 900)['ip'], 2)
+        with self.assertNumQueries(0):
+            self.assertFalse(login_throttle.is_suspicious('198.51.100.9'))
+
+    def test_lockout_refuses_further_attempts(self):
+        """Test that repeated failures lock the username and a login clears it."""
+        User.objects.create_user(username='stud', password='TestPass123@')
+        for _ in range(5):
+            response = self.client.post(
+                '/api/v1/auth/login/', {'username': 'stud', 'password': 'wrong'}, content_type='application/json'
+            )
+            self.assertNotEqual(response.status_code, 429)
+        self.assertEqual(login_throttle.failures(username='stud')['username'], 5)
+
+        response = self.client.post(
+            '/api/v1/auth/login/', {'username': 'stud', 'password': 'TestPass123@'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], str(response.json()['retry_after']))
+        self.assertGreater(login_throttle.locked_for(username='stud'), 0)
+
+        login_throttle.clear('stud')
+        self.assertEqual(login_throttle.locked_for(username='stud'), 0)
+        self.assertEqual(login_throttle.failures(username='stud')['username'], 0)
+
+    def test_shared_address_is_not_locked_by_default(self):
+        """Test that many failures behind one address lock it only when an ip lockout is configured."""
+        for n in range(60):
+            login_throttle.record_failure(ip='198.51.100.9', username=f'stud{n}', now=6000.0)
+        self.assertEqual(login_throttle.locked_for(ip='198.51.100.9', now=6000.0), 0)
+
+        lockouts = [{'scope': 'ip', 'failures': 100, 'seconds': 300}]
+        with self.settings(LOGIN_THROTTLE={'LOCKOUTS': lockouts}):
+            for n in range(40):
+                login_throttle.record_failure(ip='198.51.100.9', username=f'other{n}', now=6000.0)
+        self.assertEqual(login_throttle.locked_for(ip='198.51.100.9', now=6000.0), 300)
+
+
+class SessionBackendTests(TestCase):
+    """Test the two-tier session engine."""
+
+    def setUp(self):
+        cache.clear()
+        session_backend.local_tier.clear()
+        self.user = User.objects.create_user(username='stud', password='TestPass123@')
+
+    def signed_in_session(self):
+        session = SessionStore()
+        session['_auth_user_id'] = str(self.user.pk)
+        session.create()
+        return session
+
+    def test_signed_in_sessions_are_served_locally(self):
+        """Test that the hot tier answers without the cache or database, for signed-in users only."""
+        key = self.signed_in_session().session_key
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(key).load()['_auth_user_id'], str(self.user.pk))
+
+        anonymous = SessionStore()
+        anonymous['cart'] = 1
+        anonymous.create()
+        self.assertNotIn(anonymous.session_key, session_backend.local_tier._entries)
+
+        # Expired local entries fall back to the cache and database
+        with self.settings(SESSION_LOCAL_CACHE_TTL=0):
+            session_backend.local_tier.clear()
+            SessionStore(key).load()
+        self.assertEqual(len(session_backend.local_tier), 0)
+
+    def test_unchanged_sessions_are_not_written(self):
+        """Test that saving a session whose data did not change skips the database."""
+        key = self.signed_in_session().session_key
+        session = SessionStore(key)
+        session['_auth_user_id'] = str(self.user.pk)
+        with self.assertNumQueries(0):
+            session.save()
+
+        session['exam'] = 7
+        session.save()
+        session_backend.local_tier.clear()
+        cache.clear()
+        self.assertEqual(SessionStore(key).load()['exam'], 7)
+
+    def test_invalidate_removes_every_tier(self):
+        """Test that an invalidated session cannot be read from any tier."""
+        key = self.signed_in_session().session_key
+        session_backend.invalidate(key)
+        self.assertEqual(SessionStore(key).load(), {})
+        self.assertFalse(SessionStore().exists(key))
@@ -55,6 +55,12 @@ else:
     SESSION_COOKIE_SECURE = False
     CSRF_COOKIE_SECURE = False
 
+# Sessions are read from a per-process hot tier, then the cache, and written
+# through to the database only when they change (core.session_backend)
+SESSION_ENGINE = 'core.session_backend'
+SESSION_LOCAL_CACHE_SIZE = 1000
+SESSION_LOCAL_CACHE_TTL = 5
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -89,14 +95,23 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'core.middleware.SecurityHeadersMiddleware',
-    'core.middleware.RateLimitMiddleware',
-    'core.middleware.IPTrackingMiddleware',
-    'core.middleware.DeviceFingerprinting',
-    'core.middleware.SuspiciousLoginMiddleware',
-    'core.middleware.TwoFactorAuthenticationMiddleware',
-    'core.middleware.AuditLoggingMiddleware',
+    'core.security_pipeline.SecurityPipelineMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.query_budget.RepeatedQueryMiddleware',
+]
+
+# Security checks run by SecurityPipelineMiddleware, in order (core.security_pipeline).
+# Also available: 'ip_whitelist' and 'single_session'.
+SECURITY_PIPELINE_STAGES = [
+    'rate_limit',
+    'client_tracking',
+    'suspicious_login',
+    'two_factor',
+    'security_headers',
+    'audit_log',
 ]
+# Send per-stage timings as a Server-Timing header
+SECURITY_PIPELINE_TIMING = DEBUG
 
 ROOT_URLCONF = 'examProject.urls'
 
@@ -244,6 +259,22 @@ RATE_LIMIT_CONFIG = {
     'LOGIN_WINDOW': 300,
     'API_CALLS': 100,
     'API_WINDOW': 3600,
+    # Per-endpoint sliding-window policies (core.ratelimit), first match wins.
+    # 'user' and 'ip' are (requests, window seconds); empty uses the defaults.
+    'POLICIES': [],
+}
+
+# Failed-login counters and lockouts (core.login_throttle). Failures are
+# counted per BUCKET seconds over WINDOW; a scope reaching `failures` is
+# locked for `seconds`. The username lockout defaults to LOGIN_ATTEMPTS
+# within LOGIN_WINDOW above. An ip lockout is opt-in, since students share
+# campus NAT addresses, e.g. {'scope': 'ip', 'failures': 1000, 'seconds': 300}.
+LOGIN_THROTTLE = {
+    'WINDOW': 15 * 60,
+    'BUCKET': 60,
+    'LOCKOUTS': [
+        {'scope': 'username', 'failures': RATE_LIMIT_CONFIG['LOGIN_ATTEMPTS'], 'seconds': RATE_LIMIT_CONFIG['LOGIN_WINDOW']},
+    ],
 }
 
 # 2FA from settings_new
@@ -261,6 +292,63 @@ MEDIA_URL = '/media/'
 # Use BigAutoField by default to silence system check warnings
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Minutes before start_time that exams are warmed up (notifications.scheduler)
+EXAM_WARMUP_MINUTES = int(os.environ.get('EXAM_WARMUP_MINUTES', 15))
+
+# Focus-loss telemetry ingestion (questions.proctoring_ingest)
+PROCTORING_BUFFER_SIZE = 50000
+PROCTORING_BATCH_SIZE = 500
+PROCTORING_FLUSH_SECONDS = 1.0
+PROCTORING_INGEST_WORKER = True
+
+# Push live monitor and exam page updates over server-sent events
+# (questions.live_monitor). Needs a single ASGI process (examProject.asgi
+# under uvicorn or daphne); under WSGI the streams would hold worker threads,
+# so pages poll unless this is set.
+LIVE_EVENTS_SSE = os.environ.get('LIVE_EVENTS_SSE', 'False') == 'True'
+
+# Proctoring alert digest window in minutes (notifications.alert_digest)
+ALERT_DIGEST_WINDOW_MINUTES = int(os.environ.get('ALERT_DIGEST_WINDOW_MINUTES', 5))
+# Send critical proctoring alerts from a background thread
+CRITICAL_ALERT_WORKER = True
+
+# Submission queue (questions.submission_queue): accepted lateness for
+# in-flight submissions, grading batch size and grading threads per process
+EXAM_SUBMISSION_GRACE_SECONDS = int(os.environ.get('EXAM_SUBMISSION_GRACE_SECONDS', 30))
+SUBMISSION_GRADING_BATCH_SIZE = 200
+SUBMISSION_GRADING_WORKERS = 2
+
+# Months of raw proctoring events kept before roll-up (questions.proctoring_retention)
+PROCTORING_RETENTION_MONTHS = int(os.environ.get('PROCTORING_RETENTION_MONTHS', 12))
+
+# Write recent user IPs/devices to the database in the background (core.device_tracking)
+DEVICE_TRACKING_WORKER = True
+
+# Audit sink (core.audit_sink): queue capacity, batch size and background writers
+AUDIT_SINK_QUEUE_SIZE = 10000
+AUDIT_SINK_BATCH_SIZE = 500
+AUDIT_SINK_WORKER = True
+
+# Request profiling (core.profiling): per-route latency, query, cache and
+# template histograms served at /admin/profiling/. Requests slower than
+# SLOW_MS are logged with their queries, a SAMPLE_RATE fraction of them.
+# METRICS_TOKEN lets a Prometheus scraper read /admin/profiling/metrics/.
+PROFILING = {
+    'ENABLED': os.environ.get('PROFILING_ENABLED', 'False') == 'True',
+    'SLOW_MS': int(os.environ.get('PROFILING_SLOW_MS', 500)),
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 1.0)),
+    'MAX_QUERIES': 100,
+    'METRICS_TOKEN': os.environ.get('PROFILING_METRICS_TOKEN', ''),
+}
+
+# N+1 guard (core.query_budget): in development, warn with a stack sample
+# when one request runs the same SQL shape more than REPEAT_THRESHOLD times.
+QUERY_BUDGET = {
+    'REPEAT_WARNINGS': DEBUG,
+    'REPEAT_THRESHOLD': 10,
+    'STACK_DEPTH': 8,
+}
+
 # Site URL for notifications
 SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 
@@ -337,6 +425,14 @@ LOGGING = {
             'backupCount': 5,
             'formatter': 'verbose',
         },
+        # Audit trail, written off the request path (core.audit_sink)
+        'security_file': {
+            'class': 'core.audit_sink.AuditQueueHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'security.log'),
+            'maxBytes': 1024 * 1024 * 10,  # 10MB
+            'backupCount': 5,
+            'formatter': 'verbose',
+        },
     },
     'loggers': {
         'django': {
@@ -347,5 +443,10 @@ LOGGING = {
             'handlers': ['console', 'file'],
             'level': os.environ.get('LOG_LEVEL', 'INFO'),
         },
+        'security': {
+            'handlers': ['security_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
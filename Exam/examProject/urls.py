@@ -17,6 +17,8 @@ from django.contrib import admin
 from . import views
 from django.urls import path,include 
 urlpatterns = [
+    path('admin/profiling/', views.profiling_metrics, name='profiling-metrics'),
+    path('admin/profiling/metrics/', views.profiling_metrics, name='profiling-prometheus'),
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('student/',include('student.urls')),
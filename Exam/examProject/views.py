@@ -58,4 +58,28 @@ def avatar_showcase(request):
     Avatar Component Showcase
     Displays all avatar sizes and use cases
     """
-    return render(request, 'components_showcase.html')
\ No newline at end of file
+    return render(request, 'components_showcase.html')
+
+def _may_read_metrics(request):
+    from core.profiling import config
+    token = config()['METRICS_TOKEN']
+    if token and request.META.get('HTTP_AUTHORIZATION') == f'Bearer {token}':
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+
+@require_http_methods(["GET"])
+def profiling_metrics(request):
+    """
+    Per-route request profiling histograms (core.profiling), staff only
+    GET /admin/profiling/           JSON
+    GET /admin/profiling/metrics/   Prometheus text format
+    """
+    from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+    from core import profiling
+
+    if not _may_read_metrics(request):
+        return HttpResponseForbidden('Staff access required')
+    if request.path.endswith('/metrics/'):
+        return HttpResponse(profiling.prometheus_text(), content_type='text/plain; version=0.0.4')
+    return JsonResponse({'enabled': profiling.config()['ENABLED'], 'routes': profiling.snapshot()})
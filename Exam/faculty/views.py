@@ -96,7 +96,7 @@ class LoginView(View):
 		password = request.POST['password']
 		has_grp = False
 		if username and password:
-			user = auth.authenticate(username=username,password=password)
+			user = auth.authenticate(request,username=username,password=password)
 			exis = User.objects.filter(username=username).exists()
 			if exis:
 				user_ch = User.objects.get(username=username)
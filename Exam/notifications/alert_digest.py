@@ -0,0 +1,189 @@
+"""
+Proctoring Alert Digests
+Aggregates proctoring alerts into one email per exam per window.
+
+ExamSecurityAlert rows and FocusLossEvent rows created during a window are
+grouped by exam and student, and each professor gets a single digest per
+exam, all sent over one SMTP connection by the scheduler job in
+notifications.scheduler. Critical thresholds still mail the professor
+immediately, at most once per student and reason: the mail is queued and
+a background sender (core.background_writer) is woken at once, so alerts
+raised together share one SMTP connection as well and no request waits
+on SMTP. CRITICAL_ALERT_WORKER=False leaves sending to send_outbox().
+"""
+
+from collections import defaultdict, deque
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from core.background_writer import BackgroundWorker
+
+logger = logging.getLogger('app')
+
+LAST_WINDOW_END_KEY = 'alert_digest:last_end'
+DIGEST_LOCK_KEY = 'alert_digest:lock'
+CRITICAL_ALERT_DEDUP_TIMEOUT = 60 * 60 * 12
+CRITICAL_ALERT_POLL_SECONDS = 5
+
+_outbox = deque()
+
+
+def send_messages(messages):
+    """Send a batch of messages over one SMTP connection, returns how many were sent."""
+    if not messages:
+        return 0
+    connection = get_connection(fail_silently=True)
+    return connection.send_messages(messages) or 0
+
+
+def send_outbox():
+    """Send every queued critical alert. Returns the number sent."""
+    messages = []
+    while True:
+        try:
+            messages.append(_outbox.popleft())
+        except IndexError:
+            break
+    return send_messages(messages)
+
+
+class AlertDigestService:
+    """Digest and critical alert delivery for professors."""
+
+    @staticmethod
+    def window_minutes():
+        return getattr(settings, 'ALERT_DIGEST_WINDOW_MINUTES', 5)
+
+    @staticmethod
+    def collect(window_start, window_end):
+        """
+        Group the window's activity by exam.
+
+        Returns:
+            dict {exam_id: {username: {'tab_switches': int, 'alerts': [(level, type, message)]}}}
+        """
+        from django.db.models import Count
+        from questions.anticheating_models import ExamSecurityAlert, FocusLossEvent
+
+        activity = defaultdict(lambda: defaultdict(lambda: {'tab_switches': 0, 'alerts': []}))
+
+        focus_rows = (
+            FocusLossEvent.objects
+            .filter(timestamp__gte=window_start, timestamp__lt=window_end)
+            .values('exam_id', 'student__username')
+            .annotate(total=Count('id'))
+        )
+        for row in focus_rows:
+            activity[row['exam_id']][row['student__username']]['tab_switches'] = row['total']
+
+        alert_rows = (
+            ExamSecurityAlert.objects
+            .filter(created_at__gte=window_start, created_at__lt=window_end)
+            .order_by('created_at')
+            .values_list('exam_id', 'student__username', 'level', 'alert_type', 'message')
+        )
+        for exam_id, username, level, alert_type, message in alert_rows:
+            activity[exam_id][username]['alerts'].append((level, alert_type, message))
+
+        return activity
+
+    @staticmethod
+    def build_digest(exam, students, window_start, window_end):
+        """Build the digest EmailMessage for one exam."""
+        local_start = timezone.localtime(window_start).strftime('%H:%M')
+        local_end = timezone.localtime(window_end).strftime('%H:%M')
+
+        lines = [f"Proctoring activity for '{exam.name}' between {local_start} and {local_end}:", '']
+        for username in sorted(students):
+            entry = students[username]
+            lines.append(f"Student: {username}")
+            if entry['tab_switches']:
+                lines.append(f"  Tab switches: {entry['tab_switches']}")
+            for level, alert_type, message in entry['alerts']:
+                lines.append(f"  [{level}] {alert_type}: {message}")
+            lines.append('')
+        lines.append(f"Review alerts: {getattr(settings, 'SITE_URL', 'http://localhost:8000')}/admin/questions/examsecurityalert/")
+
+        return EmailMessage(
+            subject=f"[Proctoring Digest] {exam.name}: {len(students)} student(s) flagged",
+            body='\n'.join(lines),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[exam.professor.email],
+        )
+
+    @staticmethod
+    def send_digests(now=None):
+        """
+        Send one digest per exam for everything since the previous window.
+
+        Only one process sends a given window, and it moves on to the next
+        window only once every digest went out. Returns the number of digests sent.
+        """
+        from questions.models import Exam_Model
+
+        if not cache.add(DIGEST_LOCK_KEY, True, 60):
+            return 0
+        try:
+            window_end = now or timezone.now()
+            window_start = cache.get(LAST_WINDOW_END_KEY) or (
+                window_end - timedelta(minutes=AlertDigestService.window_minutes())
+            )
+            activity = AlertDigestService.collect(window_start, window_end)
+
+            messages = []
+            exams = Exam_Model.objects.filter(id__in=list(activity)).select_related('professor')
+            for exam in exams:
+                if exam.professor.email:
+                    messages.append(
+                        AlertDigestService.build_digest(exam, activity[exam.id], window_start, window_end)
+                    )
+
+            sent = send_messages(messages)
+
+            if sent < len(messages):
+                # Leave the window where it was, the next run covers it again
+                logger.warning(f"Sent {sent} of {len(messages)} proctoring digest(s), retrying the window")
+                return sent
+            cache.set(LAST_WINDOW_END_KEY, window_end, None)
+            if sent:
+                logger.info(f"Sent {sent} proctoring digest(s)")
+            return sent
+        finally:
+            cache.delete(DIGEST_LOCK_KEY)
+
+    @staticmethod
+    def send_critical_alert(student, reason, subject, message, exam=None, recipient=None):
+        """
+        Mail a critical alert right away, once per student and reason.
+
+        Queued for the background sender, so the request never waits on SMTP.
+        Returns True if the alert was queued, False if it was a duplicate.
+        """
+        recipient = recipient or (exam.professor.email if exam else None)
+        if not recipient:
+            return False
+
+        scope = exam.id if exam else recipient
+        if not cache.add(f'critical_alert:{scope}:{student.id}:{reason}', True, CRITICAL_ALERT_DEDUP_TIMEOUT):
+            return False
+
+        _outbox.append(EmailMessage(
+            subject=subject,
+            body=message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient],
+        ))
+        _sender.ensure()
+        _sender.wake()
+        logger.warning(f"Critical alert sent for {student.username}: {reason}")
+        return True
+
+
+_sender = BackgroundWorker(
+    'critical-alerts', send_outbox, CRITICAL_ALERT_POLL_SECONDS, 'CRITICAL_ALERT_WORKER'
+)
@@ -144,6 +144,75 @@ Exam link: /exams/{exam.id}/
         logger.error(f"Error in send_exam_reminders_1hr: {str(e)}")
 
 
+def warm_up_starting_exams():
+    """
+    Preload papers and sessions for exams starting in the next
+    EXAM_WARMUP_MINUTES minutes, so the start-time rush hits warm caches
+    """
+    try:
+        from django.conf import settings
+        from questions.exam_warmup import warm_up_upcoming_exams
+
+        warmed = warm_up_upcoming_exams(getattr(settings, 'EXAM_WARMUP_MINUTES', 15))
+        if warmed:
+            logger.info(f"Exam warm-up prepared {warmed} exam(s)")
+
+    except Exception as e:
+        logger.error(f"Error in warm_up_starting_exams: {str(e)}")
+
+
+def send_proctoring_digests():
+    """
+    Send professors one digest per exam with the proctoring alerts of
+    the last ALERT_DIGEST_WINDOW_MINUTES
+    """
+    try:
+        from notifications.alert_digest import AlertDigestService
+        AlertDigestService.send_digests()
+
+    except Exception as e:
+        logger.error(f"Error in send_proctoring_digests: {str(e)}")
+
+
+def grade_queued_submissions():
+    """
+    Grade queued exam submissions left behind by grading threads that
+    stopped (questions.submission_queue)
+    """
+    try:
+        from questions.submission_queue import process_pending, requeue_stale_claims
+        requeue_stale_claims()
+        process_pending()
+
+    except Exception as e:
+        logger.error(f"Error in grade_queued_submissions: {str(e)}")
+
+
+def analyze_finished_exams():
+    """
+    Run the post-exam anomaly analysis for exams that ended in the last hour
+    """
+    try:
+        from questions.post_exam_analysis import analyze_finished_exams as analyze
+        analyze(since_minutes=60)
+
+    except Exception as e:
+        logger.error(f"Error in analyze_finished_exams: {str(e)}")
+
+
+def roll_up_proctoring_events():
+    """
+    Roll raw proctoring events older than PROCTORING_RETENTION_MONTHS up
+    into per-student summaries and purge them
+    """
+    try:
+        from questions.proctoring_retention import apply_retention
+        apply_retention()
+
+    except Exception as e:
+        logger.error(f"Error in roll_up_proctoring_events: {str(e)}")
+
+
 def start_exam_reminder_scheduler():
     """
     Start the background scheduler for exam reminders
@@ -171,6 +240,57 @@ def start_exam_reminder_scheduler():
         replace_existing=True
     )
 
+    # Warm up exams about to start every minute
+    scheduler.add_job(
+        warm_up_starting_exams,
+        'interval',
+        minutes=1,
+        id='exam_warmup',
+        name='Exam start warm-up',
+        replace_existing=True
+    )
+
+    # Proctoring alert digests, one per exam per window
+    from django.conf import settings
+    scheduler.add_job(
+        send_proctoring_digests,
+        'interval',
+        minutes=getattr(settings, 'ALERT_DIGEST_WINDOW_MINUTES', 5),
+        id='proctoring_alert_digest',
+        name='Proctoring alert digests',
+        replace_existing=True
+    )
+
+    # Sweep the submission grading queue every minute
+    scheduler.add_job(
+        grade_queued_submissions,
+        'interval',
+        minutes=1,
+        id='submission_grading',
+        name='Queued submission grading',
+        replace_existing=True
+    )
+
+    # Post-exam anomaly analysis shortly after exams end
+    scheduler.add_job(
+        analyze_finished_exams,
+        'interval',
+        minutes=15,
+        id='post_exam_analysis',
+        name='Post-exam anomaly analysis',
+        replace_existing=True
+    )
+
+    # Proctoring event retention, nightly
+    scheduler.add_job(
+        roll_up_proctoring_events,
+        'cron',
+        hour=3,
+        id='proctoring_retention',
+        name='Proctoring event retention',
+        replace_existing=True
+    )
+
     if not scheduler.running:
         scheduler.start()
         logger.info("Exam reminder scheduler started successfully")
@@ -0,0 +1,77 @@
+"""
+Test suite for the notifications app.
+"""
+
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from notifications import alert_digest
+from notifications.alert_digest import AlertDigestService
+from questions.anticheating_models import ExamSecurityAlert, FocusLossEvent
+from questions.models import Exam_Model
+from questions.questionpaper_models import Question_Paper
+
+
+@override_settings(CRITICAL_ALERT_WORKER=False)
+class AlertDigestTests(TestCase):
+    """Test proctoring alert digests and critical alert deduplication."""
+
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create_user(username='prof', password='TestPass123@', email='prof@example.com')
+        self.students = [User.objects.create_user(username=f'stud{i}', password='TestPass123@') for i in range(2)]
+        paper = Question_Paper.objects.create(professor=self.professor, qPaperTitle='Paper', total_marks=0)
+        self.exams = [
+            Exam_Model.objects.create(professor=self.professor, name=f'Exam {i}', question_paper=paper)
+            for i in range(2)
+        ]
+
+    def test_one_digest_per_exam(self):
+        """Test that a window's events become one mail per exam over one connection."""
+        for student in self.students:
+            for _ in range(3):
+                FocusLossEvent.objects.create(student=student, exam=self.exams[0])
+        ExamSecurityAlert.objects.create(
+            student=self.students[0], exam=self.exams[1], alert_type='FULLSCREEN_EXIT', message='Fullscreen exit #1.'
+        )
+
+        with mock.patch('notifications.alert_digest.get_connection', wraps=mail.get_connection) as connect:
+            sent = AlertDigestService.send_digests(now=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(sent, 2)
+        connect.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if 'Exam 0' in m.subject)
+        self.assertIn('Tab switches: 3', digest.body)
+
+        # The next window starts where this one ended
+        self.assertEqual(AlertDigestService.send_digests(now=timezone.now() + timedelta(seconds=2)), 0)
+
+    def test_window_is_kept_until_every_digest_is_sent(self):
+        """Test that a failed send leaves the window to be covered by the next run."""
+        FocusLossEvent.objects.create(student=self.students[0], exam=self.exams[0])
+        with mock.patch('notifications.alert_digest.send_messages', return_value=0):
+            self.assertEqual(AlertDigestService.send_digests(now=timezone.now() + timedelta(seconds=1)), 0)
+        self.assertEqual(AlertDigestService.send_digests(now=timezone.now() + timedelta(seconds=2)), 1)
+        self.assertIn('Tab switches: 1', mail.outbox[0].body)
+
+    def test_critical_alert_sent_once_per_student(self):
+        """Test that repeated critical alerts for a student are dropped and the rest share a connection."""
+        self.assertTrue(AlertDigestService.send_critical_alert(
+            self.students[0], 'tab_switch_threshold', 'Subject', 'Body', exam=self.exams[0]
+        ))
+        self.assertFalse(AlertDigestService.send_critical_alert(
+            self.students[0], 'tab_switch_threshold', 'Subject', 'Body', exam=self.exams[0]
+        ))
+        self.assertTrue(AlertDigestService.send_critical_alert(
+            self.students[1], 'tab_switch_threshold', 'Subject', 'Body', exam=self.exams[0]
+        ))
+        with mock.patch('notifications.alert_digest.get_connection', wraps=mail.get_connection) as connect:
+            self.assertEqual(alert_digest.send_outbox(), 2)
+        connect.assert_called_once()
+        self.assertEqual([m.to for m in mail.outbox], [['prof@example.com']] * 2)
@@ -1,16 +1,30 @@
 from django.contrib import admin
 from .models import Exam_Model
 from .questionpaper_models import Question_Paper
-from .question_enhancements import QuestionTag
-from .anticheating_models import ExamFocusLog, FocusLossEvent, ExamSecurityAlert
+from .question_enhancements import QuestionTag, QuestionVersion
+from .anticheating_models import ExamFocusLog, FocusLossEvent, ExamSecurityAlert, ProctoringSummary
 from .exam_assignment_models import ExamAssignment
+from .proctoring_policy_models import ProctoringPolicy
+from .submission_models import ExamSubmission
+from .models_new import QuestionPool, ExamTemplate
 
 admin.site.register(QuestionTag)
 admin.site.register(Question_Paper)
 @admin.register(Exam_Model)
 class ExamModelAdmin(admin.ModelAdmin):
     # Hide the internal soft-delete flag from the admin form
-    exclude = ('is_active',)
+    exclude = ('is_active', 'pinned_versions')
+
+
+@admin.register(QuestionVersion)
+class QuestionVersionAdmin(admin.ModelAdmin):
+    list_display = ['question_id', 'version_number', 'is_snapshot', 'modified_by', 'modified_at']
+    list_filter = ['is_snapshot', 'modified_at']
+    search_fields = ['question__qno', 'change_description']
+    readonly_fields = ['question', 'version_number', 'is_snapshot', 'data', 'modified_by', 'modified_at']
+
+    def has_add_permission(self, request):
+        return False  # Revisions are written by Question_DB.save()
 
 
 @admin.register(ExamFocusLog)
@@ -42,11 +56,12 @@ class FocusLossEventAdmin(admin.ModelAdmin):
     list_display = ['student', 'exam', 'event_type', 'timestamp']
     list_filter = ['event_type', 'timestamp', 'exam']
     search_fields = ['student__username', 'exam__name']
-    readonly_fields = ['timestamp', 'student', 'exam', 'event_type']
+    readonly_fields = ['timestamp', 'student', 'exam', 'event_type', 'user_agent', 'partition']
+    list_select_related = ['student', 'exam']
 
     fieldsets = (
         ('Event Info', {
-            'fields': ('student', 'exam', 'event_type', 'timestamp')
+            'fields': ('student', 'exam', 'event_type', 'timestamp', 'partition')
         }),
         ('Client Data', {
             'fields': ('browser_timestamp', 'ip_address')
@@ -61,6 +76,21 @@ class FocusLossEventAdmin(admin.ModelAdmin):
         return False  # Events are recorded by the system only
 
 
+@admin.register(ProctoringSummary)
+class ProctoringSummaryAdmin(admin.ModelAdmin):
+    list_display = ['student', 'exam', 'tab_switches', 'window_blurs', 'visibility_changes',
+                    'critical_alerts', 'last_event_at']
+    list_filter = ['exam']
+    search_fields = ['student__username', 'exam__name']
+    list_select_related = ['student', 'exam']
+
+    def has_add_permission(self, request):
+        return False  # Summaries are written by the retention job only
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ExamSecurityAlert)
 class ExamSecurityAlertAdmin(admin.ModelAdmin):
     list_display = ['student', 'exam', 'alert_type', 'level', 'created_at', 'is_resolved']
@@ -82,6 +112,30 @@ class ExamSecurityAlertAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ProctoringPolicy)
+class ProctoringPolicyAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'warn_score', 'alert_score', 'submit_score', 'updated_at']
+    search_fields = ['exam__name']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(ExamSubmission)
+class ExamSubmissionAdmin(admin.ModelAdmin):
+    list_display = ['student', 'exam', 'status', 'score', 'received_at', 'graded_at', 'attempts']
+    list_filter = ['status', 'exam']
+    search_fields = ['student__username', 'exam__name']
+    readonly_fields = ['received_at', 'claim_token', 'claimed_at', 'graded_at', 'score', 'error']
+    actions = ['retry_submissions']
+
+    def retry_submissions(self, request, queryset):
+        count = queryset.filter(status=ExamSubmission.FAILED).update(
+            status=ExamSubmission.PENDING, attempts=0, error=''
+        )
+        self.message_user(request, f"{count} submission(s) queued for grading again")
+
+    retry_submissions.short_description = "Retry failed submissions"
+
+
 @admin.register(ExamAssignment)
 class ExamAssignmentAdmin(admin.ModelAdmin):
     list_display = ['exam', 'assignment_type', 'student', 'batch_name', 'is_active', 'created_at']
@@ -122,4 +176,17 @@ class ExamAssignmentAdmin(admin.ModelAdmin):
             count += 1
         self.message_user(request, f"{count} assignment(s) deactivated successfully")
 
-    deactivate_assignments.short_description = "Deactivate selected assignments"
\ No newline at end of file
+    deactivate_assignments.short_description = "Deactivate selected assignments"
+
+@admin.register(QuestionPool)
+class QuestionPoolAdmin(admin.ModelAdmin):
+    list_display = ['name', 'course', 'created_by', 'updated_at']
+    search_fields = ['name', 'course__name']
+    filter_horizontal = ['questions']
+
+
+@admin.register(ExamTemplate)
+class ExamTemplateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'course', 'created_by', 'updated_at']
+    search_fields = ['name', 'course__name']
+    filter_horizontal = ['questions']
@@ -3,14 +3,79 @@ Anti-Cheating System Models
 Tracks focus loss, tab switches, and suspicious behavior during exams.
 """
 
-from django.db import models
+import hashlib
+
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils import timezone
 from .models import Exam_Model
+from . import permutations
+from .permutations import new_order_seed
 import logging
 
 logger = logging.getLogger('app')
 
+USER_AGENT_CACHE_TIMEOUT = 60 * 60
+
+
+def month_partition(at=None):
+    """Partition key (YYYYMM, in TIME_ZONE) for proctoring rows recorded at `at`"""
+    at = timezone.localtime(at or timezone.now())
+    return at.year * 100 + at.month
+
+
+class UserAgent(models.Model):
+    """Interned User-Agent string shared by proctoring events"""
+
+    digest = models.CharField(max_length=64, unique=True)
+    value = models.TextField()
+
+    def __str__(self):
+        return self.value[:80]
+
+    @staticmethod
+    def digest_for(value):
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def cache_key(cls, digest):
+        return f'user_agent:{digest}'
+
+    @classmethod
+    def intern_many(cls, values):
+        """
+        Return {value: id} for the non-empty values, creating missing rows.
+        Known strings are resolved from the cache.
+        """
+        digests = {cls.digest_for(v): v for v in set(values) if v}
+        if not digests:
+            return {}
+
+        cached = cache.get_many([cls.cache_key(d) for d in digests])
+        ids = {}
+        missing = {}
+        for digest, value in digests.items():
+            agent_id = cached.get(cls.cache_key(digest))
+            if agent_id is None:
+                missing[digest] = value
+            else:
+                ids[value] = agent_id
+
+        if missing:
+            cls.objects.bulk_create(
+                [cls(digest=d, value=v) for d, v in missing.items()],
+                ignore_conflicts=True,
+            )
+            rows = cls.objects.filter(digest__in=list(missing)).values_list('digest', 'id')
+            resolved = dict(rows)
+            cache.set_many(
+                {cls.cache_key(d): agent_id for d, agent_id in resolved.items()},
+                USER_AGENT_CACHE_TIMEOUT,
+            )
+            ids.update({missing[d]: agent_id for d, agent_id in resolved.items()})
+        return ids
+
 
 class ExamFocusLog(models.Model):
     """Log of focus loss events during exam taking"""
@@ -40,16 +105,48 @@ class ExamFocusLog(models.Model):
         """Check if student exceeded focus loss limit"""
         return self.focus_loss_count > self.max_focus_losses
 
+    @classmethod
+    def add_focus_losses(cls, student_id, exam_id, count=1, at=None, max_allowed=None):
+        """
+        Atomically add `count` focus losses to a student's log and return the
+        new total (None if the log does not exist).
+
+        The log is flagged suspicious when this increment crosses
+        max_focus_losses; pass max_allowed when it is known to skip the
+        check query for increments that cannot cross it.
+        """
+        from .counters import increment
+
+        at = at or timezone.now()
+        total = increment(
+            cls, 'focus_loss_count', by=count,
+            updates={'last_focus_loss_time': at, 'updated_at': at},
+            student_id=student_id, exam_id=exam_id,
+        )
+        if total is None:
+            return None
+        if max_allowed is None or total - count <= max_allowed < total:
+            cls.objects.filter(
+                student_id=student_id, exam_id=exam_id, is_suspicious=False,
+                max_focus_losses__lt=total, max_focus_losses__gte=total - count,
+            ).update(
+                is_suspicious=True,
+                reason=f"Exceeded maximum focus losses ({max_allowed})" if max_allowed is not None
+                else "Exceeded maximum focus losses",
+            )
+        return total
+
     def record_focus_loss(self):
         """Record a focus loss event"""
-        self.focus_loss_count += 1
+        self.focus_loss_count = self.add_focus_losses(
+            self.student_id, self.exam_id, max_allowed=self.max_focus_losses
+        )
         self.last_focus_loss_time = timezone.now()
 
         if self.focus_loss_count > self.max_focus_losses:
             self.is_suspicious = True
             self.reason = f"Exceeded maximum focus losses ({self.max_focus_losses})"
 
-        self.save()
         logger.warning(f"Focus loss recorded: {self.student.username} in {self.exam.name} (count: {self.focus_loss_count})")
 
 
@@ -70,18 +167,25 @@ class FocusLossEvent(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     browser_timestamp = models.DateTimeField(null=True, blank=True)  # When event occurred client-side
     ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    agent = models.ForeignKey(UserAgent, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    partition = models.PositiveIntegerField(default=month_partition)  # YYYYMM, see proctoring_retention
 
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['student', 'exam']),
             models.Index(fields=['timestamp']),
+            models.Index(fields=['exam', 'partition']),
+            models.Index(fields=['partition']),
         ]
 
     def __str__(self):
         return f"{self.student.username} - {self.event_type} at {self.timestamp}"
 
+    @property
+    def user_agent(self):
+        return self.agent.value if self.agent_id else ''
+
 
 class ExamSecurityAlert(models.Model):
     """Security alert for suspicious exam behavior"""
@@ -99,17 +203,71 @@ class ExamSecurityAlert(models.Model):
     message = models.TextField()
     is_resolved = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    partition = models.PositiveIntegerField(default=month_partition)  # YYYYMM, see proctoring_retention
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['student', 'exam']),
             models.Index(fields=['level']),
+            models.Index(fields=['exam', 'partition']),
+            models.Index(fields=['partition']),
         ]
 
     def __str__(self):
         return f"{self.alert_type} - {self.student.username} ({self.level})"
 
+    def save(self, *args, **kwargs):
+        created = self._state.adding
+        super().save(*args, **kwargs)
+        if created:
+            # Push new alerts to open live monitors once they are committed
+            from .live_monitor import publish_exam_event
+            transaction.on_commit(lambda: publish_exam_event(
+                self.exam_id, 'alert',
+                student_id=self.student_id, alert_type=self.alert_type,
+                level=self.level, message=self.message,
+            ))
+
+
+class ProctoringSummary(models.Model):
+    """Rolled-up proctoring activity of a student in an exam, kept after raw rows are purged"""
+
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='proctoring_summaries')
+    exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE, related_name='proctoring_summaries')
+    tab_switches = models.PositiveIntegerField(default=0)
+    window_blurs = models.PositiveIntegerField(default=0)
+    visibility_changes = models.PositiveIntegerField(default=0)
+    warning_alerts = models.PositiveIntegerField(default=0)
+    critical_alerts = models.PositiveIntegerField(default=0)
+    blocked_alerts = models.PositiveIntegerField(default=0)
+    first_event_at = models.DateTimeField(null=True, blank=True)
+    last_event_at = models.DateTimeField(null=True, blank=True)
+    rolled_up_through = models.PositiveIntegerField(default=0)  # newest partition folded in
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'exam')
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"{self.student.username} - {self.exam.name} summary"
+
+    @property
+    def focus_losses(self):
+        return self.tab_switches + self.window_blurs + self.visibility_changes
+
+    def add(self, totals):
+        """Fold a {field: count, 'first': dt, 'last': dt, 'through': partition} dict into the summary."""
+        for field in ('tab_switches', 'window_blurs', 'visibility_changes',
+                      'warning_alerts', 'critical_alerts', 'blocked_alerts'):
+            setattr(self, field, getattr(self, field) + totals.get(field, 0))
+        if totals.get('first') and (self.first_event_at is None or totals['first'] < self.first_event_at):
+            self.first_event_at = totals['first']
+        if totals.get('last') and (self.last_event_at is None or totals['last'] > self.last_event_at):
+            self.last_event_at = totals['last']
+        self.rolled_up_through = max(self.rolled_up_through, totals.get('through', 0))
+
 
 class ExamSession(models.Model):
     """Recorded exam session details for anti-cheating and logging."""
@@ -120,8 +278,15 @@ class ExamSession(models.Model):
     duration_seconds = models.PositiveIntegerField(default=0)
     ends_at = models.DateTimeField(null=True, blank=True)
 
-    question_order = models.JSONField(default=list, blank=True)
-    option_order = models.JSONField(default=dict, blank=True)  # {qno: ['B','A','D','C']}
+    # Question/option orders are derived from this seed, see questions.permutations
+    order_seed = models.BigIntegerField(default=new_order_seed, editable=False)
+    # Orders stored by sessions that were in progress when order_seed was
+    # introduced, honoured until they finish; null for every other session
+    legacy_question_order = models.JSONField(null=True, blank=True, editable=False)
+    legacy_option_order = models.JSONField(null=True, blank=True, editable=False)  # {qno: ['B','A','D','C']}
+    answers = models.JSONField(default=dict, blank=True)  # {qno: 'A'}, graded against Exam_Model.pinned_versions
+    # Generated paper as packed uint32 qnos; empty means the full question paper (see questions.exam_generator)
+    question_selection = models.BinaryField(null=True, blank=True, editable=False)
 
     tab_switch_count = models.IntegerField(default=0)
     fullscreen_exit_count = models.IntegerField(default=0)
@@ -138,30 +303,94 @@ class ExamSession(models.Model):
     def __str__(self):
         return f"ExamSession({self.student.username}, {self.exam.name}, submitted={self.is_submitted})"
 
+    @property
+    def selected_qnos(self):
+        from .exam_generator import unpack_selection
+        return unpack_selection(self.question_selection)
+
+    def ordered_qnos(self, qnos):
+        """
+        This session's question order over qnos (the exam's pinned questions),
+        narrowed to the generated selection when there is one.
+        """
+        if self.legacy_question_order:
+            ordered = [q for q in self.legacy_question_order if q in qnos]
+            if ordered:
+                return ordered
+        selected = [q for q in self.selected_qnos if q in qnos]
+        return permutations.question_order(self.order_seed, selected or qnos)
+
+    def option_order(self, qno):
+        """This session's option letter order for question qno."""
+        legacy = (self.legacy_option_order or {}).get(str(qno))
+        if legacy:
+            return list(legacy)
+        return permutations.option_order(self.order_seed, int(qno))
+
     def mark_submitted(self):
+        from .live_monitor import publish_exam_event
+
         self.is_submitted = True
         self.submitted_at = timezone.now()
         self.save()
+        publish_exam_event(self.exam_id, 'session_submitted', student_id=self.student_id)
+
+    @classmethod
+    def merge_flags(cls, flags, **lookup):
+        """
+        Merge flags into suspicious_flags of the session matching lookup,
+        under a row lock. Only used when a threshold is crossed.
+        """
+        with transaction.atomic():
+            current = (
+                cls.objects.select_for_update().filter(**lookup)
+                .values_list('suspicious_flags', flat=True).first()
+            ) or {}
+            current.update(flags)
+            cls.objects.filter(**lookup).update(suspicious_flags=current)
+        return current
+
+    @classmethod
+    def add_tab_switches(cls, student_id, exam_id, count=1):
+        """
+        Atomically add `count` tab switches to a session and return the new
+        total (None if there is no session). Records the auto-submit flag
+        when the increment crosses the exam policy's focus-loss submit limit.
+        """
+        from .counters import increment
+        from .suspicion import policy_for_exam
+
+        total = increment(cls, 'tab_switch_count', by=count, student_id=student_id, exam_id=exam_id)
+        threshold = policy_for_exam(exam_id).limit('focus_loss', 'submit')
+        if total is not None and threshold is not None and total - count < threshold <= total:
+            cls.merge_flags(
+                {'tab_switch': total, 'auto_submit': 'tab_switch_threshold_reached'},
+                student_id=student_id, exam_id=exam_id,
+            )
+        return total
 
     def record_tab_switch(self):
-        self.tab_switch_count += 1
-        self.suspicious_flags['tab_switch'] = self.tab_switch_count
-        if self.tab_switch_count >= 5:
-            self.suspicious_flags['auto_submit'] = 'tab_switch_threshold_reached'
-        self.save()
+        self.tab_switch_count = self.add_tab_switches(self.student_id, self.exam_id)
+        return self.tab_switch_count
 
     def record_fullscreen_exit(self):
-        self.fullscreen_exit_count += 1
-        self.suspicious_flags['fullscreen_exit'] = self.fullscreen_exit_count
-        if self.fullscreen_exit_count >= 3:
-            self.suspicious_flags['fullscreen_alert'] = 'multiple_exits'
-        self.save()
+        from .counters import increment
+        from .suspicion import policy_for_exam
+
+        self.fullscreen_exit_count = increment(ExamSession, 'fullscreen_exit_count', pk=self.pk)
+        if self.fullscreen_exit_count == policy_for_exam(self.exam_id).limit('fullscreen_exit', 'alert'):
+            self.suspicious_flags = self.merge_flags(
+                {'fullscreen_exit': self.fullscreen_exit_count, 'fullscreen_alert': 'multiple_exits'},
+                pk=self.pk,
+            )
+        return self.fullscreen_exit_count
 
 
 class ServerTimestampValidator:
     """
     Validates exam submission timestamps to prevent timer manipulation.
     Ensures that submitted answers' timestamps match actual exam duration.
+    Checks run against the cached deadline in questions.exam_clock.
     """
 
     @staticmethod
@@ -177,32 +406,11 @@ class ServerTimestampValidator:
         Returns:
             (is_valid, message)
         """
-        server_time = timezone.now()
-
-        # Check if submission is within exam window
-        if server_time < exam.start_time:
-            return False, "Exam has not started yet"
-
-        if server_time > exam.end_time:
-            return False, "Exam time has expired on server"
-
-        # Calculate expected duration
-        expected_duration = (exam.end_time - exam.start_time).total_seconds()
-
-        # Parse client timestamp
-        try:
-            from django.utils.dateparse import parse_datetime
-            client_dt = parse_datetime(submission_time_client)
-            if not client_dt:
-                return False, "Invalid submission timestamp format"
-        except:
-            return False, "Could not parse submission timestamp"
-
-        # Check if client timestamp is way off (more than 30 seconds)
-        time_diff = abs((server_time - client_dt).total_seconds())
-        if time_diff > 30:
-            logger.warning(f"Suspicious timestamp: {student.username} - diff: {time_diff}s")
-            return False, f"Client clock is out of sync ({time_diff}s difference)"
+        from .exam_clock import validate_submission
+
+        is_valid, message = validate_submission(student.id, exam.id, submission_time_client)
+        if not is_valid:
+            return is_valid, message
 
         logger.info(f"Submission timestamp validated: {student.username}")
         return True, "Timestamp valid"
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class QuestionsConfig(AppConfig):
     name = 'questions'
+
+    def ready(self):
+        """Import signals when the app is ready."""
+        import questions.signals  # noqa
@@ -0,0 +1,83 @@
+"""
+Atomic Counters
+Single-statement increments for the anti-cheating counters.
+
+increment() issues one UPDATE ... SET col = col + n ... RETURNING col, so
+concurrent events never lose an update and only the touched columns are
+written. Backends without UPDATE ... RETURNING (SQLite < 3.35, MySQL) fall
+back to a row lock with select_for_update. Callers run their threshold
+checks on the returned value.
+"""
+
+import logging
+
+from django.db import connections, router, transaction
+from django.db.models import F
+
+logger = logging.getLogger('app')
+
+
+def supports_update_returning(connection):
+    """Check whether the backend can return values from an UPDATE."""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def increment(model, field, by=1, updates=None, **lookup):
+    """
+    Add `by` to `field` on the row matching `lookup` and return the new value.
+
+    Args:
+        model: model class owning the counter
+        field: name of the integer field to increment
+        by: amount to add
+        updates: optional {field_name: value} written in the same statement
+        **lookup: exact-match field filters identifying one row
+
+    Returns:
+        int: the counter after the increment, or None if no row matched
+    """
+    updates = updates or {}
+    connection = connections[router.db_for_write(model)]
+
+    if not supports_update_returning(connection):
+        with transaction.atomic(using=connection.alias):
+            current = (
+                model.objects.using(connection.alias).select_for_update()
+                .filter(**lookup).values_list(field, flat=True).first()
+            )
+            if current is None:
+                return None
+            model.objects.using(connection.alias).filter(**lookup).update(
+                **{field: F(field) + by}, **updates
+            )
+            return current + by
+
+    opts = model._meta
+    qn = connection.ops.quote_name
+    column = qn(opts.get_field(field).column)
+
+    assignments = [f'{column} = {column} + %s']
+    params = [by]
+    for name, value in updates.items():
+        model_field = opts.get_field(name)
+        assignments.append(f'{qn(model_field.column)} = %s')
+        params.append(model_field.get_db_prep_save(value, connection))
+
+    conditions = []
+    for name, value in lookup.items():
+        model_field = opts.pk if name == 'pk' else opts.get_field(name)
+        conditions.append(f'{qn(model_field.column)} = %s')
+        params.append(model_field.get_db_prep_value(value, connection))
+
+    sql = (
+        f'UPDATE {qn(opts.db_table)} SET {", ".join(assignments)} '
+        f'WHERE {" AND ".join(conditions)} RETURNING {column}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,68 @@
+"""
+Exam Eligibility Cache
+Cached answer to "which students may sit this exam", built from ExamAssignment.
+
+An exam with no active assignments, or with a public one, is open to every
+student; otherwise only individually assigned students may sit it. The
+result is cached per exam and dropped whenever an assignment is saved or
+deleted, including admin and queryset deletes (questions.signals).
+Queryset update() sends no signal; callers using it call invalidate().
+"""
+
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger('app')
+
+ELIGIBILITY_CACHE_TIMEOUT = 60 * 10
+
+
+def _cache_key(exam_id):
+    return f'exam_eligibility:{exam_id}'
+
+
+def exam_eligibility(exam):
+    """
+    Return {'open': bool, 'student_ids': set} for an exam.
+
+    student_ids is only filled for restricted exams.
+    """
+    from .exam_assignment_models import ExamAssignment
+
+    eligibility = cache.get(_cache_key(exam.id))
+    if eligibility is None:
+        rows = list(
+            ExamAssignment.objects.filter(exam=exam, is_active=True)
+            .values_list('assignment_type', 'student_id')
+        )
+        is_open = not rows or any(kind == 'public' for kind, _ in rows)
+        eligibility = {
+            'open': is_open,
+            'student_ids': set() if is_open else {
+                sid for kind, sid in rows if kind == 'individual' and sid
+            },
+        }
+        cache.set(_cache_key(exam.id), eligibility, ELIGIBILITY_CACHE_TIMEOUT)
+    return eligibility
+
+
+def is_eligible(exam, student):
+    """Check whether student may sit exam."""
+    eligibility = exam_eligibility(exam)
+    return eligibility['open'] or student.id in eligibility['student_ids']
+
+
+def eligible_student_ids(exam):
+    """Ids of every student who may sit exam."""
+    from django.contrib.auth.models import User
+
+    eligibility = exam_eligibility(exam)
+    if not eligibility['open']:
+        return sorted(eligibility['student_ids'])
+    return list(User.objects.filter(groups__name='Student').values_list('id', flat=True))
+
+
+def invalidate(exam_id):
+    """Drop the cached eligibility of an exam."""
+    cache.delete(_cache_key(exam_id))
@@ -1,6 +1,6 @@
 """
 Enhanced Question Management Models
-Adds difficulty, search, versioning, and CSV support
+Adds difficulty, search, and CSV support
 """
 
 from django.db import models
@@ -27,41 +27,6 @@ class QuestionDifficultyManager(models.Manager):
         return self.filter(difficulty=difficulty)
 
 
-class QuestionVersion(models.Model):
-    """Track question revisions and versions"""
-
-    CHANGE_TYPE = [
-        ('CREATED', 'Question Created'),
-        ('EDITED', 'Question Edited'),
-        ('DELETED', 'Question Deleted'),
-        ('RESTORED', 'Question Restored'),
-    ]
-
-    question_id = models.IntegerField()  # Original question ID
-    professor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    question_text = models.CharField(max_length=500)
-    optionA = models.CharField(max_length=200)
-    optionB = models.CharField(max_length=200)
-    optionC = models.CharField(max_length=200)
-    optionD = models.CharField(max_length=200)
-    answer = models.CharField(max_length=10)
-    max_marks = models.IntegerField()
-    difficulty = models.CharField(max_length=10)
-    change_type = models.CharField(max_length=20, choices=CHANGE_TYPE)
-    change_description = models.TextField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        ordering = ['-created_at']
-        indexes = [
-            models.Index(fields=['question_id', 'created_at']),
-            models.Index(fields=['professor']),
-        ]
-
-    def __str__(self):
-        return f"v{self.id}: {self.change_type} - Q{self.question_id}"
-
-
 class QuestionDuplicate(models.Model):
     """Detect and track duplicate questions"""
 
@@ -193,8 +158,13 @@ class QuestionCSVImporter:
                             errors.append(f"Row {i}: Max Marks must be a number")
                             continue
 
+                        # Difficulty is set on create so only one version is recorded
+                        difficulty = row.get('Difficulty')
+                        if difficulty not in ['easy', 'medium', 'hard']:
+                            difficulty = 'medium'
+
                         # Create question
-                        question = Question_DB.objects.create(
+                        Question_DB.objects.create(
                             professor=professor,
                             question=row['Question Text'],
                             optionA=row['Option A'],
@@ -203,13 +173,9 @@ class QuestionCSVImporter:
                             optionD=row['Option D'],
                             answer=answer,
                             max_marks=max_marks,
+                            difficulty=difficulty,
                         )
 
-                        # Save difficulty if provided
-                        if 'Difficulty' in row and row['Difficulty'] in ['easy', 'medium', 'hard']:
-                            question.difficulty = row['Difficulty']
-                            question.save()
-
                         imported_count += 1
 
                     except Exception as e:
@@ -60,36 +60,15 @@ class ExamAssignment(models.Model):
     @staticmethod
     def is_exam_assigned_to_student(exam, student):
         """
-        Check if a student has access to an exam
-        """
-        # Check if exam has any assignments
-        assignments_exist = ExamAssignment.objects.filter(exam=exam, is_active=True).exists()
-
-        if not assignments_exist:
-            # No assignments = open to all students
-            return True
-
-        # Check if student has direct assignment
-        direct_assignment = ExamAssignment.objects.filter(
-            exam=exam,
-            student=student,
-            assignment_type='individual',
-            is_active=True
-        ).exists()
+        Check if a student has access to an exam.
 
-        if direct_assignment:
-            return True
-
-        # Check if exam is assigned to student's batch
-        # This would require storing batch info in StudentInfo model
-        # For now, we'll just check individual and public assignments
-        public_assignment = ExamAssignment.objects.filter(
-            exam=exam,
-            assignment_type='public',
-            is_active=True
-        ).exists()
-
-        return public_assignment
+        No active assignments or a public one opens the exam to everyone,
+        otherwise the student needs an individual assignment. Batch
+        assignments need batch info on StudentInfo and are not matched yet.
+        Answered from the per-exam eligibility cache (questions.eligibility).
+        """
+        from .eligibility import is_eligible
+        return is_eligible(exam, student)
 
     def deactivate(self):
         """Soft delete - deactivate assignment instead of deleting"""
@@ -0,0 +1,158 @@
+"""
+Exam Clock
+Server-side deadlines for exam sessions.
+
+Each student's exam window is computed once and cached as
+(opens_at, deadline), both POSIX timestamps. The deadline comes from the
+session's ends_at, or from the exam's end_time before a session exists.
+Every timing decision then needs two cache reads and no datetime
+conversions: the exam page, submissions, the heartbeat endpoint the
+client timer syncs against, and submission timestamp validation.
+
+Windows are keyed by a per-exam generation. Saving an exam whose start or
+end time changed moves the ends_at of its unfinished sessions along and
+starts a new generation (questions.signals), so every student's window is
+rebuilt on the next read instead of when the cached one times out.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger('app')
+
+CLOCK_CACHE_GRACE = 60 * 60
+CLIENT_CLOCK_TOLERANCE = 30
+
+
+def _generation_key(exam_id):
+    return f'exam_clock_generation:{exam_id}'
+
+
+def _key(exam_id, student_id):
+    # A fresh generation also covers the key being evicted
+    generation = cache.get_or_set(_generation_key(exam_id), time.time_ns, None)
+    return f'exam_clock:{exam_id}:{generation}:{student_id}'
+
+
+def _store(exam_id, student_id, opens_at, deadline):
+    window = (opens_at.timestamp(), deadline.timestamp())
+    timeout = max(int(window[1] - time.time()), 0) + CLOCK_CACHE_GRACE
+    cache.set(_key(exam_id, student_id), window, timeout)
+    return window
+
+
+def deadline_window(student_id, exam_id, session=None):
+    """
+    Cached (opens_at, deadline) timestamps for a student's exam, or None
+    if the exam does not exist. Pass the session when it is at hand to
+    skip the lookup on a cache miss.
+    """
+    window = cache.get(_key(exam_id, student_id))
+    if window is not None:
+        return window
+
+    from .models import Exam_Model
+
+    times = Exam_Model.objects.filter(id=exam_id).values_list('start_time', 'end_time').first()
+    if times is None:
+        return None
+    start_time, end_time = times
+    if session is not None:
+        ends_at = session.ends_at
+    else:
+        from .anticheating_models import ExamSession
+        ends_at = ExamSession.objects.filter(student_id=student_id, exam_id=exam_id).values_list(
+            'ends_at', flat=True
+        ).first()
+    return _store(exam_id, student_id, start_time, ends_at or end_time)
+
+
+def forget(student_id, exam_id):
+    """Drop a cached window, e.g. after a session's ends_at changed."""
+    cache.delete(_key(exam_id, student_id))
+
+
+def invalidate_exam(exam_id):
+    """Drop the cached window of every student of an exam, after its times changed."""
+    cache.set(_generation_key(exam_id), time.time_ns(), None)
+
+
+def new_session_fields(student_id, exam_id):
+    """duration_seconds and ends_at for a student's new ExamSession, from their window."""
+    opens_at, deadline = deadline_window(student_id, exam_id)
+    return {
+        'duration_seconds': max(0, int(deadline - opens_at)),
+        'ends_at': datetime.fromtimestamp(deadline, tz=dt_timezone.utc),
+    }
+
+
+def remaining_seconds(session, now=None):
+    """Whole seconds left before the session's deadline, 0 once it has passed."""
+    _, deadline = deadline_window(session.student_id, session.exam_id, session)
+    return max(0, int(deadline - (now or time.time())))
+
+
+def check_window(student_id, exam_id, now=None, grace=0):
+    """
+    Where `now` falls in a student's exam window.
+
+    Returns:
+        (state, seconds): state is 'not_started' (seconds until it opens),
+        'open' (seconds remaining), 'expired' (seconds since the deadline)
+        or 'unknown' for a missing exam
+    """
+    window = deadline_window(student_id, exam_id)
+    if window is None:
+        return 'unknown', 0
+    opens_at, deadline = window
+    now = now or time.time()
+    if now < opens_at:
+        return 'not_started', int(opens_at - now)
+    if now > deadline + grace:
+        return 'expired', int(now - deadline)
+    return 'open', max(0, int(deadline - now))
+
+
+def heartbeat(student_id, exam_id, now=None):
+    """Server time and the student's remaining time, for the client timer."""
+    now = now or time.time()
+    state, seconds = check_window(student_id, exam_id, now)
+    return {
+        'server_time_ms': int(now * 1000),
+        'state': state,
+        'remaining_seconds': seconds if state == 'open' else 0,
+        'starts_in_seconds': seconds if state == 'not_started' else 0,
+    }
+
+
+def validate_submission(student_id, exam_id, client_time=None, now=None, grace=0):
+    """
+    Check a submission against the student's deadline and, when given, the
+    client's own timestamp (ISO 8601).
+
+    Returns:
+        (is_valid, message)
+    """
+    now = now or time.time()
+    state, seconds = check_window(student_id, exam_id, now, grace)
+    if state == 'unknown':
+        return False, "Exam not found"
+    if state == 'not_started':
+        return False, "Exam has not started yet"
+    if state == 'expired':
+        return False, "Exam time has expired on server"
+
+    if client_time is not None:
+        client_dt = parse_datetime(client_time) if isinstance(client_time, str) else None
+        if client_dt is None or client_dt.tzinfo is None:
+            return False, "Invalid submission timestamp format"
+        drift = abs(now - client_dt.timestamp())
+        if drift > CLIENT_CLOCK_TOLERANCE:
+            logger.warning(f"Suspicious timestamp: student {student_id} exam {exam_id} - diff: {drift:.0f}s")
+            return False, f"Client clock is out of sync ({drift:.0f}s difference)"
+
+    return True, "Timestamp valid"
@@ -0,0 +1,256 @@
+"""
+Exam Generation Engine
+Builds randomized per-student papers from an ExamTemplate-style spec.
+
+Spec format (ExamTemplate.settings):
+    {
+        "seed": 2026,
+        "marks_target": 20,
+        "strata": [
+            {"difficulty": "easy", "count": 5},
+            {"difficulty": "hard", "tag": "algebra", "count": 2},
+            {"course": 3, "count": 3}
+        ]
+    }
+
+Tag and course strata need a question bank that has them (from_template,
+from_queryset). Papers for an Exam_Model are drawn from its pinned
+Question_DB questions, which have neither, so generate_exam_sessions()
+and the generate_exam_papers command accept difficulty strata only and
+reject any other spec before writing anything.
+
+Each stratum's candidate ids are fetched once into a compact array, so a
+student's paper is one indexed sample per stratum instead of an
+ORDER BY RANDOM() query. Strata are made disjoint in spec order, a question
+matching two strata belongs to the first one. Papers are deterministic for a
+(seed, student) pair and are stored on ExamSession.question_selection as
+packed little-endian uint32 question ids.
+"""
+
+import logging
+import random
+import struct
+from array import array
+
+from django.db import transaction
+
+logger = logging.getLogger('app')
+
+# Stratum key -> (model field it needs, queryset lookup)
+STRATUM_LOOKUPS = {
+    'difficulty': ('difficulty', 'difficulty__iexact'),
+    'tag': ('tags', 'tags__name__iexact'),
+    'course': ('course', 'course_id'),
+}
+
+# Stratum keys an exam's own (Question_DB) questions can be filtered by
+EXAM_STRATUM_KEYS = frozenset(['difficulty'])
+
+# Extra samples drawn per student when trying to hit marks_target
+MARKS_TARGET_ATTEMPTS = 16
+
+
+def pack_selection(qnos):
+    """Pack question ids into bytes for ExamSession.question_selection."""
+    return struct.pack(f'<{len(qnos)}I', *qnos)
+
+
+def unpack_selection(data):
+    """Unpack ExamSession.question_selection into a list of question ids."""
+    if not data:
+        return []
+    data = bytes(data)
+    return list(struct.unpack(f'<{len(data) // 4}I', data))
+
+
+class ExamGenerator:
+    """
+    Per-student paper generator over precomputed stratum id arrays.
+
+    Build one with from_queryset() (question bank / ExamTemplate) or
+    from_exam() (an exam's pinned questions), then call generate() per
+    student or generate_many() for a whole cohort.
+    """
+
+    def __init__(self, strata, seed=0, marks_target=None):
+        """
+        Args:
+            strata: list of (ids array, marks array, count) tuples
+            seed: template seed mixed into every student's sample
+            marks_target: optional total marks each paper should get close to
+        """
+        self.strata = strata
+        self.seed = seed
+        self.marks_target = marks_target
+
+        for ids, _, count in strata:
+            if count > len(ids):
+                raise ValueError(f'Stratum needs {count} questions but only {len(ids)} match')
+
+    @staticmethod
+    def _parse_spec(spec):
+        strata = spec.get('strata') or []
+        if not strata:
+            raise ValueError('Exam template spec has no strata')
+        for stratum in strata:
+            unknown = set(stratum) - set(STRATUM_LOOKUPS) - {'count'}
+            if unknown:
+                raise ValueError(f"Unknown stratum keys: {', '.join(sorted(unknown))}")
+            if int(stratum.get('count', 0)) <= 0:
+                raise ValueError('Every stratum needs a positive count')
+        return strata, int(spec.get('seed') or 0), spec.get('marks_target')
+
+    @classmethod
+    def check_exam_spec(cls, spec):
+        """
+        Validate a spec for an exam's own questions. Raises ValueError naming
+        the strata keys (tag, course) that only a question bank can satisfy.
+        """
+        strata, _, _ = cls._parse_spec(spec)
+        unsupported = set().union(*(set(s) - {'count'} for s in strata)) - EXAM_STRATUM_KEYS
+        if unsupported:
+            raise ValueError(
+                f"Exam papers can only be stratified by difficulty, the exam's questions have no "
+                f"{' or '.join(sorted(unsupported))}. Use a difficulty-only spec."
+            )
+
+    @classmethod
+    def from_queryset(cls, queryset, spec):
+        """Precompute stratum id arrays from a question queryset."""
+        strata_spec, seed, marks_target = cls._parse_spec(spec)
+        field_names = {f.name for f in queryset.model._meta.get_fields()}
+        claimed = set()
+        strata = []
+
+        for stratum in strata_spec:
+            filters = {}
+            for key, value in stratum.items():
+                if key == 'count':
+                    continue
+                field, lookup = STRATUM_LOOKUPS[key]
+                if field not in field_names:
+                    raise ValueError(f'{queryset.model.__name__} cannot be filtered by {key}')
+                filters[lookup] = value
+
+            ids, marks = array('I'), array('I')
+            rows = queryset.filter(**filters).order_by('pk').values_list('pk', 'max_marks').distinct()
+            for pk, max_marks in rows:
+                if pk not in claimed:
+                    claimed.add(pk)
+                    ids.append(pk)
+                    marks.append(max_marks or 0)
+            strata.append((ids, marks, int(stratum['count'])))
+
+        return cls(strata, seed, marks_target)
+
+    @classmethod
+    def from_template(cls, template):
+        """Generator for an ExamTemplate: its own questions, or its course's bank."""
+        from .models_new import Question_DB_New
+
+        queryset = template.questions.all()
+        if not queryset.exists():
+            queryset = Question_DB_New.objects.filter(course=template.course)
+        return cls.from_queryset(queryset, template.settings or {})
+
+    @classmethod
+    def from_exam(cls, exam, spec):
+        """
+        Generator over the exam's pinned questions. Only difficulty strata
+        apply here, Question_DB has no tags or course (see check_exam_spec).
+        """
+        from .versioning import exam_questions
+
+        cls.check_exam_spec(spec)
+        strata_spec, seed, marks_target = cls._parse_spec(spec)
+        questions = exam_questions(exam)
+        claimed = set()
+        strata = []
+
+        for stratum in strata_spec:
+            difficulty = (stratum.get('difficulty') or '').lower()
+            ids, marks = array('I'), array('I')
+            for qno, state in questions.items():
+                if qno in claimed:
+                    continue
+                if difficulty and (state.get('difficulty') or '').lower() != difficulty:
+                    continue
+                claimed.add(qno)
+                ids.append(qno)
+                marks.append(state.get('max_marks') or 0)
+            strata.append((ids, marks, int(stratum['count'])))
+
+        return cls(strata, seed, marks_target)
+
+    def _sample(self, rng):
+        qnos, total = [], 0
+        for ids, marks, count in self.strata:
+            for index in rng.sample(range(len(ids)), count):
+                qnos.append(ids[index])
+                total += marks[index]
+        return qnos, total
+
+    def generate(self, student_id):
+        """
+        Return the list of question ids for one student.
+
+        With a marks target, up to MARKS_TARGET_ATTEMPTS samples are drawn from
+        the same student stream and the closest one wins, so the result is
+        still deterministic.
+        """
+        rng = random.Random(f'{self.seed}:{student_id}')
+        qnos, total = self._sample(rng)
+        if self.marks_target is None:
+            return qnos
+
+        target = int(self.marks_target)
+        best, best_gap = qnos, abs(total - target)
+        for _ in range(MARKS_TARGET_ATTEMPTS):
+            if best_gap == 0:
+                break
+            qnos, total = self._sample(rng)
+            if abs(total - target) < best_gap:
+                best, best_gap = qnos, abs(total - target)
+        return best
+
+    def generate_many(self, student_ids):
+        """Return {student_id: packed selection} for a cohort."""
+        return {sid: pack_selection(self.generate(sid)) for sid in student_ids}
+
+
+def generate_exam_sessions(exam, spec, student_ids):
+    """
+    Generate and store a paper for every student on the exam.
+
+    Sessions are created (or their selection replaced) in one bulk statement.
+    Returns the number of sessions written.
+    """
+    from .anticheating_models import ExamSession
+
+    generator = ExamGenerator.from_exam(exam, spec)
+    selections = generator.generate_many(student_ids)
+    duration = 0
+    if exam.start_time and exam.end_time:
+        duration = max(0, int((exam.end_time - exam.start_time).total_seconds()))
+
+    sessions = [
+        ExamSession(
+            student_id=sid,
+            exam=exam,
+            duration_seconds=duration,
+            ends_at=exam.end_time,
+            question_selection=selection,
+        )
+        for sid, selection in selections.items()
+    ]
+    with transaction.atomic():
+        ExamSession.objects.bulk_create(
+            sessions,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['student', 'exam'],
+            update_fields=['question_selection'],
+        )
+
+    logger.info(f"Generated {len(sessions)} randomized papers for exam {exam.name}")
+    return len(sessions)
@@ -0,0 +1,80 @@
+"""
+Exam Start Warm-up
+Prepares an exam shortly before start_time so the opening rush is cache reads.
+
+Warming an exam pins its question versions, loads the pinned questions
+(the answer key graders use), renders the paper fragments, primes the
+eligibility cache and bulk-creates an ExamSession with its own order seed
+for every eligible student. Run by the scheduler in notifications.scheduler.
+The sessions' ends_at follows later changes to the exam's end_time
+(questions.signals).
+"""
+
+import logging
+
+from django.core.cache import cache
+
+logger = logging.getLogger('app')
+
+
+def warm_up_exam(exam):
+    """
+    Warm one exam. Safe to call repeatedly, existing sessions are kept.
+
+    Returns the number of students the exam was prepared for.
+    """
+    from .anticheating_models import ExamSession
+    from .eligibility import eligible_student_ids
+    from .paper_cache import paper_fragments
+    from .versioning import exam_questions
+
+    exam_questions(exam)
+    paper_fragments(exam)
+    student_ids = eligible_student_ids(exam)
+
+    duration = max(0, int((exam.end_time - exam.start_time).total_seconds()))
+    ExamSession.objects.bulk_create(
+        [
+            ExamSession(student_id=sid, exam=exam, duration_seconds=duration, ends_at=exam.end_time)
+            for sid in student_ids
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+    logger.info(f"Warmed up exam {exam.name} for {len(student_ids)} students")
+    return len(student_ids)
+
+
+def warm_up_upcoming_exams(minutes):
+    """
+    Warm every active exam starting within the next `minutes` minutes.
+
+    Each exam is warmed once per pinned paper; a re-pinned exam is warmed again.
+    """
+    from django.utils import timezone
+    from datetime import timedelta
+    from .models import Exam_Model
+    from .versioning import pin_exam_versions, pins_digest
+
+    now = timezone.now()
+    exams = Exam_Model.objects.filter(
+        is_active=True,
+        start_time__gt=now,
+        start_time__lte=now + timedelta(minutes=minutes),
+    ).select_related('question_paper')
+
+    warmed = 0
+    for exam in exams:
+        pins = exam.pinned_versions or pin_exam_versions(exam)
+        marker = f'exam_warmed:{exam.id}:{pins_digest(pins)}'
+        timeout = max(int((exam.end_time - now).total_seconds()), 60)
+        if not cache.add(marker, True, timeout):
+            continue
+        try:
+            warm_up_exam(exam)
+            warmed += 1
+        except Exception as e:
+            cache.delete(marker)
+            logger.error(f"Error warming up exam {exam.name}: {str(e)}")
+    return warmed
@@ -0,0 +1,212 @@
+"""
+Live Exam Monitoring
+In-process pub/sub for proctoring events and the SSE stream built on it.
+
+Code that records proctoring activity (the focus-loss ingestion path,
+ExamSecurityAlert, ExamSession start/submit) publishes to a topic per exam.
+Each open monitor connection is an asyncio queue on the ASGI event loop;
+publishing hands the event to every queue with call_soon_threadsafe, so a
+connection costs one queue and no database work after the initial
+snapshot. Publishing to a topic nobody listens to is a dictionary lookup.
+
+The streams need the ASGI server (examProject.asgi under uvicorn or
+daphne). Under WSGI an async streaming response holds a worker thread and
+sends nothing, so pages only open them when settings.LIVE_EVENTS_SSE is
+set, and poll instead by default: exam_activity() for the monitor, the
+ETag'd focus-status endpoint for exam pages. The broker only carries
+events to the process that published them, so the streams also need
+a single ASGI process.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('app')
+
+SUBSCRIBER_QUEUE_SIZE = 200
+KEEPALIVE_SECONDS = 15
+ACTIVITY_POLL_LIMIT = 100
+
+
+def live_events_enabled():
+    """Whether pages use the SSE streams rather than polling (ASGI only)."""
+    return getattr(settings, 'LIVE_EVENTS_SSE', False)
+
+
+class LiveBroker:
+    """Thread-safe topic -> asyncio queue fan-out for one process."""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, topic):
+        """Register a queue on the running event loop for topic and return it."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers[topic].add(queue)
+        return queue
+
+    def unsubscribe(self, topic, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[topic]
+
+    def has_subscribers(self, topic):
+        return topic in self._subscribers
+
+    @staticmethod
+    def _offer(queue, message):
+        # Slow consumers lose their oldest events rather than blocking publishers
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def publish(self, topic, kind, data):
+        """Deliver (kind, data) to every subscriber of topic. Never blocks."""
+        with self._lock:
+            queues = list(self._subscribers.get(topic, ()))
+        for queue in queues:
+            try:
+                queue.loop.call_soon_threadsafe(self._offer, queue, (kind, data))
+            except RuntimeError:
+                # Event loop already closed, the connection is gone
+                self.unsubscribe(topic, queue)
+
+
+broker = LiveBroker()
+
+
+def exam_topic(exam_id):
+    return f'exam:{exam_id}'
+
+
+def publish_exam_event(exam_id, kind, **data):
+    """Publish a proctoring event for an exam's monitors."""
+    topic = exam_topic(exam_id)
+    if not broker.has_subscribers(topic):
+        return
+    data.setdefault('at', timezone.now().isoformat())
+    broker.publish(topic, kind, data)
+
+
+def exam_session_stats(exam_id):
+    """Snapshot of {'active': started and not submitted, 'submitted': n} for an exam."""
+    from django.db.models import Count, Q
+    from .anticheating_models import ExamSession
+
+    return ExamSession.objects.filter(exam_id=exam_id).aggregate(
+        active=Count('id', filter=Q(ip_address__isnull=False, is_submitted=False)),
+        submitted=Count('id', filter=Q(is_submitted=True)),
+    )
+
+
+def exam_activity(exam_id, after_focus=None, after_alert=None):
+    """
+    Polling counterpart of exam_event_stream.
+
+    Returns {'stats', 'events': [{'kind', 'data'}], 'cursor': {'focus', 'alert'}}
+    with the focus-loss events and alerts after the cursor ids (the latest
+    ACTIVITY_POLL_LIMIT of each without one), oldest first. Session starts
+    and submissions only show in the stats.
+    """
+    from .anticheating_models import ExamSecurityAlert, FocusLossEvent
+
+    focus = FocusLossEvent.objects.filter(exam_id=exam_id)
+    if after_focus is not None:
+        focus = focus.filter(id__gt=after_focus)
+    alerts = ExamSecurityAlert.objects.filter(exam_id=exam_id)
+    if after_alert is not None:
+        alerts = alerts.filter(id__gt=after_alert)
+
+    focus_rows = list(
+        focus.order_by('-id')
+        .values_list('id', 'student_id', 'student__username', 'event_type', 'timestamp')[:ACTIVITY_POLL_LIMIT]
+    )
+    alert_rows = list(
+        alerts.order_by('-id')
+        .values_list('id', 'student_id', 'alert_type', 'level', 'message', 'created_at')[:ACTIVITY_POLL_LIMIT]
+    )
+
+    events = [
+        (at, 'focus_loss', {'student_id': sid, 'student': username, 'event_type': event_type, 'at': at.isoformat()})
+        for _, sid, username, event_type, at in focus_rows
+    ] + [
+        (at, 'alert', {
+            'student_id': sid, 'alert_type': alert_type, 'level': level, 'message': message, 'at': at.isoformat(),
+        })
+        for _, sid, alert_type, level, message, at in alert_rows
+    ]
+    events.sort(key=lambda event: event[0])
+
+    return {
+        'stats': exam_session_stats(exam_id),
+        'events': [{'kind': kind, 'data': data} for _, kind, data in events],
+        'cursor': {
+            'focus': focus_rows[0][0] if focus_rows else after_focus,
+            'alert': alert_rows[0][0] if alert_rows else after_alert,
+        },
+    }
+
+
+def sse_message(kind, data):
+    return f'event: {kind}\ndata: {json.dumps(data)}\n\n'
+
+
+async def topic_event_stream(topic, kind, load_initial):
+    """
+    SSE body that subscribes to topic, sends `await load_initial()` as a
+    `kind` event and then every message published to topic. Loading after
+    subscribing means no change can slip in between.
+    """
+    queue = broker.subscribe(topic)
+    try:
+        yield sse_message(kind, await load_initial())
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield sse_message(*item)
+    finally:
+        broker.unsubscribe(topic, queue)
+
+
+async def exam_event_stream(exam_id, stats):
+    """
+    Async SSE body for an exam monitor: the stats snapshot, then every
+    published event, with the running stats after session changes.
+    """
+    topic = exam_topic(exam_id)
+    queue = broker.subscribe(topic)
+    try:
+        yield sse_message('stats', stats)
+        while True:
+            try:
+                kind, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            yield sse_message(kind, data)
+            if kind == 'session_started':
+                stats['active'] += 1
+                yield sse_message('stats', stats)
+            elif kind == 'session_submitted':
+                stats['active'] = max(0, stats['active'] - 1)
+                stats['submitted'] += 1
+                yield sse_message('stats', stats)
+    finally:
+        broker.unsubscribe(topic, queue)
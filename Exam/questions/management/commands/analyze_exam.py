@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from questions.models import Exam_Model
+from questions.post_exam_analysis import analyze_exam
+
+
+class Command(BaseCommand):
+    help = 'Run post-exam anomaly analysis and record POST_EXAM_ANALYSIS alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='Exam to analyse')
+        parser.add_argument('--dry-run', action='store_true', help='Report findings without saving alerts')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam_Model.objects.get(pk=options['exam_id'])
+        except Exam_Model.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist")
+
+        result = analyze_exam(exam, save=not options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Analysed {result['sessions']} sessions of {exam.name}: "
+            f"{result['similar_pairs']} similar answer pairs, {result['timing']} timing anomalies, "
+            f"{result['clusters']} network clusters, {result['ip_changes']} IP changes, "
+            f"{result['alerts']} alerts"
+        ))
@@ -0,0 +1,44 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from questions.exam_generator import ExamGenerator, generate_exam_sessions
+from questions.models import Exam_Model
+from questions.models_new import ExamTemplate
+
+
+class Command(BaseCommand):
+    help = 'Generate randomized per-student papers for an exam from a template spec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='Exam to generate papers for')
+        parser.add_argument('--template', type=int, help='ExamTemplate whose settings hold the spec')
+        parser.add_argument('--spec', help='Inline JSON spec, overrides --template')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam_Model.objects.get(pk=options['exam_id'])
+        except Exam_Model.DoesNotExist:
+            raise CommandError(f"Exam {options['exam_id']} does not exist")
+
+        if options['spec']:
+            spec = json.loads(options['spec'])
+        elif options['template']:
+            spec = ExamTemplate.objects.get(pk=options['template']).settings
+        else:
+            raise CommandError('Pass --template or --spec')
+        try:
+            ExamGenerator.check_exam_spec(spec or {})
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        student_ids = list(
+            User.objects.filter(groups__name='Student').values_list('id', flat=True)
+        )
+        try:
+            count = generate_exam_sessions(exam, spec, student_ids)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated {count} papers for {exam.name}'))
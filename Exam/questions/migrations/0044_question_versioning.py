@@ -0,0 +1,87 @@
+# Generated by Django 6.0.3 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0043_question_db_optiona_image_question_db_optionb_image_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='questionversion',
+            options={'ordering': ['-version_number']},
+        ),
+        migrations.AlterUniqueTogether(
+            name='questionversion',
+            unique_together={('question', 'version_number')},
+        ),
+        migrations.AddField(
+            model_name='exam_model',
+            name='pinned_versions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='examsession',
+            name='answers',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='questionversion',
+            name='data',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.AddField(
+            model_name='questionversion',
+            name='is_snapshot',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='questionversion',
+            name='modified_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='questionversion',
+            name='question',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='versions', to='questions.question_db'),
+        ),
+        migrations.AlterField(
+            model_name='questionversion',
+            name='version_number',
+            field=models.PositiveIntegerField(),
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='answer',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='max_marks',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='optionA',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='optionB',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='optionC',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='optionD',
+        ),
+        migrations.RemoveField(
+            model_name='questionversion',
+            name='question_text',
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.3 on 2026-10-19 11:20
+
+import questions.permutations
+from django.db import migrations, models
+
+
+def assign_order_seeds(apps, schema_editor):
+    # One seed per existing session; a callable default would give them all the same one.
+    # Sessions still in progress keep the order they were shown; the rest drop it.
+    ExamSession = apps.get_model('questions', 'ExamSession')
+    sessions = list(ExamSession.objects.only('id', 'is_submitted', 'legacy_question_order', 'legacy_option_order'))
+    for session in sessions:
+        session.order_seed = questions.permutations.new_order_seed()
+        if session.is_submitted or not session.legacy_question_order:
+            session.legacy_question_order = None
+            session.legacy_option_order = None
+    ExamSession.objects.bulk_update(
+        sessions, ['order_seed', 'legacy_question_order', 'legacy_option_order'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0045_exam_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examsession',
+            name='order_seed',
+            field=models.BigIntegerField(null=True, editable=False),
+        ),
+        migrations.RenameField(
+            model_name='examsession',
+            old_name='question_order',
+            new_name='legacy_question_order',
+        ),
+        migrations.RenameField(
+            model_name='examsession',
+            old_name='option_order',
+            new_name='legacy_option_order',
+        ),
+        migrations.AlterField(
+            model_name='examsession',
+            name='legacy_question_order',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='examsession',
+            name='legacy_option_order',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(assign_order_seeds, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='examsession',
+            name='order_seed',
+            field=models.BigIntegerField(default=questions.permutations.new_order_seed, editable=False),
+        ),
+    ]
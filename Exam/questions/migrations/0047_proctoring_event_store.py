@@ -0,0 +1,120 @@
+# Generated by Django 6.0.3 on 2026-10-19 12:15
+
+import django.db.models.deletion
+import questions.anticheating_models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def intern_user_agents_and_partition(apps, schema_editor):
+    """Move user_agent strings into UserAgent and key existing rows by month."""
+    import hashlib
+
+    FocusLossEvent = apps.get_model('questions', 'FocusLossEvent')
+    ExamSecurityAlert = apps.get_model('questions', 'ExamSecurityAlert')
+    UserAgent = apps.get_model('questions', 'UserAgent')
+
+    agent_ids = {}
+    values = FocusLossEvent.objects.exclude(user_agent='').values_list('user_agent', flat=True).distinct()
+    for value in values.iterator():
+        agent, _ = UserAgent.objects.get_or_create(
+            digest=hashlib.sha256(value.encode('utf-8')).hexdigest(), defaults={'value': value}
+        )
+        agent_ids[value] = agent.id
+    for value, agent_id in agent_ids.items():
+        FocusLossEvent.objects.filter(user_agent=value).update(agent_id=agent_id)
+
+    for model, field in ((FocusLossEvent, 'timestamp'), (ExamSecurityAlert, 'created_at')):
+        months = model.objects.dates(field, 'month')
+        for month in months:
+            model.objects.filter(
+                **{f'{field}__year': month.year, f'{field}__month': month.month}
+            ).update(partition=month.year * 100 + month.month)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0046_session_order_seed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProctoringSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tab_switches', models.PositiveIntegerField(default=0)),
+                ('window_blurs', models.PositiveIntegerField(default=0)),
+                ('visibility_changes', models.PositiveIntegerField(default=0)),
+                ('warning_alerts', models.PositiveIntegerField(default=0)),
+                ('critical_alerts', models.PositiveIntegerField(default=0)),
+                ('blocked_alerts', models.PositiveIntegerField(default=0)),
+                ('first_event_at', models.DateTimeField(blank=True, null=True)),
+                ('last_event_at', models.DateTimeField(blank=True, null=True)),
+                ('rolled_up_through', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('value', models.TextField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='examsecurityalert',
+            name='partition',
+            field=models.PositiveIntegerField(default=questions.anticheating_models.month_partition),
+        ),
+        migrations.AddField(
+            model_name='focuslossevent',
+            name='partition',
+            field=models.PositiveIntegerField(default=questions.anticheating_models.month_partition),
+        ),
+        migrations.AddIndex(
+            model_name='examsecurityalert',
+            index=models.Index(fields=['exam', 'partition'], name='questions_e_exam_id_44c3d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examsecurityalert',
+            index=models.Index(fields=['partition'], name='questions_e_partiti_38b5aa_idx'),
+        ),
+        migrations.AddField(
+            model_name='proctoringsummary',
+            name='exam',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proctoring_summaries', to='questions.exam_model'),
+        ),
+        migrations.AddField(
+            model_name='proctoringsummary',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proctoring_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='focuslossevent',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='questions.useragent'),
+        ),
+        migrations.RunPython(intern_user_agents_and_partition, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='focuslossevent',
+            name='user_agent',
+        ),
+        migrations.AddIndex(
+            model_name='focuslossevent',
+            index=models.Index(fields=['exam', 'partition'], name='questions_f_exam_id_4c2e79_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='focuslossevent',
+            index=models.Index(fields=['partition'], name='questions_f_partiti_d2c70e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='proctoringsummary',
+            unique_together={('student', 'exam')},
+        ),
+    ]
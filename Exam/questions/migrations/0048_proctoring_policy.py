@@ -0,0 +1,30 @@
+# Generated by Django 6.0.3 on 2026-10-19 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('questions', '0047_proctoring_event_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProctoringPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rules', models.JSONField(default=list)),
+                ('warn_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('alert_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('submit_score', models.PositiveIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exam', models.OneToOneField(blank=True, help_text='Leave empty for the site-wide default policy', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='proctoring_policy', to='questions.exam_model')),
+            ],
+            options={
+                'verbose_name': 'Proctoring Policy',
+                'verbose_name_plural': 'Proctoring Policies',
+            },
+        ),
+    ]
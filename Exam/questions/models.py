@@ -20,10 +20,17 @@ class Exam_Model(models.Model):
     start_time = models.DateTimeField(default=_now_rounded_to_minute)
     end_time = models.DateTimeField(default=_now_rounded_to_minute)
     is_active = models.BooleanField(default=True)
+    # {str(qno): version_number} captured when the exam is published; see questions.versioning
+    pinned_versions = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return self.name
 
+    def pin_question_versions(self):
+        """Pin the current revision of every question on this exam's paper."""
+        from .versioning import pin_exam_versions
+        return pin_exam_versions(self)
+
 
 class ExamForm(ModelForm):
     def __init__(self, professor, *args, **kwargs):
@@ -52,7 +59,7 @@ class ExamForm(ModelForm):
     class Meta:
         model = Exam_Model
         fields = '__all__'
-        exclude = ['professor', 'total_marks', 'is_active']
+        exclude = ['professor', 'total_marks', 'is_active', 'pinned_versions']
         labels = {
             'name': 'Exam Name',
             'question_paper': 'Question Paper',
@@ -0,0 +1,87 @@
+"""
+Exam Paper Fragment Cache
+Pre-rendered HTML fragments for the questions of a pinned exam paper.
+
+Every question's header and each of its options are rendered once per
+Question_Paper version (the exam's pinned revisions) and cached. A student's
+paper is then assembled by concatenating fragments in the session's
+permutation order, so starting an exam does no per-student template work.
+Question numbers are drawn by a CSS counter, which keeps fragments identical
+for every position they can appear in.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+logger = logging.getLogger('app')
+
+PAPER_FRAGMENTS_CACHE_TIMEOUT = 60 * 60 * 6
+
+CARD_OPEN = '<div class="bg-white rounded-xl shadow-sm border border-slate-200 overflow-hidden">'
+OPTIONS_OPEN = '<div class="p-6 space-y-3">'
+CLOSE = '</div>'
+
+
+def _render_fragments(questions):
+    fragments = {}
+    for qno, q in questions.items():
+        fragments[qno] = {
+            'head': render_to_string('exam/fragments/question_head.html', {'question': q}),
+            'options': {
+                letter: render_to_string('exam/fragments/question_option.html', {
+                    'qno': qno, 'choice': letter, 'text': q['option' + letter],
+                })
+                for letter in ('A', 'B', 'C', 'D')
+            },
+        }
+    return fragments
+
+
+def paper_fragments(exam):
+    """
+    Return {qno: {'head': html, 'options': {letter: html}}} for the exam's
+    pinned questions, rendering them on first use.
+    """
+    from .versioning import exam_questions, pins_digest
+
+    questions = exam_questions(exam)
+    cache_key = f'paper_fragments:{exam.question_paper_id}:{pins_digest(exam.pinned_versions)}'
+    fragments = cache.get(cache_key)
+    if fragments is None:
+        fragments = _render_fragments(questions)
+        cache.set(cache_key, fragments, PAPER_FRAGMENTS_CACHE_TIMEOUT)
+        logger.info(f"Rendered {len(fragments)} question fragments for exam {exam.name}")
+    return fragments
+
+
+def session_fragments(exam, exam_session):
+    """
+    Return the session's paper as an ordered list of
+    {'qno', 'head', 'options': [(letter, html), ...]}.
+    """
+    fragments = paper_fragments(exam)
+    ordered = []
+    for qno in exam_session.ordered_qnos(list(fragments)):
+        frag = fragments[qno]
+        ordered.append({
+            'qno': qno,
+            'head': frag['head'],
+            'options': [(letter, frag['options'][letter]) for letter in exam_session.option_order(qno)],
+        })
+    return ordered
+
+
+def render_session_paper(exam, exam_session):
+    """Assemble the session's question cards into one safe HTML string."""
+    parts = []
+    for item in session_fragments(exam, exam_session):
+        parts.append(CARD_OPEN)
+        parts.append(item['head'])
+        parts.append(OPTIONS_OPEN)
+        parts.extend(html for _, html in item['options'])
+        parts.append(CLOSE)
+        parts.append(CLOSE)
+    return mark_safe(''.join(parts))
@@ -0,0 +1,58 @@
+"""
+Seeded Permutations
+Deterministic question and option orders derived from ExamSession.order_seed.
+
+A session stores one 63-bit seed instead of its question/option orders. The
+orders are rebuilt on demand with a SplitMix64 stream and a Fisher-Yates
+shuffle, so every render and every grader sees the same permutation without
+reading it from the database. The generator is implemented here rather than
+taken from the random module so the orders stay stable across Python versions.
+"""
+
+import secrets
+
+MASK64 = (1 << 64) - 1
+OPTION_LETTERS = ('A', 'B', 'C', 'D')
+
+
+def new_order_seed():
+    """Fresh seed for a session (fits a signed BIGINT column)."""
+    return secrets.randbits(63)
+
+
+class SplitMix64:
+    """Small, fast 64-bit PRNG (Steele, Lea & Flood)."""
+
+    __slots__ = ('state',)
+
+    def __init__(self, seed):
+        self.state = seed & MASK64
+
+    def next(self):
+        self.state = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = self.state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def below(self, n):
+        """Integer in [0, n) by multiply-shift reduction."""
+        return (self.next() * n) >> 64
+
+
+def shuffle(items, rng):
+    """Fisher-Yates shuffle of items in place; returns items."""
+    for i in range(len(items) - 1, 0, -1):
+        j = rng.below(i + 1)
+        items[i], items[j] = items[j], items[i]
+    return items
+
+
+def question_order(seed, qnos):
+    """Permutation of qnos for a session; input order does not matter."""
+    return shuffle(sorted(qnos), SplitMix64(seed))
+
+
+def option_order(seed, qno):
+    """Option letter order for one question of a session."""
+    return shuffle(list(OPTION_LETTERS), SplitMix64(seed ^ (qno * 0x9E3779B97F4A7C15)))
@@ -0,0 +1,306 @@
+"""
+Post-Exam Analysis
+Offline anomaly detection over a finished exam's sessions and proctoring events.
+
+The exam's ExamSession rows (answers, network details, timing) and its
+FocusLossEvent rows are loaded into NumPy/pandas once, then analysed with
+vectorized operations only:
+
+    answer similarity   wrong answers one-hot encoded into a sessions x
+                        (questions * options) matrix; one matrix product
+                        gives the identical-wrong-answer count of every pair
+    timing anomalies    per-student event gaps and bursts from a grouped
+                        diff, plus robust z-scores of event counts and
+                        completion times against the cohort
+    network clusters    students sharing an IP address and user agent, and
+                        students whose IP changed during the exam
+
+Findings are stored as ExamSecurityAlert rows of type POST_EXAM_ANALYSIS,
+replacing the unresolved ones of a previous run. Run by the scheduler once
+an exam has ended, or by the analyze_exam management command.
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from django.db import transaction
+
+logger = logging.getLogger('app')
+
+ALERT_TYPE = 'POST_EXAM_ANALYSIS'
+OPTIONS = ('A', 'B', 'C', 'D')
+
+MIN_SHARED_WRONG = 5        # identical wrong answers before a pair is considered
+SIMILARITY_RATIO = 0.8      # shared / fewer wrong answers of the pair
+SIMILARITY_Z = 3.0          # shared count z-score across all pairs
+BURST_SECONDS = 2.0         # events closer than this count as a burst
+MIN_BURSTS = 3
+ROBUST_Z = 3.5              # modified z-score limit for event counts and durations
+MIN_FLAGGED_EVENTS = 3
+
+
+def encode_answers(answer_dicts, qnos):
+    """
+    Answers as a sessions x questions int8 matrix: 0 unanswered, 1-4 for A-D.
+
+    Args:
+        answer_dicts: one {qno: letter} dict per session
+        qnos: question numbers, in column order
+    """
+    frame = pd.DataFrame.from_records(answer_dicts, columns=[str(q) for q in qnos])
+    codes = {letter: index for index, letter in enumerate(OPTIONS, 1)}
+    encoded = frame.apply(lambda column: column.astype('string').str.strip().str.upper().map(codes))
+    return encoded.fillna(0).to_numpy(dtype=np.int8)
+
+
+def answer_similarity(answers, key, min_shared=MIN_SHARED_WRONG, ratio=SIMILARITY_RATIO, z=SIMILARITY_Z):
+    """
+    Pairs of sessions sharing unusually many identical wrong answers.
+
+    Args:
+        answers: sessions x questions int8 matrix from encode_answers
+        key: int8 vector of correct options per question
+
+    Returns:
+        list of (i, j, shared, fewer_wrong) with row indices i < j
+    """
+    sessions = answers.shape[0]
+    if sessions < 2:
+        return []
+
+    wrong = (answers != 0) & (answers != key)
+    # One-hot over (question, chosen option) for wrong answers only
+    onehot = np.concatenate(
+        [(wrong & (answers == code)) for code in range(1, len(OPTIONS) + 1)], axis=1
+    ).astype(np.float32)
+    shared = onehot @ onehot.T
+    wrong_counts = np.diag(shared).copy()
+
+    pairs = sessions * (sessions - 1) / 2
+    upper_total = (shared.sum() - wrong_counts.sum()) / 2
+    upper_squares = ((shared ** 2).sum() - (wrong_counts ** 2).sum()) / 2
+    mean = upper_total / pairs
+    std = np.sqrt(max(upper_squares / pairs - mean ** 2, 0.0)) or 1.0
+
+    fewer_wrong = np.minimum.outer(wrong_counts, wrong_counts)
+    flagged = np.triu(
+        (shared >= min_shared)
+        & (shared >= ratio * fewer_wrong)
+        & ((shared - mean) / std >= z),
+        k=1,
+    )
+    rows, cols = np.nonzero(flagged)
+    return [
+        (int(i), int(j), int(shared[i, j]), int(fewer_wrong[i, j]))
+        for i, j in zip(rows, cols)
+    ]
+
+
+def robust_z(values):
+    """Modified z-scores (median / MAD) of a numeric Series; 0 where MAD is 0."""
+    median = values.median()
+    mad = (values - median).abs().median()
+    if not mad:
+        return pd.Series(0.0, index=values.index)
+    return 0.6745 * (values - median) / mad
+
+
+def timing_anomalies(events, sessions):
+    """
+    Per-student timing findings.
+
+    Args:
+        events: DataFrame [student_id, timestamp] of focus-loss events
+        sessions: DataFrame [student_id, started_at, submitted_at]
+
+    Returns:
+        dict {student_id: [message, ...]}
+    """
+    findings = {}
+
+    if not events.empty:
+        events = events.sort_values(['student_id', 'timestamp'])
+        gaps = events.groupby('student_id')['timestamp'].diff().dt.total_seconds()
+        per_student = events.assign(burst=gaps < BURST_SECONDS).groupby('student_id').agg(
+            events=('timestamp', 'size'), bursts=('burst', 'sum')
+        )
+        per_student['z'] = robust_z(per_student['events'].astype(float))
+
+        bursty = per_student[per_student['bursts'] >= MIN_BURSTS]
+        for student_id, row in bursty.iterrows():
+            findings.setdefault(student_id, []).append(
+                f"{int(row['bursts'])} focus losses less than {BURST_SECONDS:g}s apart"
+            )
+        frequent = per_student[(per_student['z'] >= ROBUST_Z) & (per_student['events'] >= MIN_FLAGGED_EVENTS)]
+        for student_id, row in frequent.iterrows():
+            findings.setdefault(student_id, []).append(
+                f"{int(row['events'])} focus losses, far above the exam's typical count"
+            )
+
+    finished = sessions.dropna(subset=['started_at', 'submitted_at'])
+    if len(finished) >= 2:
+        durations = (finished['submitted_at'] - finished['started_at']).dt.total_seconds()
+        fast = finished[robust_z(durations) <= -ROBUST_Z]
+        for student_id, seconds in zip(fast['student_id'], durations[fast.index]):
+            findings.setdefault(student_id, []).append(
+                f"Finished in {int(seconds // 60)} min, far faster than the exam's typical time"
+            )
+
+    return findings
+
+
+def network_clusters(sessions, events):
+    """
+    Students sharing a device fingerprint and students whose IP changed.
+
+    Args:
+        sessions: DataFrame [student_id, ip_address, user_agent]
+        events: DataFrame [student_id, ip_address] of focus-loss events
+
+    Returns:
+        (clusters, changed): clusters is a list of student id lists sharing
+        an IP address and user agent; changed is {student_id: ip count}
+    """
+    known = sessions.dropna(subset=['ip_address'])
+    known = known[known['ip_address'] != '']
+    grouped = known.groupby(['ip_address', 'user_agent'])['student_id'].unique()
+    clusters = [sorted(ids.tolist()) for ids in grouped if len(ids) > 1]
+
+    addresses = pd.concat([known[['student_id', 'ip_address']], events[['student_id', 'ip_address']]])
+    counts = addresses.dropna().groupby('student_id')['ip_address'].nunique()
+    changed = counts[counts > 1].to_dict()
+    return clusters, changed
+
+
+def load_exam_frames(exam):
+    """
+    Load an exam's data for analysis.
+
+    Returns:
+        dict with 'sessions' (DataFrame), 'answers' (int8 matrix, rows
+        aligned with sessions), 'key' (int8 vector), 'events' (DataFrame)
+    """
+    from .anticheating_models import ExamSession, FocusLossEvent
+    from .versioning import exam_questions
+
+    questions = exam_questions(exam)
+    qnos = list(questions)
+    codes = {letter: index for index, letter in enumerate(OPTIONS, 1)}
+    key = np.array(
+        [codes.get((questions[q].get('answer') or '').upper().strip(), 0) for q in qnos],
+        dtype=np.int8,
+    )
+
+    rows = list(
+        ExamSession.objects.filter(exam=exam).values_list(
+            'student_id', 'student__username', 'ip_address', 'user_agent',
+            'started_at', 'submitted_at', 'answers',
+        )
+    )
+    sessions = pd.DataFrame(
+        [row[:6] for row in rows],
+        columns=['student_id', 'username', 'ip_address', 'user_agent', 'started_at', 'submitted_at'],
+    )
+    sessions['started_at'] = pd.to_datetime(sessions['started_at'], utc=True)
+    sessions['submitted_at'] = pd.to_datetime(sessions['submitted_at'], utc=True)
+    answers = encode_answers([row[6] or {} for row in rows], qnos) if rows else np.zeros((0, len(qnos)), np.int8)
+
+    events = pd.DataFrame(
+        list(FocusLossEvent.objects.filter(exam=exam).values_list('student_id', 'timestamp', 'ip_address')),
+        columns=['student_id', 'timestamp', 'ip_address'],
+    )
+    events['timestamp'] = pd.to_datetime(events['timestamp'], utc=True)
+
+    return {'sessions': sessions, 'answers': answers, 'key': key, 'events': events}
+
+
+def analyze_exam(exam, save=True):
+    """
+    Run every analysis for an exam and store the findings as alerts.
+
+    Returns:
+        dict: {'sessions', 'similar_pairs', 'timing', 'clusters', 'ip_changes', 'alerts'}
+    """
+    from .anticheating_models import ExamSecurityAlert
+
+    frames = load_exam_frames(exam)
+    sessions = frames['sessions']
+    student_ids = sessions['student_id'].to_numpy()
+    usernames = dict(zip(sessions['student_id'], sessions['username']))
+
+    alerts = []
+
+    def alert(student_id, level, message):
+        alerts.append(ExamSecurityAlert(
+            student_id=int(student_id), exam=exam, alert_type=ALERT_TYPE, level=level, message=message
+        ))
+
+    pairs = answer_similarity(frames['answers'], frames['key'])
+    for i, j, shared, fewer_wrong in pairs:
+        level = 'CRITICAL' if shared >= 2 * MIN_SHARED_WRONG and shared >= 0.95 * fewer_wrong else 'WARNING'
+        for me, other in ((i, j), (j, i)):
+            alert(student_ids[me], level, (
+                f"Answer similarity: {shared} of {fewer_wrong} wrong answers identical "
+                f"to {usernames[student_ids[other]]}"
+            ))
+
+    timing = timing_anomalies(frames['events'], sessions)
+    for student_id, messages in timing.items():
+        alert(student_id, 'WARNING', 'Timing: ' + '; '.join(messages))
+
+    clusters, changed = network_clusters(sessions, frames['events'])
+    for cluster in clusters:
+        names = ', '.join(usernames[sid] for sid in cluster)
+        for student_id in cluster:
+            alert(student_id, 'WARNING', f"Network: same IP address and browser as {names}")
+    for student_id, count in changed.items():
+        alert(student_id, 'WARNING', f"Network: {count} IP addresses used during the exam")
+
+    if save:
+        with transaction.atomic():
+            ExamSecurityAlert.objects.filter(exam=exam, alert_type=ALERT_TYPE, is_resolved=False).delete()
+            ExamSecurityAlert.objects.bulk_create(alerts, batch_size=500)
+
+    logger.info(
+        f"Post-exam analysis of {exam.name}: {len(sessions)} sessions, "
+        f"{len(pairs)} similar pairs, {len(alerts)} alerts"
+    )
+    return {
+        'sessions': len(sessions),
+        'similar_pairs': len(pairs),
+        'timing': len(timing),
+        'clusters': len(clusters),
+        'ip_changes': len(changed),
+        'alerts': len(alerts),
+    }
+
+
+def analyze_finished_exams(since_minutes, grace_minutes=5):
+    """
+    Analyse every exam that ended between `since_minutes` and
+    `grace_minutes` ago, once per exam. Returns the number analysed.
+    """
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.utils import timezone
+    from .models import Exam_Model
+
+    now = timezone.now()
+    exams = Exam_Model.objects.filter(
+        end_time__gt=now - timedelta(minutes=since_minutes),
+        end_time__lte=now - timedelta(minutes=grace_minutes),
+    )
+
+    analysed = 0
+    for exam in exams:
+        if not cache.add(f'exam_analyzed:{exam.id}', True, since_minutes * 60 * 2):
+            continue
+        try:
+            analyze_exam(exam)
+            analysed += 1
+        except Exception as e:
+            cache.delete(f'exam_analyzed:{exam.id}')
+            logger.error(f"Error analysing exam {exam.name}: {str(e)}")
+    return analysed
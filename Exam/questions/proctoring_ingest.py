@@ -0,0 +1,302 @@
+"""
+Proctoring Event Ingestion
+Buffered, batched ingestion of focus-loss telemetry.
+
+record_focus_loss requests append their event to an in-process ring buffer
+and answer from a cache counter straight away. A background worker drains
+the buffer every PROCTORING_FLUSH_SECONDS (or as soon as a batch fills):
+events are written with one bulk_create (user agents interned, see
+questions.proctoring_retention) and per-student counters are applied as
+atomic increments (questions.counters). Events of exams or students
+deleted in the meantime are skipped, and an event the database still
+rejects is dropped on its own (core.background_writer), so it cannot
+stall ingestion for the other exams. Professors hear about
+the events through the periodic digest (notifications.alert_digest). A busy
+exam therefore produces a steady write stream instead of one burst of
+queries per tab switch.
+
+Settings:
+    PROCTORING_BUFFER_SIZE   ring buffer capacity (oldest events drop when full)
+    PROCTORING_BATCH_SIZE    events that wake the worker early
+    PROCTORING_FLUSH_SECONDS max delay before buffered events hit the database
+    PROCTORING_INGEST_WORKER run the background worker (tests call flush())
+"""
+
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.background_writer import BackgroundWorker, write_isolating
+
+from .live_monitor import broker, publish_exam_event
+
+logger = logging.getLogger('app')
+
+FOCUS_STATE_CACHE_TIMEOUT = 60 * 60 * 6
+EXAM_WINDOW_CACHE_TIMEOUT = 60 * 5
+
+_buffer = deque(maxlen=getattr(settings, 'PROCTORING_BUFFER_SIZE', 50000))
+_flush_lock = threading.Lock()
+
+
+def exam_window(exam_id):
+    """
+    Cached {'end_time', 'name', 'professor_email'} for an exam, or None if it
+    does not exist. Saves an Exam_Model query on every telemetry request.
+    """
+    from .models import Exam_Model
+
+    key = f'exam_window:{exam_id}'
+    window = cache.get(key)
+    if window is None:
+        exam = Exam_Model.objects.filter(id=exam_id).select_related('professor').first()
+        if exam is None:
+            return None
+        window = {
+            'end_time': exam.end_time,
+            'name': exam.name,
+            'professor_email': exam.professor.email,
+        }
+        cache.set(key, window, EXAM_WINDOW_CACHE_TIMEOUT)
+    return window
+
+
+def _focus_key(student_id, exam_id):
+    return f'focus_count:{exam_id}:{student_id}'
+
+
+def _load_focus_count(student_id, exam_id):
+    """Seed the cache counter from the database the first time a student is seen."""
+    from .anticheating_models import ExamFocusLog
+
+    count = (
+        ExamFocusLog.objects.filter(student_id=student_id, exam_id=exam_id)
+        .values_list('focus_loss_count', flat=True)
+        .first()
+    ) or 0
+    cache.add(_focus_key(student_id, exam_id), count, FOCUS_STATE_CACHE_TIMEOUT)
+
+
+def focus_count(student_id, exam_id):
+    """Focus losses so far, including events the worker has not written yet."""
+    key = _focus_key(student_id, exam_id)
+    count = cache.get(key)
+    if count is None:
+        _load_focus_count(student_id, exam_id)
+        count = cache.get(key, 0)
+    return count
+
+
+def focus_state(student_id, exam_id):
+    """
+    Return (focus_loss_count, max_allowed). max_allowed is the count at which
+    the exam's proctoring policy auto-submits, by a rule or by its submit
+    score given the session's other events, None if it never does.
+    """
+    from .suspicion import policy_for_exam, session_counts
+
+    counts = session_counts(student_id, exam_id)
+    return counts['focus_loss'], policy_for_exam(exam_id).submit_limit('focus_loss', counts)
+
+
+def focus_warning(count, max_allowed):
+    """Warning shown to the student, naming the limit only when there is one."""
+    warning = f'Warning: You have switched tabs {count} time(s).'
+    if max_allowed is not None:
+        warning += f' Maximum allowed: {max_allowed}.'
+    return warning
+
+
+def _version_key(student_id, exam_id):
+    return f'focus_version:{exam_id}:{student_id}'
+
+
+def focus_version(student_id, exam_id):
+    """Version of a student's focus state; changes whenever the state does."""
+    return cache.get_or_set(_version_key(student_id, exam_id), 1, FOCUS_STATE_CACHE_TIMEOUT)
+
+
+def focus_etag(student_id, exam_id):
+    return f'"focus-{exam_id}-{student_id}-{focus_version(student_id, exam_id)}"'
+
+
+def focus_payload(student_id, exam_id):
+    """
+    The focus state pushed to (or polled by) the exam client: counts, risk
+    score, warning text and the auto-submit command from the policy verdict.
+    """
+    from .suspicion import assess
+
+    count, max_allowed = focus_state(student_id, exam_id)
+    verdict = assess(student_id, exam_id)
+    payload = {
+        'version': focus_version(student_id, exam_id),
+        'focus_loss_count': count,
+        'max_allowed': max_allowed,
+        'risk_score': verdict.score,
+        'exceeded': max_allowed is not None and count > max_allowed,
+    }
+    if count > 0 and 'warn' in verdict.actions:
+        payload['warning'] = focus_warning(count, max_allowed)
+    if 'submit' in verdict.actions:
+        payload['action'] = 'submit_immediately'
+    if payload['exceeded']:
+        payload['reason'] = f'Exceeded maximum focus losses ({max_allowed})'
+    return payload
+
+
+def focus_topic(student_id, exam_id):
+    return f'focus:{exam_id}:{student_id}'
+
+
+def publish_focus_state(student_id, exam_id):
+    """Bump the state version and push the new state to the student's exam page."""
+    key = _version_key(student_id, exam_id)
+    cache.add(key, 1, FOCUS_STATE_CACHE_TIMEOUT)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, FOCUS_STATE_CACHE_TIMEOUT)
+    topic = focus_topic(student_id, exam_id)
+    if broker.has_subscribers(topic):
+        broker.publish(topic, 'focus_state', focus_payload(student_id, exam_id))
+
+
+def event_types():
+    """The FocusLossEvent.event_type values the worker can store."""
+    from .anticheating_models import FocusLossEvent
+    return {value for value, _ in FocusLossEvent._meta.get_field('event_type').choices}
+
+
+def enqueue_focus_event(student_id, exam_id, event_type, browser_timestamp=None,
+                        ip_address=None, user_agent='', username=''):
+    """
+    Buffer one focus-loss event and return (focus_loss_count, max_allowed)
+    including it. The database is updated by the worker.
+    Raises ValueError for an unknown event_type.
+    """
+    if event_type not in event_types():
+        raise ValueError(f'Unknown focus-loss event type: {event_type!r}')
+    count_key = _focus_key(student_id, exam_id)
+    if cache.get(count_key) is None:
+        _load_focus_count(student_id, exam_id)
+    try:
+        count = cache.incr(count_key)
+    except ValueError:
+        # Evicted between the check and the increment
+        _load_focus_count(student_id, exam_id)
+        count = cache.incr(count_key)
+    _, max_allowed = focus_state(student_id, exam_id)
+
+    if isinstance(browser_timestamp, str):
+        browser_timestamp = parse_datetime(browser_timestamp)
+
+    _buffer.append({
+        'student_id': student_id,
+        'exam_id': exam_id,
+        'event_type': event_type,
+        'browser_timestamp': browser_timestamp,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'timestamp': timezone.now(),
+    })
+    _worker.ensure()
+    publish_exam_event(
+        exam_id, 'focus_loss',
+        student_id=student_id, student=username, event_type=event_type, count=count,
+    )
+    publish_focus_state(student_id, exam_id)
+    if len(_buffer) >= getattr(settings, 'PROCTORING_BATCH_SIZE', 500):
+        _worker.wake()
+    return count, max_allowed
+
+
+def _drain():
+    events = []
+    while True:
+        try:
+            events.append(_buffer.popleft())
+        except IndexError:
+            return events
+
+
+def flush():
+    """
+    Write every buffered event to the database. Returns the number written.
+    Called by the worker; safe to call directly (tests, shutdown).
+    """
+    with _flush_lock:
+        events = _drain()
+        if not events:
+            return 0
+        written = write_isolating(
+            events, _write, _requeue,
+            describe=lambda e: f"{e['event_type']} event of student {e['student_id']} in exam {e['exam_id']}",
+        )
+
+    logger.info(f"Ingested {written} focus-loss events")
+    return written
+
+
+def _requeue(events):
+    # Kept for the next flush rather than dropped
+    _buffer.extendleft(reversed(events))
+
+
+def _write(events):
+    from django.contrib.auth.models import User
+    from .anticheating_models import ExamFocusLog, FocusLossEvent, ExamSession, UserAgent, month_partition
+    from .models import Exam_Model
+
+    # Exams and students deleted since their events were buffered
+    exams = set(Exam_Model.objects.filter(id__in={e['exam_id'] for e in events}).values_list('id', flat=True))
+    students = set(User.objects.filter(id__in={e['student_id'] for e in events}).values_list('id', flat=True))
+    events = [e for e in events if e['exam_id'] in exams and e['student_id'] in students]
+
+    per_student = {}
+    for event in events:
+        key = (event['student_id'], event['exam_id'])
+        count, last = per_student.get(key, (0, None))
+        per_student[key] = (count + 1, max(last, event['timestamp']) if last else event['timestamp'])
+
+    agents = UserAgent.intern_many(e['user_agent'] for e in events)
+    FocusLossEvent.objects.bulk_create(
+        [
+            FocusLossEvent(
+                student_id=e['student_id'],
+                exam_id=e['exam_id'],
+                event_type=e['event_type'],
+                browser_timestamp=e['browser_timestamp'],
+                ip_address=e['ip_address'],
+                agent_id=agents.get(e['user_agent']),
+                partition=month_partition(e['timestamp']),
+            )
+            for e in events
+        ],
+        batch_size=1000,
+    )
+    limits = {key: focus_state(*key)[1] for key in per_student}
+    default_max = ExamFocusLog._meta.get_field('max_focus_losses').default
+    ExamFocusLog.objects.bulk_create(
+        [
+            ExamFocusLog(student_id=sid, exam_id=eid, max_focus_losses=limits[sid, eid] or default_max)
+            for sid, eid in per_student
+        ],
+        ignore_conflicts=True,
+    )
+    for (student_id, exam_id), (count, last) in per_student.items():
+        max_allowed = limits[student_id, exam_id]
+        ExamFocusLog.add_focus_losses(student_id, exam_id, count, at=last, max_allowed=max_allowed)
+        ExamSession.add_tab_switches(student_id, exam_id, count)
+    return len(events)
+
+
+_worker = BackgroundWorker(
+    'proctoring-ingest', flush, lambda: getattr(settings, 'PROCTORING_FLUSH_SECONDS', 1.0),
+    'PROCTORING_INGEST_WORKER',
+)
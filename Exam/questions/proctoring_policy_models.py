@@ -0,0 +1,65 @@
+"""
+Proctoring Policy Models
+Per-exam suspicion scoring rules, evaluated by questions.suspicion
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from .models import Exam_Model
+import logging
+
+logger = logging.getLogger('app')
+
+
+class ProctoringPolicy(models.Model):
+    """
+    Scoring rules for proctoring events.
+
+    The policy without an exam is the site default; an exam's own policy
+    replaces it. rules is a list of
+    {"event": "focus_loss" | "fullscreen_exit", "at": n, "weight": w, "action": "warn" | "alert" | "submit"}:
+    once the event's count reaches `at`, every further event adds `weight`
+    to the risk score and `action` applies. Score thresholds apply their
+    action to the consolidated score across all events.
+    """
+
+    exam = models.OneToOneField(
+        Exam_Model,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='proctoring_policy',
+        help_text="Leave empty for the site-wide default policy"
+    )
+    rules = models.JSONField(default=list)
+    warn_score = models.PositiveIntegerField(null=True, blank=True)
+    alert_score = models.PositiveIntegerField(null=True, blank=True)
+    submit_score = models.PositiveIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Proctoring Policy'
+        verbose_name_plural = 'Proctoring Policies'
+
+    def __str__(self):
+        return f"Proctoring policy: {self.exam.name if self.exam_id else 'default'}"
+
+    def clean(self):
+        from .suspicion import compile_policy
+        if self.exam_id is None and ProctoringPolicy.objects.filter(exam__isnull=True).exclude(pk=self.pk).exists():
+            raise ValidationError({'exam': 'A default policy already exists.'})
+        try:
+            compile_policy(self.rules, self.warn_score, self.alert_score, self.submit_score)
+        except ValueError as e:
+            raise ValidationError({'rules': str(e)})
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .suspicion import invalidate_policies
+        invalidate_policies()
+
+    def delete(self, *args, **kwargs):
+        from .suspicion import invalidate_policies
+        result = super().delete(*args, **kwargs)
+        invalidate_policies()
+        return result
@@ -0,0 +1,190 @@
+"""
+Proctoring Event Retention
+Append-only storage and roll-up of raw proctoring rows.
+
+FocusLossEvent and ExamSecurityAlert rows are only ever inserted. Each row
+carries a month partition key (YYYYMM) indexed together with its exam, so
+per-exam queries and retention work on narrow index ranges, and
+User-Agent strings are interned in the UserAgent table instead of being
+repeated on every event.
+
+Once a month falls outside PROCTORING_RETENTION_MONTHS, apply_retention()
+folds its rows into one ProctoringSummary per (student, exam) and deletes
+them, an exam at a time in its own transaction. Unresolved alerts are
+kept until someone resolves them. Run nightly by notifications.scheduler.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+logger = logging.getLogger('app')
+
+EVENT_COUNTERS = {
+    'TAB_SWITCH': 'tab_switches',
+    'WINDOW_BLUR': 'window_blurs',
+    'VISIBILITY': 'visibility_changes',
+}
+ALERT_COUNTERS = {
+    'WARNING': 'warning_alerts',
+    'CRITICAL': 'critical_alerts',
+    'BLOCKED': 'blocked_alerts',
+}
+
+
+def retention_cutoff(months, now=None):
+    """Partition key of the oldest month kept when keeping `months` months."""
+    from .anticheating_models import month_partition
+
+    current = month_partition(now)
+    index = (current // 100) * 12 + (current % 100 - 1) - (max(months, 1) - 1)
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def _expired(cutoff):
+    """(events, alerts) querysets of rows older than the cutoff partition."""
+    from .anticheating_models import ExamSecurityAlert, FocusLossEvent
+
+    return (
+        FocusLossEvent.objects.filter(partition__lt=cutoff),
+        ExamSecurityAlert.objects.filter(partition__lt=cutoff, is_resolved=True),
+    )
+
+
+def _totals(events, alerts):
+    """Aggregate expired rows into {student_id: totals} for ProctoringSummary.add."""
+    totals = defaultdict(dict)
+
+    event_rows = events.values('student_id').annotate(
+        first=Min('timestamp'),
+        last=Max('timestamp'),
+        through=Max('partition'),
+        **{field: Count('id', filter=Q(event_type=kind)) for kind, field in EVENT_COUNTERS.items()},
+    )
+    alert_rows = alerts.values('student_id').annotate(
+        first=Min('created_at'),
+        last=Max('created_at'),
+        through=Max('partition'),
+        **{field: Count('id', filter=Q(level=level)) for level, field in ALERT_COUNTERS.items()},
+    )
+
+    for row in list(event_rows) + list(alert_rows):
+        entry = totals[row.pop('student_id')]
+        for key, value in row.items():
+            if key == 'first':
+                entry[key] = min(entry.get(key) or value, value)
+            elif key in ('last', 'through'):
+                entry[key] = max(entry.get(key) or value, value)
+            else:
+                entry[key] = entry.get(key, 0) + value
+    return totals
+
+
+def roll_up_exam(exam_id, cutoff):
+    """
+    Fold one exam's expired rows into its summaries and delete them.
+
+    Returns (events_deleted, alerts_deleted).
+    """
+    from .anticheating_models import ProctoringSummary
+
+    with transaction.atomic():
+        events, alerts = _expired(cutoff)
+        events = events.filter(exam_id=exam_id)
+        alerts = alerts.filter(exam_id=exam_id)
+
+        totals = _totals(events, alerts)
+        if not totals:
+            return 0, 0
+
+        existing = {
+            summary.student_id: summary
+            for summary in ProctoringSummary.objects.select_for_update().filter(
+                exam_id=exam_id, student_id__in=list(totals)
+            )
+        }
+        new = []
+        for student_id, entry in totals.items():
+            summary = existing.get(student_id)
+            if summary is None:
+                summary = ProctoringSummary(student_id=student_id, exam_id=exam_id)
+                new.append(summary)
+            summary.add(entry)
+
+        now = timezone.now()
+        for summary in existing.values():
+            summary.updated_at = now
+        ProctoringSummary.objects.bulk_update(
+            existing.values(),
+            ['tab_switches', 'window_blurs', 'visibility_changes', 'warning_alerts',
+             'critical_alerts', 'blocked_alerts', 'first_event_at', 'last_event_at',
+             'rolled_up_through', 'updated_at'],
+        )
+        ProctoringSummary.objects.bulk_create(new)
+
+        events_deleted, _ = events.delete()
+        alerts_deleted, _ = alerts.delete()
+    return events_deleted, alerts_deleted
+
+
+def purge_unused_user_agents():
+    """
+    Delete interned User-Agent strings no event refers to any more.
+
+    Rows go before their cache entries: clearing the cache first would let
+    a concurrent UserAgent.intern_many() cache the id of a row that is
+    then deleted, and later events would point at a missing agent.
+    """
+    from .anticheating_models import FocusLossEvent, UserAgent
+
+    unused = UserAgent.objects.filter(
+        ~Exists(FocusLossEvent.objects.filter(agent_id=OuterRef('pk')))
+    )
+    digests = list(unused.values_list('digest', flat=True))
+    if not digests:
+        return 0
+    deleted, _ = UserAgent.objects.filter(digest__in=digests).filter(
+        ~Exists(FocusLossEvent.objects.filter(agent_id=OuterRef('pk')))
+    ).delete()
+    cache.delete_many([UserAgent.cache_key(d) for d in digests])
+    return deleted
+
+
+def apply_retention(months=None, now=None):
+    """
+    Roll up and purge every raw proctoring row older than `months` months
+    (PROCTORING_RETENTION_MONTHS by default).
+
+    Returns:
+        dict: {'cutoff', 'exams', 'events', 'alerts', 'user_agents'}
+    """
+    months = months or getattr(settings, 'PROCTORING_RETENTION_MONTHS', 12)
+    cutoff = retention_cutoff(months, now)
+
+    events, alerts = _expired(cutoff)
+    exam_ids = set(events.values_list('exam_id', flat=True).distinct())
+    exam_ids.update(alerts.values_list('exam_id', flat=True).distinct())
+
+    result = {'cutoff': cutoff, 'exams': 0, 'events': 0, 'alerts': 0, 'user_agents': 0}
+    for exam_id in sorted(exam_ids):
+        try:
+            events_deleted, alerts_deleted = roll_up_exam(exam_id, cutoff)
+        except Exception as e:
+            logger.error(f"Error rolling up proctoring events for exam {exam_id}: {str(e)}")
+            continue
+        result['exams'] += 1
+        result['events'] += events_deleted
+        result['alerts'] += alerts_deleted
+
+    result['user_agents'] = purge_unused_user_agents()
+    if result['exams']:
+        logger.info(
+            f"Rolled up proctoring data before {cutoff} for {result['exams']} exam(s): "
+            f"{result['events']} events, {result['alerts']} alerts purged"
+        )
+    return result
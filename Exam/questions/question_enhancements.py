@@ -54,26 +54,38 @@ class QuestionTag(models.Model):
 
 
 class QuestionVersion(models.Model):
-    """Tracks versions of questions for revision history."""
-    
-    question = models.OneToOneField('questions.Question_DB', on_delete=models.CASCADE, related_name='version')
-    version_number = models.IntegerField(default=1)
-    question_text = models.CharField(max_length=100)
-    optionA = models.CharField(max_length=100)
-    optionB = models.CharField(max_length=100)
-    optionC = models.CharField(max_length=100)
-    optionD = models.CharField(max_length=100)
-    answer = models.CharField(max_length=200)
-    max_marks = models.IntegerField(default=1)
-    modified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    """
+    Copy-on-write revision history for Question_DB rows.
+
+    Every SNAPSHOT_INTERVAL-th revision stores the full question state in
+    ``data``; the revisions in between store only the fields that changed
+    since the previous revision. See questions.versioning for the writer
+    and the reconstruction helpers.
+    """
+
+    SNAPSHOT_INTERVAL = 10
+
+    # No FK constraint and DO_NOTHING: history must outlive the question so
+    # exams that pinned a version can still be graded after it is deleted.
+    question = models.ForeignKey(
+        'questions.Question_DB',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='versions'
+    )
+    version_number = models.PositiveIntegerField()
+    is_snapshot = models.BooleanField(default=False)
+    data = models.JSONField(default=dict)
+    modified_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     modified_at = models.DateTimeField(auto_now_add=True)
     change_description = models.TextField(blank=True)
-    
+
     class Meta:
-        ordering = ['-modified_at']
-    
+        ordering = ['-version_number']
+        unique_together = ('question', 'version_number')
+
     def __str__(self):
-        return f"Question {self.question.qno} - v{self.version_number}"
+        return f"Question {self.question_id} - v{self.version_number}"
 
 
 class QuestionStatistics(models.Model):
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.forms import ModelForm
 from django.contrib.auth.models import User
 from django import forms
@@ -41,6 +41,18 @@ class Question_DB(models.Model):
             models.Index(fields=['created_at']),
         ]
 
+    def save(self, *args, **kwargs):
+        # Record the revision in the same transaction as the edit. Stu_Question
+        # inherits from this model but its per-student copies are not versioned.
+        if type(self) is not Question_DB:
+            return super().save(*args, **kwargs)
+
+        from .versioning import record_version
+        created = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            record_version(self, created=created)
+
     def __str__(self):
         return f'Question No.{self.qno}: {self.question} \t\t Options: \nA. {self.optionA} \nB.{self.optionB} \nC.{self.optionC} \nD.{self.optionD} '
 
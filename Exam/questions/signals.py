@@ -0,0 +1,64 @@
+"""
+Signal handlers for the questions app: keep exam caches and sessions in
+step with edits made through any path (views, the API, the admin,
+queryset deletes).
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .exam_assignment_models import ExamAssignment
+from .models import Exam_Model
+
+
+@receiver(pre_save, sender=Exam_Model)
+def remember_exam_times(sender, instance, raw=False, **kwargs):
+    """Note the stored start/end time, to tell in post_save whether they changed."""
+    if raw or instance.pk is None:
+        instance._stored_times = None
+        return
+    instance._stored_times = (
+        Exam_Model.objects.filter(pk=instance.pk).values_list('start_time', 'end_time').first()
+    )
+
+
+@receiver(post_save, sender=Exam_Model)
+def reschedule_exam(sender, instance, created, raw=False, **kwargs):
+    """
+    When an exam's times change, move the deadline of its unfinished
+    sessions that followed the old end_time and drop every cached window
+    (questions.exam_clock, questions.proctoring_ingest.exam_window).
+    """
+    stored = getattr(instance, '_stored_times', None)
+    if raw or created or stored is None or stored == (instance.start_time, instance.end_time):
+        return
+
+    from django.core.cache import cache
+    from django.db.models import Q
+    from . import exam_clock
+    from .anticheating_models import ExamSession
+
+    _, old_end_time = stored
+    if old_end_time != instance.end_time:
+        ExamSession.objects.filter(
+            Q(ends_at=old_end_time) | Q(ends_at__isnull=True), exam=instance, is_submitted=False,
+        ).update(ends_at=instance.end_time)
+    exam_clock.invalidate_exam(instance.pk)
+    cache.delete(f'exam_window:{instance.pk}')
+
+
+@receiver(post_delete, sender=Exam_Model)
+def forget_exam(sender, instance, **kwargs):
+    from django.core.cache import cache
+    from . import exam_clock
+
+    exam_clock.invalidate_exam(instance.pk)
+    cache.delete(f'exam_window:{instance.pk}')
+
+
+@receiver(post_save, sender=ExamAssignment)
+@receiver(post_delete, sender=ExamAssignment)
+def assignment_changed(sender, instance, **kwargs):
+    """Drop the exam's eligibility cache, whichever path changed the assignment."""
+    from .eligibility import invalidate
+    invalidate(instance.exam_id)
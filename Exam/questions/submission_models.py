@@ -0,0 +1,56 @@
+"""
+Submission Queue Models
+Exam submissions accepted at the deadline and graded asynchronously.
+"""
+
+from django.db import models
+from django.contrib.auth.models import User
+from .models import Exam_Model
+import logging
+
+logger = logging.getLogger('app')
+
+
+class ExamSubmission(models.Model):
+    """
+    One accepted exam submission, written in a single insert when the
+    student submits and graded later by questions.submission_queue.
+    """
+
+    PENDING = 'PENDING'
+    PROCESSING = 'PROCESSING'
+    GRADED = 'GRADED'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (GRADED, 'Graded'),
+        (FAILED, 'Failed'),
+    ]
+
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exam_submissions')
+    exam = models.ForeignKey(Exam_Model, on_delete=models.CASCADE, related_name='submissions')
+    answers = models.JSONField(default=dict, blank=True)  # {qno: 'A'}
+    received_at = models.DateTimeField()  # Server-side stamp checked against the deadline
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    score = models.IntegerField(null=True, blank=True)
+    graded_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('student', 'exam')
+        ordering = ['received_at']
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+            models.Index(fields=['claim_token']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.exam.name} ({self.status})"
+
+    @property
+    def is_pending(self):
+        return self.status in (self.PENDING, self.PROCESSING)
@@ -0,0 +1,261 @@
+"""
+Submission Queue
+Accept-then-grade pipeline for exam submissions.
+
+A submission stamped before the student's deadline plus
+EXAM_SUBMISSION_GRACE_SECONDS is written as one ExamSubmission insert and
+acknowledged straight away, so the last-second rush is never lost to
+requests queueing behind each other. A pool of grading threads claims
+pending submissions in batches and grades each batch with bulk writes:
+StuExam_DB scores, results links, session answers and the suspicion
+alerts. The scheduler sweeps the queue too, so submissions accepted by a
+process that died are still graded. Students see their result once the
+submission is graded.
+
+Settings:
+    EXAM_SUBMISSION_GRACE_SECONDS  accepted lateness for in-flight submissions
+    SUBMISSION_GRADING_BATCH_SIZE  submissions claimed per batch
+    SUBMISSION_GRADING_WORKERS     grading threads per process (0 = scheduler only)
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.background_writer import BackgroundWorker
+
+logger = logging.getLogger('app')
+
+MAX_ATTEMPTS = 3
+STALE_CLAIM_MINUTES = 5
+WORKER_POLL_SECONDS = 5
+
+
+def grace_seconds():
+    return getattr(settings, 'EXAM_SUBMISSION_GRACE_SECONDS', 30)
+
+
+def enqueue_submission(session, answers, received_at=None):
+    """
+    Record a submission for grading with a single insert. A repeated
+    submission for the same session is ignored, the first one wins,
+    unless grading the first one failed for good: then the new answers
+    replace it and go back to the queue.
+    """
+    from .submission_models import ExamSubmission
+
+    received_at = received_at or timezone.now()
+    ExamSubmission.objects.bulk_create(
+        [ExamSubmission(
+            student_id=session.student_id,
+            exam_id=session.exam_id,
+            answers=answers,
+            received_at=received_at,
+        )],
+        ignore_conflicts=True,
+    )
+    ExamSubmission.objects.filter(
+        student_id=session.student_id, exam_id=session.exam_id, status=ExamSubmission.FAILED,
+    ).update(
+        status=ExamSubmission.PENDING, answers=answers, received_at=received_at,
+        attempts=0, claim_token='', error='',
+    )
+    _workers.ensure()
+    _workers.wake()
+
+
+def pending_submission(student_id, exam_id):
+    """The student's submission while it waits for grading, else None."""
+    from .submission_models import ExamSubmission
+
+    return ExamSubmission.objects.filter(
+        student_id=student_id, exam_id=exam_id,
+        status__in=[ExamSubmission.PENDING, ExamSubmission.PROCESSING],
+    ).first()
+
+
+def claim_batch(size):
+    """
+    Claim up to `size` pending submissions for this worker. The claim is a
+    conditional UPDATE, so concurrent workers never grade the same row.
+    """
+    from .submission_models import ExamSubmission
+
+    ids = list(
+        ExamSubmission.objects.filter(status=ExamSubmission.PENDING)
+        .order_by('received_at').values_list('id', flat=True)[:size]
+    )
+    if not ids:
+        return []
+
+    token = uuid.uuid4().hex
+    ExamSubmission.objects.filter(id__in=ids, status=ExamSubmission.PENDING).update(
+        status=ExamSubmission.PROCESSING, claim_token=token, claimed_at=timezone.now()
+    )
+    return list(
+        ExamSubmission.objects.filter(claim_token=token, status=ExamSubmission.PROCESSING)
+        .select_related('exam__question_paper')
+    )
+
+
+def _grade_exam(exam, submissions, now):
+    """Grade one exam's submissions with bulk writes. Caller holds a transaction."""
+    from student.models import StuExam_DB, StuResults_DB
+    from .anticheating_models import ExamSecurityAlert, ExamSession
+    from .suspicion import policy_for_exam
+    from .versioning import exam_questions, grade_answers
+
+    pinned = exam_questions(exam)
+    student_ids = [s.student_id for s in submissions]
+
+    stu_exams = {}
+    for stu_exam in StuExam_DB.objects.filter(
+        student_id__in=student_ids, examname=exam.name, qpaper=exam.question_paper
+    ).order_by('-id'):
+        stu_exams.setdefault(stu_exam.student_id, stu_exam)
+    StuExam_DB.objects.bulk_create([
+        StuExam_DB(student_id=sid, examname=exam.name, qpaper=exam.question_paper)
+        for sid in student_ids if sid not in stu_exams
+    ])
+    if len(stu_exams) < len(student_ids):
+        for stu_exam in StuExam_DB.objects.filter(
+            student_id__in=[sid for sid in student_ids if sid not in stu_exams],
+            examname=exam.name, qpaper=exam.question_paper,
+        ):
+            stu_exams.setdefault(stu_exam.student_id, stu_exam)
+
+    sessions = {
+        session.student_id: session
+        for session in ExamSession.objects.filter(exam=exam, student_id__in=student_ids)
+    }
+    policy = policy_for_exam(exam.id)
+    alerts = []
+
+    for submission in submissions:
+        submission.score = grade_answers(pinned, submission.answers)
+        submission.status = submission.GRADED
+        submission.graded_at = now
+        submission.error = ''
+
+        stu_exam = stu_exams[submission.student_id]
+        stu_exam.score = submission.score
+        stu_exam.completed = 1
+
+        session = sessions.get(submission.student_id)
+        if session is None:
+            continue
+        session.answers = submission.answers
+        session.is_submitted = True
+        session.submitted_at = session.submitted_at or submission.received_at
+
+        # Flag if the proctoring policy considers the session suspicious
+        verdict = policy.evaluate({
+            'focus_loss': session.tab_switch_count,
+            'fullscreen_exit': session.fullscreen_exit_count,
+        })
+        if verdict.actions & {'alert', 'submit'}:
+            alerts.append(ExamSecurityAlert(
+                student_id=submission.student_id,
+                exam=exam,
+                alert_type='AUTO_SUBMIT_SUSPICION',
+                level='CRITICAL',
+                message='Tab switches: {}, fullscreen exits: {}, risk score: {}'.format(
+                    session.tab_switch_count, session.fullscreen_exit_count, verdict.score
+                ),
+            ))
+
+    StuExam_DB.objects.bulk_update(stu_exams.values(), ['score', 'completed'])
+    ExamSession.objects.bulk_update(sessions.values(), ['answers', 'is_submitted', 'submitted_at'])
+    ExamSecurityAlert.objects.bulk_create(alerts)
+
+    results = {r.student_id: r for r in StuResults_DB.objects.filter(student_id__in=student_ids)}
+    StuResults_DB.objects.bulk_create([
+        StuResults_DB(student_id=sid) for sid in set(student_ids) if sid not in results
+    ])
+    results.update({
+        r.student_id: r for r in StuResults_DB.objects.filter(student_id__in=student_ids)
+    })
+    Through = StuResults_DB.exams.through
+    Through.objects.bulk_create(
+        [
+            Through(sturesults_db_id=results[sid].id, stuexam_db_id=stu_exams[sid].id)
+            for sid in set(student_ids)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def grade_batch(submissions):
+    """
+    Grade claimed submissions, one transaction per exam. A failing exam's
+    submissions go back to the queue until MAX_ATTEMPTS.
+
+    Returns the number graded.
+    """
+    from .live_monitor import publish_exam_event
+    from .submission_models import ExamSubmission
+
+    by_exam = defaultdict(list)
+    for submission in submissions:
+        by_exam[submission.exam_id].append(submission)
+
+    graded = 0
+    now = timezone.now()
+    for exam_submissions in by_exam.values():
+        exam = exam_submissions[0].exam
+        try:
+            with transaction.atomic():
+                _grade_exam(exam, exam_submissions, now)
+                ExamSubmission.objects.bulk_update(
+                    exam_submissions, ['score', 'status', 'graded_at', 'error']
+                )
+        except Exception as e:
+            logger.error(f"Error grading {len(exam_submissions)} submission(s) for {exam.name}: {str(e)}")
+            for submission in exam_submissions:
+                submission.attempts += 1
+                submission.status = (
+                    ExamSubmission.FAILED if submission.attempts >= MAX_ATTEMPTS else ExamSubmission.PENDING
+                )
+                submission.error = str(e)
+            ExamSubmission.objects.bulk_update(exam_submissions, ['attempts', 'status', 'error'])
+            continue
+
+        graded += len(exam_submissions)
+        for submission in exam_submissions:
+            publish_exam_event(exam.id, 'session_submitted', student_id=submission.student_id)
+
+    return graded
+
+
+def requeue_stale_claims(minutes=STALE_CLAIM_MINUTES):
+    """Return submissions claimed by a worker that never finished to the queue."""
+    from .submission_models import ExamSubmission
+
+    return ExamSubmission.objects.filter(
+        status=ExamSubmission.PROCESSING,
+        claimed_at__lt=timezone.now() - timedelta(minutes=minutes),
+    ).update(status=ExamSubmission.PENDING, claim_token='')
+
+
+def process_pending(batch_size=None):
+    """Grade everything pending, batch by batch. Returns the number graded."""
+    batch_size = batch_size or getattr(settings, 'SUBMISSION_GRADING_BATCH_SIZE', 200)
+    graded = 0
+    while True:
+        batch = claim_batch(batch_size)
+        if not batch:
+            break
+        graded += grade_batch(batch)
+    if graded:
+        logger.info(f"Graded {graded} queued submission(s)")
+    return graded
+
+
+_workers = BackgroundWorker(
+    'submission-grader', process_pending, WORKER_POLL_SECONDS, 'SUBMISSION_GRADING_WORKERS', default=2,
+)
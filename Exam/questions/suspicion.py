@@ -0,0 +1,221 @@
+"""
+Suspicion Scoring
+Rule-based risk scoring for proctoring events.
+
+An exam's ProctoringPolicy (else the site default policy, else
+DEFAULT_RULES) is compiled once into per-event rule tuples and cached
+until a policy changes. Events are scored from the session's event
+counts, which live in the cache next to the ingestion counters, so
+assessing an event is O(rules) with no database work. The verdict carries
+one consolidated risk score and the actions that apply: warn, alert or
+submit.
+"""
+
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger('app')
+
+EVENTS = ('focus_loss', 'fullscreen_exit')
+ACTIONS = ('warn', 'alert', 'submit')
+
+# Used while no ProctoringPolicy is stored; matches the historical limits
+DEFAULT_RULES = [
+    {'event': 'focus_loss', 'at': 1, 'weight': 10, 'action': 'warn'},
+    {'event': 'focus_loss', 'at': 5, 'action': 'alert'},
+    {'event': 'focus_loss', 'at': 5, 'action': 'submit'},
+    {'event': 'fullscreen_exit', 'at': 1, 'weight': 15},
+    {'event': 'fullscreen_exit', 'at': 3, 'action': 'alert'},
+]
+DEFAULT_SCORES = {'warn_score': None, 'alert_score': 60, 'submit_score': None}
+
+POLICY_CACHE_TIMEOUT = 60 * 10
+COUNT_CACHE_TIMEOUT = 60 * 60 * 6
+GENERATION_KEY = 'proctoring_policy:generation'
+
+
+class Verdict:
+    """Outcome of scoring a session: score, applicable actions and those newly crossed."""
+
+    __slots__ = ('score', 'actions', 'crossed')
+
+    def __init__(self, score, actions, crossed):
+        self.score = score
+        self.actions = actions
+        self.crossed = crossed
+
+    def __repr__(self):
+        return f"Verdict(score={self.score}, actions={sorted(self.actions)}, crossed={sorted(self.crossed)})"
+
+
+class CompiledPolicy:
+    """Rules grouped by event as (at, weight, action) tuples, plus score thresholds."""
+
+    def __init__(self, rules, thresholds):
+        self.rules = rules
+        self.thresholds = thresholds
+
+    def limit(self, event, action):
+        """Smallest count of event at which a rule applies action, or None."""
+        counts = [at for at, _, rule_action in self.rules.get(event, ()) if rule_action == action]
+        return min(counts) if counts else None
+
+    def submit_limit(self, event, counts=None):
+        """
+        Smallest count of event at which the policy submits, through a rule
+        or through submit_score with the other events at `counts`. None if
+        it never does.
+        """
+        counts = dict(counts or {})
+
+        def submits(count):
+            counts[event] = count
+            return 'submit' in self._actions(counts)[1]
+
+        high = self.limit(event, 'submit')
+        if high is None:
+            weighted = any(weight for _, weight, _ in self.rules.get(event, ()))
+            if not weighted or not any(action == 'submit' for _, action in self.thresholds):
+                return None
+            # Weights are non-negative, so the score only grows with the count
+            high = 1
+            while not submits(high):
+                high *= 2
+        low = 1
+        while low < high:
+            middle = (low + high) // 2
+            if submits(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return high
+
+    def _actions(self, counts):
+        score = 0
+        actions = set()
+        for event, rules in self.rules.items():
+            count = counts.get(event, 0)
+            for at, weight, action in rules:
+                if count >= at:
+                    score += weight * (count - at + 1)
+                    if action:
+                        actions.add(action)
+        for threshold, action in self.thresholds:
+            if score >= threshold:
+                actions.add(action)
+        return score, actions
+
+    def evaluate(self, counts, event=None):
+        """
+        Score counts ({event: count}). With event, `crossed` holds the
+        actions that the latest occurrence of that event newly triggered.
+        """
+        score, actions = self._actions(counts)
+        crossed = actions
+        if event and counts.get(event):
+            _, before = self._actions(dict(counts, **{event: counts[event] - 1}))
+            crossed = actions - before
+        return Verdict(score, frozenset(actions), frozenset(crossed))
+
+
+def compile_policy(rules, warn_score=None, alert_score=None, submit_score=None):
+    """Validate and compile policy rules. Raises ValueError on a bad rule."""
+    if not isinstance(rules, list):
+        raise ValueError('Rules must be a list.')
+
+    compiled = {}
+    for index, rule in enumerate(rules, 1):
+        if not isinstance(rule, dict):
+            raise ValueError(f'Rule {index} must be an object.')
+        event = rule.get('event')
+        action = rule.get('action') or None
+        at = rule.get('at', 1)
+        weight = rule.get('weight', 0)
+        if event not in EVENTS:
+            raise ValueError(f"Rule {index}: event must be one of {', '.join(EVENTS)}.")
+        if action is not None and action not in ACTIONS:
+            raise ValueError(f"Rule {index}: action must be one of {', '.join(ACTIONS)}.")
+        if not isinstance(at, int) or at < 1:
+            raise ValueError(f'Rule {index}: "at" must be a positive integer.')
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f'Rule {index}: weight must be a non-negative number.')
+        compiled.setdefault(event, []).append((at, weight, action))
+
+    thresholds = tuple(
+        (score, action)
+        for score, action in ((warn_score, 'warn'), (alert_score, 'alert'), (submit_score, 'submit'))
+        if score is not None
+    )
+    return CompiledPolicy({event: tuple(sorted(r)) for event, r in compiled.items()}, thresholds)
+
+
+def invalidate_policies():
+    """Drop every compiled policy; called when a ProctoringPolicy changes."""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def policy_for_exam(exam_id):
+    """Compiled policy for an exam, cached until a policy changes."""
+    from .proctoring_policy_models import ProctoringPolicy
+
+    # A fresh generation also covers the key being evicted
+    generation = cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+    key = f'proctoring_policy:{generation}:{exam_id}'
+    policy = cache.get(key)
+    if policy is None:
+        rows = list(
+            ProctoringPolicy.objects.filter(exam_id=exam_id).values()
+        ) or list(
+            ProctoringPolicy.objects.filter(exam__isnull=True).order_by('-updated_at').values()[:1]
+        )
+        source = rows[0] if rows else dict(DEFAULT_SCORES, rules=DEFAULT_RULES)
+        try:
+            policy = compile_policy(
+                source['rules'], source['warn_score'], source['alert_score'], source['submit_score']
+            )
+        except ValueError as e:
+            logger.error(f"Invalid proctoring policy for exam {exam_id}, using defaults: {str(e)}")
+            policy = compile_policy(DEFAULT_RULES, **DEFAULT_SCORES)
+        cache.set(key, policy, POLICY_CACHE_TIMEOUT)
+    return policy
+
+
+def _fullscreen_key(student_id, exam_id):
+    return f'fullscreen_count:{exam_id}:{student_id}'
+
+
+def session_counts(student_id, exam_id, **known):
+    """
+    {event: count} for a student's exam session. Counts passed in `known`
+    are the caller's fresh values and are kept for later events.
+    """
+    from .proctoring_ingest import focus_count
+
+    key = _fullscreen_key(student_id, exam_id)
+    if 'fullscreen_exit' in known:
+        cache.set(key, known['fullscreen_exit'], COUNT_CACHE_TIMEOUT)
+    else:
+        fullscreen = cache.get(key)
+        if fullscreen is None:
+            from .anticheating_models import ExamSession
+            fullscreen = ExamSession.objects.filter(student_id=student_id, exam_id=exam_id).values_list(
+                'fullscreen_exit_count', flat=True
+            ).first() or 0
+            cache.add(key, fullscreen, COUNT_CACHE_TIMEOUT)
+        known['fullscreen_exit'] = fullscreen
+
+    if 'focus_loss' not in known:
+        known['focus_loss'] = focus_count(student_id, exam_id)
+    return known
+
+
+def assess(student_id, exam_id, event=None, count=None):
+    """
+    Score a student's session, optionally right after `event` brought its
+    count to `count`. Returns a Verdict.
+    """
+    known = {event: count} if event and count is not None else {}
+    counts = session_counts(student_id, exam_id, **known)
+    return policy_for_exam(exam_id).evaluate(counts, event)
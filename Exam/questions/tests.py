@@ -1,3 +1,949 @@
-from django.test import TestCase
+"""
+Test suite for the questions app.
+"""
 
-# Create your tests here.
+from unittest import mock
+
+import asyncio
+import threading
+from datetime import timedelta
+
+import numpy as np
+
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import Group, User
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+from questions.models import Exam_Model
+from questions.question_models import Question_DB
+from questions.questionpaper_models import Question_Paper
+from questions.question_enhancements import QuestionVersion
+from questions import eligibility, paper_cache, permutations, versioning
+from questions.exam_assignment_models import ExamAssignment
+from questions.proctoring_policy_models import ProctoringPolicy
+from questions.exam_warmup import warm_up_exam, warm_up_upcoming_exams
+from questions.anticheating_models import ExamFocusLog, FocusLossEvent
+from questions import counters, exam_clock, live_monitor, post_exam_analysis, proctoring_ingest, proctoring_retention, suspicion
+from questions.anticheating_models import ExamSecurityAlert, ExamSession, ProctoringSummary, UserAgent
+from questions.exam_generator import ExamGenerator, generate_exam_sessions
+from questions.submission_models import ExamSubmission
+from questions import submission_queue
+from student.models import StuExam_DB, StuResults_DB
+
+
+def make_question(professor, **overrides):
+    fields = {
+        'professor': professor,
+        'question': 'What is 2 + 2?',
+        'optionA': '3',
+        'optionB': '4',
+        'optionC': '5',
+        'optionD': '6',
+        'answer': 'B',
+        'max_marks': 2,
+    }
+    fields.update(overrides)
+    return Question_DB.objects.create(**fields)
+
+
+class QuestionVersioningTests(TestCase):
+    """Test copy-on-write question revisions and exam pinning."""
+
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.question = make_question(self.professor)
+
+    def test_create_writes_snapshot(self):
+        """Test that creating a question writes a first, full snapshot."""
+        version = QuestionVersion.objects.get(question_id=self.question.qno)
+        self.assertEqual(version.version_number, 1)
+        self.assertTrue(version.is_snapshot)
+        self.assertEqual(version.data['question'], 'What is 2 + 2?')
+
+    def test_edit_writes_diff_only(self):
+        """Test that an edit stores only the changed fields."""
+        self.question.optionC = '22'
+        self.question.save()
+
+        version = QuestionVersion.objects.get(question_id=self.question.qno, version_number=2)
+        self.assertFalse(version.is_snapshot)
+        self.assertEqual(version.data, {'optionC': '22'})
+
+    def test_unchanged_save_writes_nothing(self):
+        """Test that saving without changes does not add a revision."""
+        self.question.save()
+        self.assertEqual(QuestionVersion.objects.filter(question_id=self.question.qno).count(), 1)
+
+    def test_rebuild_across_snapshot_interval(self):
+        """Test that any revision can be rebuilt across snapshot boundaries."""
+        interval = QuestionVersion.SNAPSHOT_INTERVAL
+        for i in range(interval + 2):
+            self.question.question = f'Revision {i + 2}'
+            self.question.save()
+
+        number, state = versioning.latest_state(self.question.qno)
+        self.assertEqual(number, interval + 3)
+        self.assertEqual(state['question'], f'Revision {interval + 3}')
+        self.assertTrue(
+            QuestionVersion.objects.get(question_id=self.question.qno, version_number=interval + 1).is_snapshot
+        )
+
+        states = versioning.load_versions({self.question.qno: 4})
+        self.assertEqual(states[self.question.qno]['question'], 'Revision 4')
+        self.assertEqual(states[self.question.qno]['answer'], 'B')
+
+    def test_exam_reads_pinned_version(self):
+        """Test that an exam keeps grading against the version it was published with."""
+        paper = Question_Paper.objects.create(professor=self.professor, qPaperTitle='Paper', total_marks=2)
+        paper.questions.add(self.question)
+        exam = Exam_Model.objects.create(professor=self.professor, name='Maths', question_paper=paper)
+        exam.pin_question_versions()
+
+        self.question.answer = 'C'
+        self.question.save()
+
+        questions = versioning.exam_questions(exam)
+        self.assertEqual(questions[self.question.qno]['answer'], 'B')
+        self.assertEqual(versioning.grade_answers(questions, {str(self.question.qno): 'b'}), 2)
+        self.assertEqual(versioning.grade_answers(questions, {str(self.question.qno): 'C'}), 0)
+
+    def test_history_survives_question_delete(self):
+        """Test that revisions outlive the deleted question."""
+        qno = self.question.qno
+        self.question.delete()
+        self.assertTrue(QuestionVersion.objects.filter(question_id=qno).exists())
+
+    def test_concurrent_edit_gets_the_next_number(self):
+        """Test that a version number taken by a concurrent edit is reallocated."""
+        real_latest_state = versioning.latest_state
+        stale = real_latest_state(self.question.qno)
+        QuestionVersion.objects.create(
+            question_id=self.question.qno, version_number=2, data={'optionD': '7'}, modified_by=self.professor,
+        )
+        self.question.optionA = '33'
+        with mock.patch.object(versioning, 'latest_state', side_effect=[stale, real_latest_state(self.question.qno)]):
+            self.question.save()
+        # Diffed against the concurrent revision, not the stale one
+        version = QuestionVersion.objects.get(question_id=self.question.qno, version_number=3)
+        self.assertEqual(version.data, {'optionA': '33', 'optionD': '6'})
+
+    def test_result_answers_are_loaded_per_list(self):
+        """Test that results read answers in constant queries, falling back to Stu_Question copies."""
+        from api.serializers import ExamResultSerializer
+        from student.models import Stu_Question
+
+        paper = Question_Paper.objects.create(professor=self.professor, qPaperTitle='Paper', total_marks=2)
+        paper.questions.add(self.question)
+        exam = Exam_Model.objects.create(professor=self.professor, name='Maths', question_paper=paper)
+        exam.pin_question_versions()
+        results = []
+        for n in range(3):
+            student = User.objects.create_user(username=f'stud{n}', password='TestPass123@')
+            ExamSession.objects.create(student=student, exam=exam, answers={str(self.question.qno): 'B'})
+            results.append(StuExam_DB.objects.create(student=student, examname='Maths', qpaper=paper, completed=1))
+        veteran = User.objects.create_user(username='veteran', password='TestPass123@')
+        historical = StuExam_DB.objects.create(student=veteran, examname='Maths', qpaper=paper, completed=1)
+        historical.questions.add(Stu_Question.objects.create(
+            student=veteran, question='What was 2 + 2?', optionA='3', optionB='4', optionC='5', optionD='6',
+            answer='B', max_marks=2, choice='A',
+        ))
+
+        versioning.exam_questions(exam)
+        with self.assertNumQueries(6):
+            data = ExamResultSerializer(StuExam_DB.objects.filter(examname='Maths'), many=True).data
+        by_student = {row['student_name']: row['questions'] for row in data}
+        self.assertEqual(by_student['stud2'][0]['choice'], 'B')
+        self.assertEqual(by_student['veteran'][0]['question_text'], 'What was 2 + 2?')
+        self.assertEqual(by_student['veteran'][0]['choice'], 'A')
+
+    def test_totals_use_pinned_marks_after_edits(self):
+        """Test that dashboards total the pinned marks, not the edited questions."""
+        paper = Question_Paper.objects.create(professor=self.professor, qPaperTitle='Paper', total_marks=2)
+        paper.questions.add(self.question)
+        exam = Exam_Model.objects.create(professor=self.professor, name='Maths', question_paper=paper)
+        exam.pin_question_versions()
+        student = User.objects.create_user(username='stud', password='TestPass123@')
+        attempt = StuExam_DB.objects.create(student=student, examname='Maths', qpaper=paper, score=2, completed=1)
+
+        self.question.max_marks = 10
+        self.question.save()
+        self.assertEqual(versioning.attempt_totals([attempt]), {attempt.id: 2})
+
+        self.client.force_login(student)
+        self.assertEqual(self.client.get('/student/').context['avg_score'], '100%')
+        self.client.force_login(self.professor)
+        results = self.client.get('/exams/prof/viewresults/').context['student_results']
+        self.assertEqual(results['stud']['exams'][0]['total_marks'], 2)
+
+
+class ExamGeneratorTests(TestCase):
+    """Test stratified per-student paper generation."""
+
+    def setUp(self):
+        cache.clear()
+        self.professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.paper = Question_Paper.objects.create(professor=self.professor, qPaperTitle='Pool', total_marks=0)
+        for i in range(6):
+            self.paper.questions.add(make_question(self.professor, question=f'Easy {i}', difficulty='easy', max_marks=1))
+        for i in range(4):
+            self.paper.questions.add(make_question(self.professor, question=f'Hard {i}', difficulty='hard', max_marks=3))
+        self.exam = Exam_Model.objects.create(professor=self.professor, name='Generated', question_paper=self.paper)
+        self.exam.pin_question_versions()
+        self.spec = {
+            'seed': 7,
+            'strata': [{'difficulty': 'easy', 'count': 3}, {'difficulty': 'hard', 'count': 2}],
+        }
+
+    def test_papers_follow_strata_and_are_deterministic(self):
+        """Test that every paper honours the strata and is stable per student."""
+        generator = ExamGenerator.from_exam(self.exam, self.spec)
+        questions = versioning.exam_questions(self.exam)
+
+        papers = {sid: generator.generate(sid) for sid in range(1, 1001)}
+        for qnos in papers.values():
+            difficulties = [questions[q]['difficulty'] for q in qnos]
+            self.assertEqual(difficulties.count('easy'), 3)
+            self.assertEqual(difficulties.count('hard'), 2)
+            self.assertEqual(len(set(qnos)), 5)
+
+        self.assertEqual(generator.generate(42), papers[42])
+        self.assertGreater(len({tuple(p) for p in papers.values()}), 1)
+
+    def test_marks_target_picks_closest_sample(self):
+        """Test that a marks target is met when the pool allows it."""
+        spec = {'seed': 1, 'marks_target': 5, 'strata': [{'count': 3}]}
+        generator = ExamGenerator.from_exam(self.exam, spec)
+        for sid in range(1, 50):
+            qnos = generator.generate(sid)
+            total = sum(versioning.exam_questions(self.exam)[q]['max_marks'] for q in qnos)
+            self.assertEqual(total, 5)
+
+    def test_oversized_stratum_is_rejected(self):
+        """Test that a stratum asking for more questions than exist fails early."""
+        spec = {'strata': [{'difficulty': 'hard', 'count': 5}]}
+        with self.assertRaises(ValueError):
+            ExamGenerator.from_exam(self.exam, spec)
+
+    def test_bank_only_strata_are_rejected_for_exams(self):
+        """Test that tag and course strata are refused before any paper is written."""
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        spec = {'strata': [{'difficulty': 'easy', 'count': 1}, {'tag': 'algebra', 'count': 1}]}
+        with self.assertRaisesMessage(ValueError, 'questions have no tag'):
+            generate_exam_sessions(self.exam, spec, [self.professor.id])
+        with self.assertRaisesMessage(CommandError, 'stratified by difficulty'):
+            call_command('generate_exam_papers', self.exam.id, spec='{"strata": [{"course": 3, "count": 1}]}')
+        self.assertFalse(ExamSession.objects.filter(exam=self.exam).exists())
+
+    def test_selection_is_stored_on_session(self):
+        """Test that generated papers are stored compactly on ExamSession."""
+        student = User.objects.create_user(username='stud', password='TestPass123@')
+        generate_exam_sessions(self.exam, self.spec, [student.id])
+
+        session = ExamSession.objects.get(student=student, exam=self.exam)
+        self.assertEqual(len(bytes(session.question_selection)), 5 * 4)
+        self.assertEqual(
+            session.selected_qnos,
+            ExamGenerator.from_exam(self.exam, self.spec).generate(student.id),
+        )
+
+
+class SeededPermutationTests(TestCase):
+    """Test seed-derived question and option orders."""
+
+    def test_orders_are_reproducible_permutations(self):
+        """Test that a seed always yields the same valid permutation."""
+        qnos = list(range(1, 41))
+        order = permutations.question_order(12345, qnos)
+        self.assertEqual(sorted(order), qnos)
+        self.assertEqual(permutations.question_order(12345, reversed(qnos)), order)
+        self.assertNotEqual(permutations.question_order(54321, qnos), order)
+
+        options = permutations.option_order(12345, 7)
+        self.assertEqual(sorted(options), ['A', 'B', 'C', 'D'])
+        self.assertEqual(permutations.option_order(12345, 7), options)
+
+    def test_shuffle_is_roughly_uniform(self):
+        """Test that every option lands first about equally often."""
+        firsts = {letter: 0 for letter in permutations.OPTION_LETTERS}
+        for seed in range(4000):
+            firsts[permutations.option_order(seed, 1)[0]] += 1
+        for count in firsts.values():
+            self.assertTrue(800 < count < 1200)
+
+    def test_session_seed_drives_order(self):
+        """Test that a session rebuilds its order from its stored seed."""
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        exam = Exam_Model.objects.create(professor=professor, name='Seeded', question_paper=paper)
+        session = ExamSession.objects.create(student=student, exam=exam)
+
+        reloaded = ExamSession.objects.get(pk=session.pk)
+        self.assertEqual(reloaded.ordered_qnos([3, 1, 2]), session.ordered_qnos([1, 2, 3]))
+        self.assertEqual(reloaded.option_order(2), permutations.option_order(session.order_seed, 2))
+
+        # A session in progress before seeds keeps the order it was shown
+        session.legacy_question_order = [3, 1, 2]
+        session.legacy_option_order = {'2': ['D', 'C', 'B', 'A']}
+        self.assertEqual(session.ordered_qnos([1, 2, 3]), [3, 1, 2])
+        self.assertEqual(session.option_order(2), ['D', 'C', 'B', 'A'])
+        self.assertEqual(session.option_order(1), permutations.option_order(session.order_seed, 1))
+
+
+class PaperFragmentCacheTests(TestCase):
+    """Test pre-rendered question fragments and per-session assembly."""
+
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        for i in range(3):
+            paper.questions.add(make_question(professor, question=f'Question {i}', optionA=f'Alpha {i}'))
+        self.exam = Exam_Model.objects.create(professor=professor, name='Fragments', question_paper=paper)
+        self.exam.pin_question_versions()
+
+    def test_fragments_render_once(self):
+        """Test that fragments are rendered on first use and then served from cache."""
+        paper_cache.paper_fragments(self.exam)
+        with mock.patch('questions.paper_cache.render_to_string') as render:
+            paper_cache.paper_fragments(self.exam)
+        render.assert_not_called()
+
+    def test_session_paper_follows_permutation(self):
+        """Test that the assembled paper uses the session's question and option order."""
+        session = ExamSession.objects.create(student=self.student, exam=self.exam)
+        html = paper_cache.render_session_paper(self.exam, session)
+
+        positions = [html.index(f'Question {i}') for i in range(3)]
+        qnos = list(versioning.exam_questions(self.exam))
+        expected = sorted(range(3), key=lambda i: session.ordered_qnos(qnos).index(qnos[i]))
+        self.assertEqual(sorted(range(3), key=lambda i: positions[i]), expected)
+
+        first = session.ordered_qnos(qnos)[0]
+        letters = session.option_order(first)
+        option_positions = [html.index(f'name="answer_{first}" value="{letter}"') for letter in letters]
+        self.assertEqual(option_positions, sorted(option_positions))
+
+
+class ExamWarmupTests(TestCase):
+    """Test the pre-start warm-up of papers, sessions and eligibility."""
+
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        students_group, _ = Group.objects.get_or_create(name='Student')
+        self.students = []
+        for i in range(3):
+            student = User.objects.create_user(username=f'stud{i}', password='TestPass123@')
+            student.groups.add(students_group)
+            self.students.append(student)
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        paper.questions.add(make_question(professor))
+        start = timezone.now() + timedelta(minutes=5)
+        self.exam = Exam_Model.objects.create(
+            professor=professor, name='Soon', question_paper=paper,
+            start_time=start, end_time=start + timedelta(hours=1),
+        )
+
+    def test_warmup_creates_seeded_sessions_once(self):
+        """Test that warm-up creates one seeded session per eligible student, once."""
+        self.assertEqual(warm_up_upcoming_exams(15), 1)
+        sessions = ExamSession.objects.filter(exam=self.exam)
+        self.assertEqual(sessions.count(), 3)
+        self.assertEqual(len({s.order_seed for s in sessions}), 3)
+        self.assertTrue(Exam_Model.objects.get(pk=self.exam.pk).pinned_versions)
+
+        self.assertEqual(warm_up_upcoming_exams(15), 0)
+        self.assertEqual(warm_up_upcoming_exams(1), 0)
+
+    def test_warmup_respects_assignments(self):
+        """Test that only individually assigned students get sessions on restricted exams."""
+        ExamAssignment.objects.create(exam=self.exam, student=self.students[0], assignment_type='individual')
+        warm_up_upcoming_exams(15)
+        self.assertEqual(
+            list(ExamSession.objects.filter(exam=self.exam).values_list('student_id', flat=True)),
+            [self.students[0].id],
+        )
+
+    def test_assignment_change_invalidates_eligibility(self):
+        """Test that the eligibility cache is dropped when assignments change."""
+        self.assertTrue(eligibility.is_eligible(self.exam, self.students[1]))
+        assignment = ExamAssignment.objects.create(
+            exam=self.exam, student=self.students[0], assignment_type='individual'
+        )
+        self.assertFalse(eligibility.is_eligible(self.exam, self.students[1]))
+        assignment.delete()
+        self.assertTrue(eligibility.is_eligible(self.exam, self.students[1]))
+
+        ExamAssignment.objects.create(exam=self.exam, student=self.students[0], assignment_type='individual')
+        self.assertFalse(eligibility.is_eligible(self.exam, self.students[1]))
+        ExamAssignment.objects.filter(exam=self.exam).delete()
+        self.assertTrue(eligibility.is_eligible(self.exam, self.students[1]))
+
+    def test_extension_moves_warmed_sessions(self):
+        """Test that extending a warmed exam moves the deadline of its pre-created sessions."""
+        warm_up_exam(self.exam)
+        self.exam.end_time += timedelta(minutes=30)
+        self.exam.save()
+        self.assertEqual(
+            set(ExamSession.objects.filter(exam=self.exam).values_list('ends_at', flat=True)),
+            {self.exam.end_time},
+        )
+
+
+@override_settings(PROCTORING_INGEST_WORKER=False)
+class ProctoringIngestTests(TestCase):
+    """Test buffered focus-loss ingestion."""
+
+    def setUp(self):
+        cache.clear()
+        proctoring_ingest.flush()
+        professor = User.objects.create_user(username='prof', password='TestPass123@', email='prof@example.com')
+        self.students = [User.objects.create_user(username=f'stud{i}', password='TestPass123@') for i in range(2)]
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        self.exam = Exam_Model.objects.create(professor=professor, name='Watched', question_paper=paper)
+        ExamSession.objects.create(student=self.students[0], exam=self.exam)
+
+    def test_events_are_acknowledged_then_batched(self):
+        """Test that counts are answered from cache and written in one flush."""
+        first = self.students[0].id
+        self.assertEqual(proctoring_ingest.enqueue_focus_event(first, self.exam.id, 'TAB_SWITCH'), (1, 5))
+        self.assertEqual(proctoring_ingest.enqueue_focus_event(first, self.exam.id, 'WINDOW_BLUR')[0], 2)
+        proctoring_ingest.enqueue_focus_event(self.students[1].id, self.exam.id, 'TAB_SWITCH')
+        self.assertEqual(FocusLossEvent.objects.count(), 0)
+
+        self.assertEqual(proctoring_ingest.flush(), 3)
+        self.assertEqual(FocusLossEvent.objects.count(), 3)
+        self.assertEqual(ExamFocusLog.objects.get(student_id=first, exam=self.exam).focus_loss_count, 2)
+        self.assertEqual(ExamSession.objects.get(student_id=first, exam=self.exam).tab_switch_count, 2)
+
+    def test_events_of_deleted_exams_do_not_stall_ingestion(self):
+        """Test that a deleted exam's buffered events are skipped and unknown types refused."""
+        doomed = Exam_Model.objects.create(
+            professor=self.exam.professor, name='Doomed', question_paper=self.exam.question_paper
+        )
+        proctoring_ingest.enqueue_focus_event(self.students[0].id, doomed.id, 'TAB_SWITCH')
+        proctoring_ingest.enqueue_focus_event(self.students[0].id, self.exam.id, 'TAB_SWITCH')
+        doomed.delete()
+        self.assertEqual(proctoring_ingest.flush(), 1)
+        self.assertEqual(FocusLossEvent.objects.get().exam_id, self.exam.id)
+
+        with self.assertRaises(ValueError):
+            proctoring_ingest.enqueue_focus_event(self.students[0].id, self.exam.id, 'COPY_PASTE')
+        student = self.students[0]
+        student.groups.add(Group.objects.get_or_create(name='Student')[0])
+        self.client.force_login(student)
+        response = self.client.post(
+            f'/api/v1/exams/{self.exam.id}/focus-loss/', {'event_type': 'COPY_PASTE'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_counter_resumes_from_database(self):
+        """Test that a cold cache picks up the stored count."""
+        ExamFocusLog.objects.create(student=self.students[0], exam=self.exam, focus_loss_count=4)
+        count, max_allowed = proctoring_ingest.enqueue_focus_event(self.students[0].id, self.exam.id, 'TAB_SWITCH')
+        self.assertEqual((count, max_allowed), (5, 5))
+        proctoring_ingest.flush()
+        log = ExamFocusLog.objects.get(student=self.students[0], exam=self.exam)
+        self.assertEqual(log.focus_loss_count, 5)
+        self.assertFalse(log.is_suspicious)
+
+    def test_focus_status_short_circuits_unchanged_polls(self):
+        """Test that an unchanged state answers 304 and a new event bumps the ETag."""
+        student = self.students[0]
+        student.groups.add(Group.objects.get_or_create(name='Student')[0])
+        self.client.force_login(student)
+        url = f'/api/v1/exams/{self.exam.id}/focus-status/'
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with mock.patch.object(proctoring_ingest, 'focus_state') as focus_state:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        focus_state.assert_not_called()
+
+        proctoring_ingest.enqueue_focus_event(student.id, self.exam.id, 'TAB_SWITCH')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['focus_loss_count'], 1)
+
+        # Polling is the default; the stream is only served on ASGI deployments
+        self.assertEqual(self.client.get(f'/exams/student/appear/{self.exam.id}/events/').status_code, 404)
+
+
+class ProctoringRetentionTests(TestCase):
+    """Test interned user agents and the roll-up of expired proctoring rows."""
+
+    def setUp(self):
+        cache.clear()
+        proctoring_ingest.flush()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        self.exam = Exam_Model.objects.create(professor=professor, name='Archived', question_paper=paper)
+
+    def test_cutoff_keeps_the_last_months(self):
+        """Test the partition cutoff across a year boundary."""
+        now = timezone.make_aware(timezone.datetime(2026, 2, 10))
+        self.assertEqual(proctoring_retention.retention_cutoff(1, now), 202602)
+        self.assertEqual(proctoring_retention.retention_cutoff(3, now), 202512)
+        self.assertEqual(proctoring_retention.retention_cutoff(14, now), 202501)
+
+    def test_ingested_user_agents_are_interned(self):
+        """Test that repeated user agents share one row."""
+        for _ in range(3):
+            proctoring_ingest.enqueue_focus_event(self.student.id, self.exam.id, 'TAB_SWITCH', user_agent='Firefox/130')
+        proctoring_ingest.flush()
+        self.assertEqual(UserAgent.objects.count(), 1)
+        events = FocusLossEvent.objects.filter(exam=self.exam)
+        self.assertEqual({e.user_agent for e in events}, {'Firefox/130'})
+
+    def test_expired_rows_are_rolled_up_and_purged(self):
+        """Test that old events fold into the summary and unresolved alerts stay."""
+        agent_id = UserAgent.intern_many(['Chrome/128'])['Chrome/128']
+        for kind in ('TAB_SWITCH', 'TAB_SWITCH', 'WINDOW_BLUR'):
+            FocusLossEvent.objects.create(
+                student=self.student, exam=self.exam, event_type=kind, agent_id=agent_id, partition=202401
+            )
+        FocusLossEvent.objects.create(student=self.student, exam=self.exam, partition=202610)
+        alert = dict(student=self.student, exam=self.exam, alert_type='TAB_SWITCH', message='x', partition=202401)
+        ExamSecurityAlert.objects.create(level='CRITICAL', is_resolved=True, **alert)
+        ExamSecurityAlert.objects.create(level='WARNING', **alert)
+
+        now = timezone.make_aware(timezone.datetime(2026, 10, 19))
+        result = proctoring_retention.apply_retention(months=12, now=now)
+        self.assertEqual((result['events'], result['alerts'], result['user_agents']), (3, 1, 1))
+
+        summary = ProctoringSummary.objects.get(student=self.student, exam=self.exam)
+        self.assertEqual((summary.tab_switches, summary.window_blurs, summary.critical_alerts), (2, 1, 1))
+        self.assertEqual(summary.rolled_up_through, 202401)
+        self.assertEqual(FocusLossEvent.objects.count(), 1)
+        self.assertEqual(ExamSecurityAlert.objects.get().level, 'WARNING')
+
+        FocusLossEvent.objects.create(student=self.student, exam=self.exam, partition=202402)
+        proctoring_retention.apply_retention(months=12, now=now)
+        self.assertEqual(ProctoringSummary.objects.get(pk=summary.pk).tab_switches, 3)
+
+    def test_agent_cache_is_cleared_after_the_rows(self):
+        """Test that purged agents leave the cache only once their rows are gone."""
+        agent_id = UserAgent.intern_many(['Chrome/128'])['Chrome/128']
+        rows_left = []
+        with mock.patch.object(proctoring_retention, 'cache') as purge_cache:
+            purge_cache.delete_many.side_effect = lambda keys: rows_left.append(
+                UserAgent.objects.filter(pk=agent_id).exists()
+            )
+            self.assertEqual(proctoring_retention.purge_unused_user_agents(), 1)
+        self.assertEqual(rows_left, [False])
+        purge_cache.delete_many.assert_called_once_with([UserAgent.cache_key(UserAgent.digest_for('Chrome/128'))])
+
+class AtomicCounterTests(TestCase):
+    """Test single-statement counter increments and threshold flags."""
+
+    def setUp(self):
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        self.exam = Exam_Model.objects.create(professor=professor, name='Counted', question_paper=paper)
+        self.session = ExamSession.objects.create(student=self.student, exam=self.exam)
+
+    def test_increment_returns_new_value(self):
+        """Test both the RETURNING path and the row-lock fallback."""
+        self.assertEqual(counters.increment(ExamSession, 'tab_switch_count', pk=self.session.pk), 1)
+        with mock.patch('questions.counters.supports_update_returning', return_value=False):
+            self.assertEqual(counters.increment(ExamSession, 'tab_switch_count', by=2, pk=self.session.pk), 3)
+        self.assertEqual(ExamSession.objects.get(pk=self.session.pk).tab_switch_count, 3)
+        self.assertIsNone(counters.increment(ExamSession, 'tab_switch_count', pk=0))
+
+    def test_thresholds_use_returned_counts(self):
+        """Test that flags are set once, when the threshold is crossed."""
+        for _ in range(5):
+            self.session.record_tab_switch()
+        flags = ExamSession.objects.get(pk=self.session.pk).suspicious_flags
+        self.assertEqual(flags['auto_submit'], 'tab_switch_threshold_reached')
+
+        for _ in range(3):
+            self.session.record_fullscreen_exit()
+        session = ExamSession.objects.get(pk=self.session.pk)
+        self.assertEqual(session.fullscreen_exit_count, 3)
+        self.assertEqual(session.suspicious_flags['fullscreen_alert'], 'multiple_exits')
+        self.assertIn('auto_submit', session.suspicious_flags)
+
+    def test_focus_log_flagged_past_limit(self):
+        """Test that the focus log becomes suspicious only past max_focus_losses."""
+        log = ExamFocusLog.objects.create(student=self.student, exam=self.exam, max_focus_losses=2)
+        log.record_focus_loss()
+        log.record_focus_loss()
+        self.assertFalse(ExamFocusLog.objects.get(pk=log.pk).is_suspicious)
+        log.record_focus_loss()
+        log = ExamFocusLog.objects.get(pk=log.pk)
+        self.assertEqual(log.focus_loss_count, 3)
+        self.assertTrue(log.is_suspicious)
+
+
+@override_settings(PROCTORING_INGEST_WORKER=False)
+class SuspicionScoringTests(TestCase):
+    """Test compiled proctoring policies and risk scoring."""
+
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        self.exam = Exam_Model.objects.create(professor=professor, name='Scored', question_paper=paper)
+
+    def test_default_policy_scores_and_crossings(self):
+        """Test the built-in rules and that crossed holds only new actions."""
+        policy = suspicion.policy_for_exam(self.exam.id)
+        self.assertEqual(policy.limit('focus_loss', 'submit'), 5)
+
+        verdict = policy.evaluate({'focus_loss': 5, 'fullscreen_exit': 0}, 'focus_loss')
+        self.assertEqual(verdict.score, 50)
+        self.assertEqual(verdict.crossed, {'alert', 'submit'})
+        verdict = policy.evaluate({'focus_loss': 6, 'fullscreen_exit': 0}, 'focus_loss')
+        self.assertIn('submit', verdict.actions)
+        self.assertEqual(verdict.crossed, set())
+
+        # Combined score reaches the alert threshold before either rule does
+        verdict = policy.evaluate({'focus_loss': 3, 'fullscreen_exit': 2}, 'fullscreen_exit')
+        self.assertEqual(verdict.score, 60)
+        self.assertEqual(verdict.crossed, {'alert'})
+
+    def test_exam_policy_replaces_default(self):
+        """Test that saving a policy takes effect and is then served from cache."""
+        self.assertEqual(proctoring_ingest.focus_state(self.student.id, self.exam.id)[1], 5)
+        ProctoringPolicy.objects.create(
+            exam=self.exam, rules=[{'event': 'focus_loss', 'at': 2, 'weight': 50, 'action': 'submit'}]
+        )
+        proctoring_ingest.enqueue_focus_event(self.student.id, self.exam.id, 'TAB_SWITCH')
+        count, max_allowed = proctoring_ingest.enqueue_focus_event(self.student.id, self.exam.id, 'TAB_SWITCH')
+        self.assertEqual((count, max_allowed), (2, 2))
+        proctoring_ingest.flush()
+
+        suspicion.assess(self.student.id, self.exam.id)
+        with self.assertNumQueries(0):
+            verdict = suspicion.assess(self.student.id, self.exam.id, 'focus_loss', count)
+        self.assertEqual(verdict.score, 50)
+        self.assertEqual(verdict.crossed, {'submit'})
+
+    def test_max_allowed_follows_the_submit_score(self):
+        """Test that the reported limit includes score-based submits and is left out when there is none."""
+        rules = [
+            {'event': 'focus_loss', 'at': 1, 'weight': 10, 'action': 'warn'},
+            {'event': 'fullscreen_exit', 'at': 1, 'weight': 15},
+        ]
+        policy = suspicion.compile_policy(rules, submit_score=100)
+        self.assertEqual(policy.submit_limit('focus_loss', {'fullscreen_exit': 0}), 10)
+        self.assertEqual(policy.submit_limit('focus_loss', {'fullscreen_exit': 2}), 7)
+        self.assertIsNone(suspicion.compile_policy(rules).submit_limit('focus_loss'))
+
+        ProctoringPolicy.objects.create(exam=self.exam, rules=rules, submit_score=100)
+        suspicion.session_counts(self.student.id, self.exam.id, fullscreen_exit=2)
+        proctoring_ingest.enqueue_focus_event(self.student.id, self.exam.id, 'TAB_SWITCH')
+        payload = proctoring_ingest.focus_payload(self.student.id, self.exam.id)
+        self.assertEqual(payload['max_allowed'], 7)
+        self.assertIn('Maximum allowed: 7.', payload['warning'])
+
+        ProctoringPolicy.objects.filter(exam=self.exam).update(submit_score=None)
+        suspicion.invalidate_policies()
+        payload = proctoring_ingest.focus_payload(self.student.id, self.exam.id)
+        self.assertIsNone(payload['max_allowed'])
+        self.assertEqual(payload['warning'], 'Warning: You have switched tabs 1 time(s).')
+        proctoring_ingest.flush()
+
+    def test_invalid_rules_are_rejected(self):
+        """Test that policy validation reports bad rules."""
+        with self.assertRaises(ValueError):
+            suspicion.compile_policy([{'event': 'copy_paste', 'action': 'warn'}])
+        policy = ProctoringPolicy(exam=self.exam, rules=[{'event': 'focus_loss', 'at': 0}])
+        with self.assertRaises(ValidationError):
+            policy.clean()
+
+class PostExamAnalysisTests(TestCase):
+    """Test the vectorized post-exam anomaly analysis."""
+
+    def test_copied_wrong_answers_are_paired(self):
+        """Test that only the pair sharing wrong answers is flagged."""
+        rng = np.random.default_rng(7)
+        key = rng.integers(1, 5, 40).astype(np.int8)
+        answers = np.where(rng.random((60, 40)) < 0.5, key, rng.integers(1, 5, (60, 40))).astype(np.int8)
+        answers[11] = answers[42]
+
+        pairs = post_exam_analysis.answer_similarity(answers, key)
+        self.assertEqual([(i, j) for i, j, _, _ in pairs], [(11, 42)])
+
+    def test_exam_findings_become_alerts(self):
+        """Test network and answer findings stored once per run."""
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        for i in range(4):
+            paper.questions.add(make_question(professor, question=f'Question {i}'))
+        exam = Exam_Model.objects.create(professor=professor, name='Analysed', question_paper=paper)
+        exam.pin_question_versions()
+        qnos = [str(q) for q in exam.pinned_versions]
+
+        for i in range(3):
+            student = User.objects.create_user(username=f'stud{i}', password='TestPass123@')
+            ExamSession.objects.create(
+                student=student, exam=exam,
+                ip_address='10.0.0.5' if i < 2 else '10.0.0.9', user_agent='Chrome/128',
+                answers={q: 'B' for q in qnos},
+            )
+
+        frames = post_exam_analysis.load_exam_frames(exam)
+        self.assertEqual(frames['answers'].shape, (3, 4))
+        self.assertTrue((frames['answers'] == frames['key']).all())
+
+        result = post_exam_analysis.analyze_exam(exam)
+        self.assertEqual((result['clusters'], result['alerts']), (1, 2))
+        post_exam_analysis.analyze_exam(exam)
+        alerts = ExamSecurityAlert.objects.filter(exam=exam, alert_type=post_exam_analysis.ALERT_TYPE)
+        self.assertEqual(alerts.count(), 2)
+        self.assertIn('stud0, stud1', alerts.first().message)
+
+class ExamClockTests(TestCase):
+    """Test cached per-session deadlines and the timer heartbeat."""
+
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        self.student.groups.add(Group.objects.get_or_create(name='Student')[0])
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        now = timezone.now()
+        self.exam = Exam_Model.objects.create(
+            professor=professor, name='Timed', question_paper=paper,
+            start_time=now - timedelta(minutes=10), end_time=now + timedelta(minutes=30),
+        )
+        self.session = ExamSession.objects.create(
+            student=self.student, exam=self.exam, ends_at=now + timedelta(minutes=20)
+        )
+
+    def test_deadline_is_cached_per_session(self):
+        """Test that the session's ends_at wins and later reads skip the database."""
+        remaining = exam_clock.remaining_seconds(self.session)
+        self.assertTrue(1195 <= remaining <= 1200)
+        with self.assertNumQueries(0):
+            state, seconds = exam_clock.check_window(self.student.id, self.exam.id)
+        self.assertEqual(state, 'open')
+
+        opens_at, deadline = exam_clock.deadline_window(self.student.id, self.exam.id)
+        self.assertEqual(exam_clock.check_window(self.student.id, self.exam.id, now=opens_at - 5), ('not_started', 5))
+        self.assertEqual(exam_clock.check_window(self.student.id, self.exam.id, now=deadline + 3)[0], 'expired')
+
+    def test_heartbeat_and_late_submission(self):
+        """Test the clock endpoint and that an expired deadline rejects submissions."""
+        self.client.force_login(self.student)
+        data = self.client.get(f'/api/v1/exams/{self.exam.id}/clock/').json()
+        self.assertEqual(data['state'], 'open')
+        self.assertGreater(data['remaining_seconds'], 1100)
+
+        valid, _ = exam_clock.validate_submission(
+            self.student.id, self.exam.id, (timezone.now() - timedelta(minutes=5)).isoformat()
+        )
+        self.assertFalse(valid)
+
+        ExamSession.objects.filter(pk=self.session.pk).update(ends_at=timezone.now() - timedelta(minutes=1))
+        exam_clock.forget(self.student.id, self.exam.id)
+        response = self.client.post(f'/api/v1/exams/{self.exam.id}/submit/', {'answers': {}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Exam time has expired')
+
+    def test_paper_api_follows_the_student_deadline(self):
+        """Test that the paper endpoint uses the cached deadline and refuses as the exam page does."""
+        self.client.force_login(self.student)
+        url = f'/api/v1/exams/{self.exam.id}/paper/'
+        self.assertTrue(1190 <= self.client.get(url).json()['remaining_seconds'] <= 1200)
+
+        ExamSession.objects.filter(pk=self.session.pk).update(ends_at=timezone.now() - timedelta(minutes=1))
+        exam_clock.forget(self.student.id, self.exam.id)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        ExamSession.objects.filter(pk=self.session.pk).update(ends_at=self.exam.end_time)
+        exam_clock.forget(self.student.id, self.exam.id)
+        StuExam_DB.objects.create(student=self.student, examname=self.exam.name, qpaper=self.exam.question_paper, completed=1)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+        StuExam_DB.objects.all().delete()
+        other = User.objects.create_user(username='other', password='TestPass123@')
+        ExamAssignment.objects.create(exam=self.exam, student=other, assignment_type='individual')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_editing_exam_times_takes_effect_at_once(self):
+        """Test that saving new exam times refreshes cached windows and session deadlines."""
+        ExamSession.objects.filter(pk=self.session.pk).update(ends_at=self.exam.end_time)
+        self.session.refresh_from_db()
+        exam_clock.deadline_window(self.student.id, self.exam.id, self.session)
+
+        self.exam.start_time = timezone.now() + timedelta(minutes=5)
+        self.exam.end_time = timezone.now() + timedelta(hours=2)
+        self.exam.save()
+
+        self.assertEqual(exam_clock.check_window(self.student.id, self.exam.id)[0], 'not_started')
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.ends_at, self.exam.end_time)
+        remaining = exam_clock.remaining_seconds(self.session, now=self.exam.start_time.timestamp())
+        self.assertGreater(remaining, 110 * 60)
+
+
+@override_settings(SUBMISSION_GRADING_WORKERS=0)
+class SubmissionQueueTests(TestCase):
+    """Test accepting submissions at the deadline and grading them from the queue."""
+
+    def setUp(self):
+        cache.clear()
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        self.student = User.objects.create_user(username='stud', password='TestPass123@')
+        self.student.groups.add(Group.objects.get_or_create(name='Student')[0])
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=4)
+        paper.questions.add(make_question(professor), make_question(professor, answer='A'))
+        now = timezone.now()
+        self.exam = Exam_Model.objects.create(
+            professor=professor, name='Queued', question_paper=paper,
+            start_time=now - timedelta(minutes=10), end_time=now + timedelta(minutes=30),
+        )
+        self.exam.pin_question_versions()
+        self.session = ExamSession.objects.create(
+            student=self.student, exam=self.exam, ends_at=now + timedelta(minutes=20)
+        )
+        self.client.force_login(self.student)
+
+    def test_queued_submission_is_graded(self):
+        """Test that a queued submission is graded in a batch and linked to results."""
+        qnos = [str(q) for q in versioning.exam_questions(self.exam)]
+        submission_queue.enqueue_submission(self.session, {qnos[0]: 'B', qnos[1]: 'C'})
+        submission_queue.enqueue_submission(self.session, {qnos[0]: 'B', qnos[1]: 'A'})
+        self.assertEqual(ExamSubmission.objects.count(), 1)
+
+        self.assertEqual(submission_queue.process_pending(), 1)
+        stu_exam = StuExam_DB.objects.get(student=self.student, examname='Queued')
+        self.assertEqual((stu_exam.score, stu_exam.completed), (2, 1))
+        self.assertIn(stu_exam, StuResults_DB.objects.get(student=self.student).exams.all())
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_submitted)
+        self.assertEqual(ExamSubmission.objects.get().status, ExamSubmission.GRADED)
+
+    def test_submission_within_grace_is_accepted(self):
+        """Test that a form post just after the deadline is queued and the result page waits."""
+        ExamSession.objects.filter(pk=self.session.pk).update(ends_at=timezone.now() - timedelta(seconds=5))
+        exam_clock.forget(self.student.id, self.exam.id)
+
+        with override_settings(EXAM_SUBMISSION_GRACE_SECONDS=30):
+            response = self.client.post(f'/exams/student/appear/{self.exam.id}', {})
+        self.assertRedirects(response, f'/exams/student/result/{self.exam.id}', fetch_redirect_response=False)
+        self.assertTrue(submission_queue.pending_submission(self.student.id, self.exam.id))
+        self.assertTrue(self.client.get(f'/exams/student/result/{self.exam.id}').context['grading'])
+
+        submission_queue.process_pending()
+        self.assertNotIn('grading', self.client.get(f'/exams/student/result/{self.exam.id}').context)
+
+        ExamSubmission.objects.all().delete()
+        with override_settings(EXAM_SUBMISSION_GRACE_SECONDS=0):
+            self.client.post(f'/exams/student/appear/{self.exam.id}', {})
+        self.assertFalse(ExamSubmission.objects.exists())
+
+    def test_resubmission_requeues_a_failed_submission(self):
+        """Test that submitting again after grading failed for good is graded, not dropped."""
+        qnos = [str(q) for q in versioning.exam_questions(self.exam)]
+        submission_queue.enqueue_submission(self.session, {qnos[0]: 'C'})
+        ExamSubmission.objects.update(status=ExamSubmission.FAILED, attempts=submission_queue.MAX_ATTEMPTS)
+        self.assertIsNone(submission_queue.pending_submission(self.student.id, self.exam.id))
+
+        response = self.client.post(f'/exams/student/appear/{self.exam.id}', {f'answer_{qnos[0]}': 'B'})
+        self.assertRedirects(response, f'/exams/student/result/{self.exam.id}', fetch_redirect_response=False)
+        submission = ExamSubmission.objects.get()
+        self.assertEqual((submission.status, submission.attempts), (ExamSubmission.PENDING, 0))
+
+        self.assertEqual(submission_queue.process_pending(), 1)
+        self.assertEqual(StuExam_DB.objects.get(student=self.student, examname='Queued').score, 2)
+
+    def test_form_submission_is_graded_and_shown(self):
+        """Test that answers posted from the exam page are graded and shown on the result page."""
+        qnos = [str(q) for q in versioning.exam_questions(self.exam)]
+        response = self.client.post(f'/exams/student/appear/{self.exam.id}', {f'answer_{qnos[0]}': 'B'})
+        self.assertRedirects(response, f'/exams/student/result/{self.exam.id}', fetch_redirect_response=False)
+
+        self.assertEqual(submission_queue.process_pending(), 1)
+        self.assertEqual(StuExam_DB.objects.get(student=self.student, examname='Queued').score, 2)
+        context = self.client.get(f'/exams/student/result/{self.exam.id}').context
+        self.assertEqual((context['score'], context['total_marks']), (2, 4))
+
+
+class LiveMonitorTests(TestCase):
+    """Test the in-process pub/sub behind the live proctoring stream."""
+
+    def test_events_from_other_threads_reach_the_stream(self):
+        """Test that a publish from a worker thread is streamed with updated stats."""
+        async def scenario():
+            stream = live_monitor.exam_event_stream(99, {'active': 0, 'submitted': 0})
+            snapshot = await stream.__anext__()
+            publisher = threading.Thread(
+                target=live_monitor.publish_exam_event, args=(99, 'session_started'), kwargs={'student_id': 1}
+            )
+            publisher.start()
+            publisher.join()
+            event = await asyncio.wait_for(stream.__anext__(), 2)
+            stats = await asyncio.wait_for(stream.__anext__(), 2)
+            await stream.aclose()
+            return snapshot, event, stats
+
+        snapshot, event, stats = asyncio.run(scenario())
+        self.assertTrue(snapshot.startswith('event: stats'))
+        self.assertTrue(event.startswith('event: session_started'))
+        self.assertIn('"active": 1', stats)
+        self.assertFalse(live_monitor.broker.has_subscribers(live_monitor.exam_topic(99)))
+
+    def test_activity_is_polled_without_sse(self):
+        """Test that the monitor polls activity after its cursor while the stream is off."""
+        professor = User.objects.create_user(username='prof', password='TestPass123@')
+        student = User.objects.create_user(username='stud', password='TestPass123@')
+        paper = Question_Paper.objects.create(professor=professor, qPaperTitle='Paper', total_marks=0)
+        exam = Exam_Model.objects.create(professor=professor, name='Watched', question_paper=paper)
+        FocusLossEvent.objects.create(student=student, exam=exam)
+        self.client.force_login(professor)
+
+        self.assertEqual(self.client.get(f'/exams/prof/exam/monitor/{exam.id}/stream/').status_code, 404)
+        self.assertNotIn('EventSource', self.client.get(f'/exams/prof/exam/monitor/{exam.id}/').content.decode())
+        first = self.client.get(f'/exams/prof/exam/monitor/{exam.id}/events/').json()
+        self.assertEqual([event['kind'] for event in first['events']], ['focus_loss'])
+
+        ExamSecurityAlert.objects.create(student=student, exam=exam, alert_type='FULLSCREEN_EXIT', message='Exit')
+        cursor = first['cursor']
+        later = self.client.get(
+            f'/exams/prof/exam/monitor/{exam.id}/events/', {'focus': cursor['focus'], 'alert': ''}
+        ).json()
+        self.assertEqual([event['kind'] for event in later['events']], ['alert'])
+
+    def test_publish_without_subscribers_is_noop(self):
+        """Test that publishing to an unwatched exam does nothing."""
+        live_monitor.publish_exam_event(12345, 'alert', message='nobody listening')
+        self.assertFalse(live_monitor.broker.has_subscribers(live_monitor.exam_topic(12345)))
+
+    def test_focus_state_is_pushed_to_the_student(self):
+        """Test that a focus event pushes the new state after the initial one."""
+        async def scenario():
+            topic = proctoring_ingest.focus_topic(7, 99)
+
+            async def initial():
+                return {'version': 1}
+
+            stream = live_monitor.topic_event_stream(topic, 'focus_state', initial)
+            first = await stream.__anext__()
+            live_monitor.broker.publish(topic, 'focus_state', {'version': 2, 'action': 'submit_immediately'})
+            pushed = await asyncio.wait_for(stream.__anext__(), 2)
+            await stream.aclose()
+            return first, pushed
+
+        first, pushed = asyncio.run(scenario())
+        self.assertIn('"version": 1', first)
+        self.assertTrue(pushed.startswith('event: focus_state'))
+        self.assertIn('submit_immediately', pushed)
+        self.assertFalse(live_monitor.broker.has_subscribers(proctoring_ingest.focus_topic(7, 99)))
@@ -19,10 +19,16 @@ urlpatterns = [
     path('prof/api/questionpaper/<int:id>/', views.get_question_paper_api, name='faculty-get_qpaper_api'),
     path('prof/questionpaper/edit-from-exam/<int:id>/', views.edit_question_paper_from_exam, name='faculty-edit_qpaper_from_exam'),
     path('prof/update-question-paper/', views.update_question_paper_ajax, name='faculty-update-question-paper'),
+
+    # Live proctoring
+    path('prof/exam/monitor/<int:id>/', views.exam_monitor, name='faculty-exam_monitor'),
+    path('prof/exam/monitor/<int:id>/stream/', views.exam_monitor_stream, name='faculty-exam_monitor_stream'),
+    path('prof/exam/monitor/<int:id>/events/', views.exam_monitor_events, name='faculty-exam_monitor_events'),
     
     path('student/viewexams/',views.view_exams_student,name="view_exams_student"),
     path('student/previous/',views.student_view_previous,name="student-previous"),
     path('student/appear/<int:id>',views.appear_exam,name = "appear-exam"),
+    path('student/appear/<int:id>/events/', views.exam_focus_stream, name='appear-exam-events'),
     path('student/result/<int:id>',views.result,name = "result"),
     path('student/attendance/',views.view_students_attendance,name="view_students_attendance")
 ]
\ No newline at end of file
@@ -0,0 +1,311 @@
+"""
+Question Versioning
+Copy-on-write revision history for Question_DB and version pinning for exams.
+
+Each edit of a Question_DB row writes one QuestionVersion row inside the same
+transaction as the edit. Revisions 1, 11, 21, ... hold a full snapshot, the
+others hold a JSON diff against the previous revision, so any version can be
+rebuilt from at most SNAPSHOT_INTERVAL rows fetched in a single query.
+
+Exams pin the version of every question they were published with
+(Exam_Model.pinned_versions) and grading/result views read those pinned
+snapshots instead of copying question text per student.
+"""
+
+import hashlib
+import json
+import logging
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+
+logger = logging.getLogger('app')
+
+TRACKED_FIELDS = (
+    'question', 'question_image',
+    'optionA', 'optionA_image',
+    'optionB', 'optionB_image',
+    'optionC', 'optionC_image',
+    'optionD', 'optionD_image',
+    'answer', 'max_marks', 'difficulty',
+)
+
+IMAGE_FIELDS = {f for f in TRACKED_FIELDS if f.endswith('_image')}
+
+EXAM_QUESTIONS_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Attempts at allocating a version number before a conflicting edit wins
+VERSION_ATTEMPTS = 3
+
+
+def _snapshot_start(version_number, interval):
+    """Return the number of the snapshot revision that version_number builds on."""
+    return ((version_number - 1) // interval) * interval + 1
+
+
+def serialize_question(question):
+    """Return the tracked state of a Question_DB instance as a JSON-safe dict."""
+    state = {}
+    for field in TRACKED_FIELDS:
+        value = getattr(question, field)
+        if field in IMAGE_FIELDS:
+            value = value.name if value else ''
+        state[field] = value
+    return state
+
+
+def _rebuild(rows):
+    """
+    Rebuild the state described by rows (ascending version order, starting
+    at a snapshot) and return it.
+    """
+    state = {}
+    for row in rows:
+        if row.is_snapshot:
+            state = dict(row.data)
+        else:
+            state.update(row.data)
+    return state
+
+
+def latest_state(question_id):
+    """
+    Return (version_number, state) for the newest revision of a question,
+    or (0, None) if it has never been versioned.
+    """
+    from .question_enhancements import QuestionVersion
+
+    interval = QuestionVersion.SNAPSHOT_INTERVAL
+    rows = list(
+        QuestionVersion.objects.filter(question_id=question_id)
+        .order_by('-version_number')[:interval]
+    )
+    if not rows:
+        return 0, None
+
+    latest_number = rows[0].version_number
+    start = _snapshot_start(latest_number, interval)
+    chain = [row for row in reversed(rows) if row.version_number >= start]
+    return latest_number, _rebuild(chain)
+
+
+def record_version(question, user=None, description='', created=False):
+    """
+    Write a new revision for question if its tracked state changed.
+
+    Must be called inside the transaction that saved the question; the
+    Question_DB.save() override does this. The version number of an
+    existing question is allocated with its row locked, and reallocated if
+    a concurrent edit still took it first; a question created by this
+    transaction has no concurrent editors. Returns the QuestionVersion
+    that describes the current state.
+    """
+    if created:
+        return _write_version(question, user, description, lock=False)
+    for attempt in range(VERSION_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return _write_version(question, user, description)
+        except IntegrityError:
+            if attempt == VERSION_ATTEMPTS - 1:
+                raise
+            logger.warning(f"Version number of question {question.pk} taken by a concurrent edit, retrying")
+
+
+def _write_version(question, user, description, lock=True):
+    from .question_enhancements import QuestionVersion
+    from .question_models import Question_DB
+
+    if lock:
+        # Concurrent edits of the question queue up here until this one commits
+        list(Question_DB.objects.select_for_update().filter(pk=question.pk).values_list('pk', flat=True))
+
+    interval = QuestionVersion.SNAPSHOT_INTERVAL
+    state = serialize_question(question)
+    latest_number, previous = latest_state(question.pk)
+
+    if previous is not None:
+        diff = {k: v for k, v in state.items() if previous.get(k) != v}
+        if not diff:
+            return QuestionVersion.objects.get(question_id=question.pk, version_number=latest_number)
+    else:
+        diff = state
+
+    number = latest_number + 1
+    is_snapshot = _snapshot_start(number, interval) == number
+
+    return QuestionVersion.objects.create(
+        question_id=question.pk,
+        version_number=number,
+        is_snapshot=is_snapshot,
+        data=state if is_snapshot else diff,
+        modified_by_id=user.pk if user else question.professor_id,
+        change_description=description or ('Question created' if number == 1 else 'Question edited'),
+    )
+
+
+def load_versions(pins):
+    """
+    Rebuild several pinned revisions with one query.
+
+    Args:
+        pins: dict {question_id: version_number}
+
+    Returns:
+        dict {question_id: state}
+    """
+    from .question_enhancements import QuestionVersion
+
+    if not pins:
+        return {}
+
+    interval = QuestionVersion.SNAPSHOT_INTERVAL
+    ranges = [
+        Q(question_id=int(qid), version_number__range=(_snapshot_start(int(number), interval), int(number)))
+        for qid, number in pins.items()
+    ]
+    rows_by_question = {}
+    for row in QuestionVersion.objects.filter(reduce(or_, ranges)).order_by('question_id', 'version_number'):
+        rows_by_question.setdefault(row.question_id, []).append(row)
+
+    return {qid: _rebuild(rows) for qid, rows in rows_by_question.items()}
+
+
+def pin_exam_versions(exam):
+    """
+    Pin the current revision of every question on the exam's paper.
+
+    Questions that predate versioning get their first revision written here.
+    Returns the pinned mapping {str(qno): version_number}.
+    """
+    from .question_enhancements import QuestionVersion
+
+    with transaction.atomic():
+        questions = list(exam.question_paper.questions.all())
+        latest = dict(
+            QuestionVersion.objects.filter(question_id__in=[q.qno for q in questions])
+            .values('question_id')
+            .annotate(latest=Max('version_number'))
+            .values_list('question_id', 'latest')
+        )
+
+        pins = {}
+        for q in questions:
+            if q.qno not in latest:
+                latest[q.qno] = record_version(q, description='Baseline revision').version_number
+            pins[str(q.qno)] = latest[q.qno]
+
+        exam.pinned_versions = pins
+        exam.save(update_fields=['pinned_versions'])
+
+    logger.info(f"Pinned {len(pins)} question versions for exam {exam.name}")
+    return pins
+
+
+def pins_digest(pins):
+    """Short, stable identifier for a pinned mapping (used in cache keys)."""
+    encoded = json.dumps(pins, sort_keys=True).encode('utf-8')
+    return hashlib.md5(encoded).hexdigest()[:12]
+
+
+def exam_questions(exam):
+    """
+    Return the exam's pinned questions as {qno: state}, ordered by qno.
+
+    Results are cached per pinned mapping, so a re-pinned exam never reads a
+    stale paper. Exams published before versioning are pinned on first use.
+    """
+    pins = exam.pinned_versions or pin_exam_versions(exam)
+    cache_key = f'exam_questions:{exam.id}:{pins_digest(pins)}'
+    questions = cache.get(cache_key)
+    if questions is None:
+        states = load_versions(pins)
+        questions = {}
+        for qid in sorted(states):
+            state = dict(states[qid])
+            state['qno'] = qid
+            state['version'] = int(pins[str(qid)])
+            questions[qid] = state
+        cache.set(cache_key, questions, EXAM_QUESTIONS_CACHE_TIMEOUT)
+    return questions
+
+
+def pinned_total(questions, selected=None):
+    """Possible marks of pinned questions, narrowed to a generated selection when given."""
+    return sum(
+        state.get('max_marks') or 0 for qno, state in questions.items() if not selected or qno in selected
+    )
+
+
+def attempt_totals(attempts, exam=None):
+    """
+    Possible marks of each StuExam_DB in attempts, as {attempt.id: total}.
+
+    Totals are those the result page shows: the exam's pinned questions,
+    narrowed to the student's generated selection. Pass exam when every
+    attempt belongs to it. Attempts whose exam no longer exists fall back
+    to their paper's current questions.
+    """
+    from django.db.models import prefetch_related_objects
+    from .anticheating_models import ExamSession
+    from .models import Exam_Model
+
+    attempts = list(attempts)
+    if exam is not None:
+        exams = {(exam.name, exam.question_paper_id): exam}
+    else:
+        exams = {}
+        for candidate in Exam_Model.objects.filter(
+            name__in={a.examname for a in attempts},
+            question_paper_id__in={a.qpaper_id for a in attempts},
+        ).order_by('id'):
+            exams.setdefault((candidate.name, candidate.question_paper_id), candidate)
+
+    matched = {a.id: exams.get((a.examname, a.qpaper_id)) for a in attempts}
+    selections = {}
+    exam_ids = {e.id for e in matched.values() if e is not None}
+    if exam_ids:
+        for session in ExamSession.objects.filter(
+            exam_id__in=exam_ids, student_id__in={a.student_id for a in attempts},
+        ).only('student_id', 'exam_id', 'question_selection'):
+            selections[session.student_id, session.exam_id] = session.selected_qnos
+
+    orphans = [a for a in attempts if matched[a.id] is None and a.qpaper_id]
+    prefetch_related_objects(orphans, 'qpaper__questions')
+
+    pinned = {}
+    totals = {}
+    for attempt in attempts:
+        attempt_exam = matched[attempt.id]
+        if attempt_exam is None:
+            totals[attempt.id] = sum(
+                q.max_marks for q in attempt.qpaper.questions.all()
+            ) if attempt.qpaper_id else 0
+            continue
+        if attempt_exam.id not in pinned:
+            pinned[attempt_exam.id] = exam_questions(attempt_exam)
+        selected = selections.get((attempt.student_id, attempt_exam.id))
+        totals[attempt.id] = pinned_total(pinned[attempt_exam.id], selected)
+    return totals
+
+
+def grade_answers(questions, answers):
+    """
+    Score answers against pinned question states.
+
+    Args:
+        questions: dict {qno: state} from exam_questions()
+        answers: dict {qno or str(qno): selected option letter}
+
+    Returns:
+        int: total marks obtained
+    """
+    score = 0
+    for qno, state in questions.items():
+        selected = (answers.get(str(qno)) or answers.get(qno) or '').upper().strip()
+        if selected and selected == (state.get('answer') or '').upper():
+            score += state.get('max_marks') or 0
+    return score
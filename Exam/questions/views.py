@@ -4,7 +4,6 @@ from .models import *
 from django.contrib.auth.models import Group
 from student.models import *
 from django.utils import timezone
-import random
 from django.core.mail import send_mail
 from django.conf import settings
 from student.models import StuExam_DB,StuResults_DB
@@ -37,6 +36,7 @@ def create_exam(request):
                 exam.professor = prof
                 exam.save()
                 form.save_m2m()
+                exam.pin_question_versions()
                 from django.contrib import messages
                 messages.success(request, 'Exam created successfully!')
                 return redirect('create_exam')
@@ -217,6 +217,9 @@ def view_results_prof(request):
             qpaper=exam.question_paper,
             completed=1
         ).select_related('student', 'qpaper')
+        # Possible marks from the pinned question versions, as on the result page
+        from questions.versioning import attempt_totals
+        totals = attempt_totals(exam_attempts, exam=exam)
         
         for attempt in exam_attempts:
             student_username = str(attempt.student.username)
@@ -229,11 +232,7 @@ def view_results_prof(request):
             else:
                 student_display_name = student_username
             
-            # Calculate total marks for this exam
-            total_marks = 0
-            if attempt.qpaper:
-                for question in attempt.qpaper.questions.all():
-                    total_marks += question.max_marks
+            total_marks = totals[attempt.id]
             
             # Calculate percentage
             percentage = 0
@@ -368,27 +367,33 @@ def appear_exam(request,id):
     
     # Get the exam first
     exam = Exam_Model.objects.get(pk=id)
-    now = timezone.localtime()
 
-    # Ensure stored times are timezone-aware and localised
-    def _ensure_aware(dt):
-        if not dt:
-            return dt
-        if timezone.is_naive(dt):
-            dt = timezone.make_aware(dt, timezone.get_default_timezone())
-        return timezone.localtime(dt)
+    from questions.exam_assignment_models import ExamAssignment
+    if not ExamAssignment.is_exam_assigned_to_student(exam, student):
+        from django.contrib import messages
+        messages.error(request, "You are not assigned to this exam.")
+        return redirect('view_exams_student')
+
+    # Prevent access outside the student's window (cached, see questions.exam_clock).
+    # Submissions still in flight at the deadline are accepted within the grace period.
+    from questions.exam_clock import check_window, remaining_seconds
+    from questions.submission_queue import enqueue_submission, grace_seconds, pending_submission
+    received_at = timezone.now()
+    window_state, _ = check_window(
+        student.id, exam.id, grace=grace_seconds() if request.method == 'POST' else 0
+    )
 
-    exam.start_time = _ensure_aware(exam.start_time)
-    exam.end_time = _ensure_aware(exam.end_time)
+    # Submitted and waiting for the grading queue
+    if pending_submission(student.id, exam.id):
+        return redirect('result', id=exam.id)
 
-    # Prevent access outside the scheduled window
-    if exam.start_time and now < exam.start_time:
+    if window_state == 'not_started':
         start_local = timezone.localtime(exam.start_time).strftime("%b %d, %Y at %H:%M")
         from django.contrib import messages
         messages.error(request, f"The exam is accessible starting on {start_local}. Please return then.")
         return redirect('view_exams_student')
 
-    if exam.end_time and now > exam.end_time:
+    if window_state == 'expired':
         # Auto-mark student as absent (0 score) when past end time
         stu_exam = StuExam_DB.objects.filter(
             student=student,
@@ -436,8 +441,7 @@ def appear_exam(request,id):
             return x_forwarded_for.split(',')[0].strip()
         return req.META.get('REMOTE_ADDR', '0.0.0.0')
 
-    from questions.anticheating_models import ExamSession, ExamSecurityAlert
-    from questions.question_models import Question_DB
+    from questions.anticheating_models import ExamSession
 
     exam_session, created_session = ExamSession.objects.get_or_create(
         student=student,
@@ -449,62 +453,43 @@ def appear_exam(request,id):
             'user_agent': request.META.get('HTTP_USER_AGENT', ''),
         }
     )
-
-    if created_session or not exam_session.question_order:
-        all_questions = list(exam.question_paper.questions.all())
-        question_order = [q.qno for q in all_questions]
-        random.shuffle(question_order)
-
-        option_order = {}
-        for q in all_questions:
-            opts = ['A', 'B', 'C', 'D']
-            random.shuffle(opts)
-            option_order[str(q.qno)] = opts
-
-        exam_session.question_order = question_order
-        exam_session.option_order = option_order
-        exam_session.ends_at = exam.end_time
-        exam_session.save()
-
-    # Evaluate remaining time as seconds from now
-    remaining_timedelta = max(0, int((exam.end_time - now).total_seconds()))
-    mins = remaining_timedelta // 60
-    secs = remaining_timedelta % 60
+    if created_session or not exam_session.ip_address:
+        if not created_session:
+            # Session was pre-created by the exam warm-up job (questions.exam_warmup)
+            exam_session.ip_address = _get_client_ip(request)
+            exam_session.user_agent = request.META.get('HTTP_USER_AGENT', '')
+            exam_session.save(update_fields=['ip_address', 'user_agent'])
+        from questions.live_monitor import publish_exam_event
+        publish_exam_event(exam.id, 'session_started', student_id=student.id, student=student.username)
+
+    # Questions as pinned when the exam was published
+    from questions.versioning import exam_questions
+    pinned_questions = exam_questions(exam)
+
+    # Order is rebuilt from the session seed on every request, nothing to store
+    question_order = exam_session.ordered_qnos(list(pinned_questions))
+
+    # Remaining time from the session's cached deadline
+    remaining = remaining_seconds(exam_session)
+    mins = remaining // 60
+    secs = remaining % 60
 
     if request.method == 'GET':
-        ordered_questions = []
-        for qno in exam_session.question_order:
-            q = Question_DB.objects.get(qno=qno)
-            mapped_options = []
-            for letter in exam_session.option_order.get(str(qno), ['A', 'B', 'C', 'D']):
-                mapped_options.append({'choice': letter, 'text': getattr(q, 'option' + letter)})
-
-            ordered_questions.append({
-                'qno': q.qno,
-                'question': q.question,
-                'max_marks': q.max_marks,
-                'options': mapped_options
-            })
+        from questions.live_monitor import live_events_enabled
+        from questions.paper_cache import render_session_paper
 
         context = {
             'exam': exam,
-            'question_list': ordered_questions,
+            'paper_html': render_session_paper(exam, exam_session),
             'secs': secs,
             'mins': mins,
             'exam_session_id': exam_session.id,
+            'live_events': live_events_enabled(),
             'hide_sidebar': True
         }
         return render(request, 'exam/giveExam.html', context)
 
     if request.method == 'POST':
-        # Prevent retake and timeout
-        if now > exam.end_time:
-            from django.contrib import messages
-            messages.error(request, 'Time expired; exam has been auto-submitted.')
-            # Mark session as submitted, no score update
-            exam_session.mark_submitted()
-            return redirect('result', id=exam.id)
-
         if exam_session.is_submitted:
             from django.contrib import messages
             messages.error(request, 'This exam session has already been submitted.')
@@ -522,76 +507,15 @@ def appear_exam(request,id):
             messages.error(request, 'You have already completed this exam. You cannot retake it.')
             return redirect('view_exams_student')
 
-        # Create or continue existing StuExam_DB row
-        stuExam, _ = StuExam_DB.objects.get_or_create(
-            examname=exam.name,
-            student=student,
-            qpaper=exam.question_paper,
-            defaults={'completed': 0, 'score': 0}
-        )
-
-        stuExam.qpaper = exam.question_paper
-
-        # Persist student question snapshots in result table (optional)
-        for qno in exam_session.question_order:
-            try:
-                qrec = Question_DB.objects.get(qno=qno)
-            except Question_DB.DoesNotExist:
-                continue
-
-            student_question = Stu_Question.objects.create(
-                student=student,
-                question=qrec.question,
-                optionA=qrec.optionA,
-                optionB=qrec.optionB,
-                optionC=qrec.optionC,
-                optionD=qrec.optionD,
-                answer=qrec.answer
-            )
-            stuExam.questions.add(student_question)
-
-        # Score calculation from server-side data and form values
-        examScore = 0
-        for qno in exam_session.question_order:
-            try:
-                qrec = Question_DB.objects.get(qno=qno)
-            except Question_DB.DoesNotExist:
-                continue
-
-            answer_key = 'answer_{}'.format(qno)
-            selected = request.POST.get(answer_key, '').upper().strip()
-            if selected and selected == qrec.answer.upper():
-                examScore += qrec.max_marks
-
-            stu_q = stuExam.questions.filter(question=qrec.question).last()
-            if stu_q:
-                stu_q.choice = selected
-                stu_q.save()
-
-        stuExam.score = examScore
-        stuExam.completed = 1
-        stuExam.save()
-
-        # Mark exam session submitted
-        exam_session.mark_submitted()
-
-        # Add to results table
-        results = StuResults_DB.objects.get_or_create(student=student)[0]
-        results.exams.add(stuExam)
-
-        # Flag if suspicious events exceeded
-        if exam_session.tab_switch_count >= 5 or exam_session.fullscreen_exit_count >= 3:
-            alert_reason = 'Tab switches: {}, fullscreen exits: {}'.format(
-                exam_session.tab_switch_count, exam_session.fullscreen_exit_count
-            )
-            ExamSecurityAlert.objects.create(
-                student=student,
-                exam=exam,
-                alert_type='AUTO_SUBMIT_SUSPICION',
-                level='CRITICAL',
-                message=alert_reason
-            )
+        # Answers are stored once and graded against the pinned question
+        # versions by the submission queue; the request only records them.
+        answers = {}
+        for qno in question_order:
+            selected = request.POST.get('answer_{}'.format(qno), '').upper().strip()
+            if selected:
+                answers[str(qno)] = selected
 
+        enqueue_submission(exam_session, answers, received_at)
         return redirect('result', id=exam.id)
 
 @login_required(login_url='login')
@@ -612,6 +536,12 @@ def result(request,id):
             completed=1
         ).first()
     
+    if not stu_exam or not stu_exam.completed:
+        # Accepted submissions are shown as soon as the queue has graded them
+        from questions.submission_queue import pending_submission
+        if pending_submission(student.id, exam.id):
+            return render(request, 'exam/result.html', {'exam': exam, 'grading': True})
+
     if not stu_exam:
         from django.contrib import messages
         messages.error(request, "No exam record found. Please complete the exam first.")
@@ -619,9 +549,11 @@ def result(request,id):
     
     score = stu_exam.score
     
-    total_marks = 0
-    for q in exam.question_paper.questions.all():
-        total_marks += q.max_marks
+    from questions.versioning import exam_questions, pinned_total
+    from questions.anticheating_models import ExamSession
+    pinned_questions = exam_questions(exam)
+    session = ExamSession.objects.filter(student=student, exam=exam).only('question_selection').first()
+    total_marks = pinned_total(pinned_questions, session.selected_qnos if session else None)
     
     max_dash = 440
     try:
@@ -826,6 +758,7 @@ def edit_exam(request, id):
             ex.professor = prof
             ex.save()
             form.save_m2m()
+            ex.pin_question_versions()
 
             return redirect('view_exams')
     else:
@@ -873,6 +806,7 @@ def edit_exam_enhanced(request, id):
             ex.professor = prof
             ex.save()
             form.save_m2m()
+            ex.pin_question_versions()
 
             messages.success(request, 'Exam details updated successfully!')
             return redirect('faculty-edit_exam_enhanced', id=exam.id)
@@ -1084,6 +1018,11 @@ def update_question_paper_ajax(request):
     qpaper.questions.set(created_questions)
     qpaper.save()
 
+    # Exams that have not started yet publish the edited paper; running and
+    # finished exams keep the versions they were pinned with.
+    for upcoming_exam in Exam_Model.objects.filter(question_paper=qpaper, start_time__gt=timezone.now()):
+        upcoming_exam.pin_question_versions()
+
     # Get the exam to redirect back
     exam = Exam_Model.objects.filter(question_paper=qpaper).first()
     
@@ -1091,3 +1030,94 @@ def update_question_paper_ajax(request):
         'success': True, 
         'redirect': f'/exams/prof/exam/edit-enhanced/{exam.id}/' if exam else '/exams/prof/viewexams/'
     })
+
+
+@login_required(login_url='faculty-login')
+def exam_monitor(request, id):
+    """Live proctoring dashboard for one of the professor's exams."""
+    exam = get_object_or_404(Exam_Model, pk=id)
+    if exam.professor != request.user:
+        return HttpResponseForbidden("You don't have permission to monitor this exam.")
+    from questions.live_monitor import live_events_enabled
+    return render(request, 'exam/monitor.html', {'exam': exam, 'live_events': live_events_enabled()})
+
+
+@login_required(login_url='faculty-login')
+def exam_monitor_events(request, id):
+    """
+    Polled activity for the live dashboard when SSE is off (the default,
+    see questions.live_monitor). Pass back the returned cursor as
+    ?focus=&alert= to get only newer events.
+    """
+    from questions.live_monitor import exam_activity
+
+    exam = get_object_or_404(Exam_Model, pk=id)
+    if exam.professor != request.user:
+        return HttpResponseForbidden("You don't have permission to monitor this exam.")
+    try:
+        cursor = {
+            name: int(request.GET[name]) if request.GET.get(name) else None
+            for name in ('focus', 'alert')
+        }
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor.")
+    return JsonResponse(exam_activity(exam.id, after_focus=cursor['focus'], after_alert=cursor['alert']))
+
+
+async def exam_monitor_stream(request, id):
+    """
+    Server-sent events for the live dashboard. Runs on the ASGI event loop:
+    after one stats query the connection only waits on the in-process broker.
+    Only served with settings.LIVE_EVENTS_SSE, as under WSGI the response
+    would hold a worker thread without sending anything.
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import Http404, StreamingHttpResponse
+    from questions.live_monitor import exam_event_stream, exam_session_stats, live_events_enabled
+
+    if not live_events_enabled():
+        raise Http404("Live event streams are disabled.")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden("Login required.")
+    exam = await Exam_Model.objects.filter(pk=id, professor=user).afirst()
+    if exam is None:
+        return HttpResponseForbidden("You don't have permission to monitor this exam.")
+
+    stats = await sync_to_async(exam_session_stats)(exam.id)
+    response = StreamingHttpResponse(exam_event_stream(exam.id, stats), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def exam_focus_stream(request, id):
+    """
+    Server-sent focus state for a student's exam page. A message is sent
+    only when the state changes (warnings, auto-submit), replacing polling.
+    Only served with settings.LIVE_EVENTS_SSE (ASGI); otherwise the page
+    polls the ETag'd focus-status endpoint.
+    """
+    from asgiref.sync import sync_to_async
+    from django.http import Http404, StreamingHttpResponse
+    from questions.live_monitor import live_events_enabled, topic_event_stream
+    from questions.proctoring_ingest import exam_window, focus_payload, focus_topic
+
+    if not live_events_enabled():
+        raise Http404("Live event streams are disabled.")
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden("Login required.")
+    if await sync_to_async(exam_window)(id) is None:
+        return HttpResponseForbidden("Unknown exam.")
+
+    async def load_state():
+        return await sync_to_async(focus_payload)(user.id, id)
+
+    response = StreamingHttpResponse(
+        topic_event_stream(focus_topic(user.id, id), 'focus_state', load_state),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -4,9 +4,6 @@ from django.http import JsonResponse
 import json
 import validate_email
 from validate_email import validate_email
-from .views import EmailThread
-from django.core.mail import EmailMessage
-from django.conf import settings
 
 class UsernameValidation(View):
     def post(self,request):
@@ -36,16 +33,13 @@ class EmailValidationView(View):
 
 class Cheating(View):
 	def get(self,request,professorname):
+		from notifications.alert_digest import AlertDigestService
 		student = str(request.user.username)
 		email = User.objects.get(username=professorname).email
 		email_subject = 'Student Cheating'
 		email_body = 'Student caught changing window for 5 times. Student username is :' + student
-		fromEmail = settings.DEFAULT_FROM_EMAIL
-		email_obj = EmailMessage(
-		    email_subject,
-		    email_body,
-            fromEmail,
-		    [email],
+		# Sent once per student, repeats are dropped
+		sent = AlertDigestService.send_critical_alert(
+			request.user, 'window_change_limit', email_subject, email_body, recipient=email
 		)
-		EmailThread(email_obj).start()
-		return JsonResponse({'sent':True})
+		return JsonResponse({'sent':sent})
@@ -22,7 +22,7 @@ def index(request):
     from questions.models import Exam_Model
     from questions.exam_assignment_models import ExamAssignment
     from django.utils import timezone
-    from django.db.models import Avg, Sum
+    from django.db.models import Avg
 
     student = request.user
     now = timezone.localtime()
@@ -86,43 +86,28 @@ def index(request):
     # Get completed exams for this student
     completed_exams = StuExam_DB.objects.filter(student=student, completed=1)
     
+    # Possible marks of every completed attempt, from the pinned question
+    # versions the result page uses (questions.versioning)
+    from questions.versioning import attempt_totals
+    all_completed = list(StuExam_DB.objects.filter(completed=1))
+    totals = attempt_totals(all_completed)
+    obtained = {}
+    possible = {}
+    for exam_record in all_completed:
+        obtained[exam_record.student_id] = obtained.get(exam_record.student_id, 0) + (exam_record.score or 0)
+        possible[exam_record.student_id] = possible.get(exam_record.student_id, 0) + totals[exam_record.id]
+
     # Calculate average score from completed exams based on actual total marks
     avg_score_percent = "0%"
-    if completed_exams.exists():
-        total_marks_obtained = 0
-        total_possible_marks = 0
-        
-        for exam_record in completed_exams:
-            if exam_record.qpaper:
-                for q in exam_record.qpaper.questions.all():
-                    total_possible_marks += q.max_marks
-        
-        total_score_result = completed_exams.aggregate(total_score=Sum('score'))
-        total_marks_obtained = total_score_result['total_score'] or 0
-        
-        if total_possible_marks > 0:
-            percentage = (total_marks_obtained / total_possible_marks) * 100
-            avg_score_percent = f"{int(percentage)}%"
+    if possible.get(student.id, 0) > 0:
+        percentage = (obtained[student.id] / possible[student.id]) * 100
+        avg_score_percent = f"{int(percentage)}%"
     
     # Calculate rank
     all_students_scores = {}
-    students_with_exams = StuExam_DB.objects.filter(completed=1).values_list('student_id', flat=True).distinct()
-    for student_id in students_with_exams:
-        student_exams = StuExam_DB.objects.filter(student_id=student_id, completed=1)
-        
-        student_total_obtained = 0
-        student_total_possible = 0
-        
-        for exam_record in student_exams:
-            if exam_record.qpaper:
-                for q in exam_record.qpaper.questions.all():
-                    student_total_possible += q.max_marks
-        
-        student_score_result = student_exams.aggregate(total_score=Sum('score'))
-        student_total_obtained = student_score_result['total_score'] or 0
-        
-        if student_total_possible > 0:
-            student_percentage = (student_total_obtained / student_total_possible) * 100
+    for student_id in possible:
+        if possible[student_id] > 0:
+            student_percentage = (obtained[student_id] / possible[student_id]) * 100
         else:
             student_percentage = 0
         
@@ -207,7 +192,7 @@ class LoginView(View):
 			except User.DoesNotExist:
 				pass
 
-			user = auth.authenticate(username=username,password=password)
+			user = auth.authenticate(request,username=username,password=password)
 			if user:
 				if user.is_active:
 					# NEW 2FA FLOW: Instead of directly logging in,